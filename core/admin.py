@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Supplier, Product, StockMovement
+from .models import Category, Supplier, Product, StockMovement, StockMovementArchive, ImportJob, ExportJob
 
 # Register your models here.
 @admin.register(Category)
@@ -38,8 +38,52 @@ class StockMovementAdmin(admin.ModelAdmin):
         'product',
         'movement_type',
         'quantity',
+        'balance_after',
         'created_at',
         'created_by',
     )
-    list_filter = ('movement_type', 'created_at')
+    list_filter = ('movement_type', 'is_opening', 'created_at')
     search_fields = ('product__name',)
+
+
+@admin.register(StockMovementArchive)
+class StockMovementArchiveAdmin(admin.ModelAdmin):
+    list_display = (
+        'product',
+        'movement_type',
+        'quantity',
+        'balance_after',
+        'created_at',
+        'archived_at',
+    )
+    list_filter = ('movement_type',)
+    search_fields = ('product__name',)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'status',
+        'created_count',
+        'updated_count',
+        'error_count',
+        'created_by',
+        'created_at',
+        'finished_at',
+    )
+    list_filter = ('status',)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'kind',
+        'status',
+        'rows',
+        'created_by',
+        'created_at',
+        'finished_at',
+    )
+    list_filter = ('status', 'kind')
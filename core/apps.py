@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Registra los receptores de señales (invalidación de caché)
+        from . import signals  # noqa: F401
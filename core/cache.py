@@ -0,0 +1,109 @@
+"""
+Claves de caché de la aplicación, su invalidación y la versión de los
+datos de la que dependen.
+
+Este módulo no importa modelos para poder usarse desde models.py sin
+dependencias circulares (se buscan con apps.get_model).
+"""
+import hashlib
+import time
+from datetime import timezone as dt_timezone
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+# Métricas del panel por versión de los datos que lee la petición (primario o
+# réplica): una escritura cambia la clave en todos los procesos y las
+# entradas viejas quedan huérfanas hasta que caducan
+DASHBOARD_METRICS_KEY = 'core:dashboard_metrics:{}'
+DASHBOARD_METRICS_TIMEOUT = 60
+
+# De qué sale la versión de los datos, tabla a tabla: altas y cambios mueven
+# MAX(updated_at) (en las tablas que solo crecen, MAX(id)) y las bajas el
+# número de filas. Los movimientos también fijan Product.updated_at
+DATA_VERSION_SOURCES = {
+    'core.Category': ('MAX(updated_at)', 'COUNT(*)'),
+    'core.Supplier': ('MAX(updated_at)', 'COUNT(*)'),
+    'core.Product': ('MAX(updated_at)', 'COUNT(*)'),
+    'core.StockMovement': ('MAX(id)', 'COUNT(*)'),
+    'core.DailyMovementSummary': ('MAX(id)',),
+}
+
+
+def as_datetime(value):
+    # SQLite devuelve el texto de la columna, en UTC y sin zona horaria
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def data_state():
+    """
+    (versión, momento de la última escritura) de los datos del inventario,
+    calculados en una sola consulta a la base de la que se leen (primario
+    o réplica): los ven igual todos los procesos, también los que escriben
+    fuera de la web (worker de importaciones, comandos), y no añaden nada a
+    las escrituras. Las bajas no mueven la fecha, solo la versión: el
+    Last-Modified puede quedarse igual, el ETag no.
+    """
+    sources = [
+        (apps.get_model(label), expression)
+        for label, expressions in DATA_VERSION_SOURCES.items()
+        for expression in expressions
+    ]
+    connection = connections[router.db_for_read(sources[0][0])]
+    columns = ', '.join(
+        f'(SELECT {expression} FROM {connection.ops.quote_name(model._meta.db_table)})'
+        for model, expression in sources
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {columns}')
+        row = cursor.fetchone()
+
+    version = hashlib.sha256(repr(row).encode()).hexdigest()[:16]
+    modified = [
+        as_datetime(value)
+        for value, (_, expression) in zip(row, sources)
+        if expression == 'MAX(updated_at)' and value is not None
+    ]
+    return version, max(modified, default=None)
+
+
+# Listas de categorías y proveedores para los desplegables. La clave lleva
+# la versión de cada lista; guardar o borrar una fila cambia la versión y
+# las entradas viejas quedan huérfanas hasta que caducan
+REFERENCE_VERSION_KEY = 'core:reference_version:{}'
+REFERENCE_CHOICES_KEY = 'core:reference_choices:{}:{}'
+
+# Con una caché local por proceso, otros workers verán la lista vieja como
+# mucho durante este tiempo
+REFERENCE_CHOICES_TIMEOUT = 300
+
+
+def reference_version(name):
+    key = REFERENCE_VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_reference_version(name):
+    key = REFERENCE_VERSION_KEY.format(name)
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+    bump()
+    transaction.on_commit(bump)
+
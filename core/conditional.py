@@ -0,0 +1,78 @@
+"""
+GET condicional (ETag / Last-Modified) para las páginas que solo muestran
+datos: el panel y los listados.
+
+El validador sale de la versión de los datos (core.replicas.read_state, una
+consulta con los MAX(updated_at), MAX(id) y recuentos de cada tabla), la URL
+con sus filtros y la sesión del usuario. Si el navegador ya tiene la página, la respuesta es un 304 vacío y
+la vista no se ejecuta.
+"""
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.messages.storage.session import SessionStorage
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .replicas import read_state, read_version
+
+
+def has_pending_messages(request):
+    # Un 304 haría que el navegador reutilizara la página vieja y el mensaje
+    # pendiente no se mostraría nunca
+    return bool(
+        request.COOKIES.get(CookieStorage.cookie_name)
+        or request.session.get(SessionStorage.session_key)
+    )
+
+
+def page_etag(request, *args, public=False, **kwargs):
+    # Basta con el id guardado en la sesión: cargar request.user costaría
+    # una consulta más en cada 304
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None and not public:
+        # Sin sesión la vista redirige al login; esa respuesta no se valida
+        return None
+    if has_pending_messages(request):
+        return None
+
+    query = sorted(request.GET.lists())
+    parts = [
+        str(read_version(request)),
+        request.path,
+        repr(query),
+        str(user_id),
+        # Cambian al iniciar sesión de nuevo; la página guardada lleva el
+        # token CSRF del formulario de salida
+        request.session.session_key or '',
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+
+
+def page_last_modified(request, *args, public=False, **kwargs):
+    if request.session.get(SESSION_KEY) is None and not public:
+        return None
+    return read_state(request)[1]
+
+
+def conditional_page(public=False):
+    """
+    Decorador de clase para vistas basadas en clases.
+
+    ``public=True`` para páginas que también ven los usuarios anónimos.
+    ``Cache-Control: private, no-cache`` obliga al navegador a revalidar
+    siempre y evita que un proxy compartido guarde la página.
+    """
+    decorators = [
+        cache_control(private=True, no_cache=True),
+        condition(
+            etag_func=partial(page_etag, public=public),
+            last_modified_func=partial(page_last_modified, public=public),
+        ),
+    ]
+    return method_decorator(decorators, name='dispatch')
@@ -0,0 +1,394 @@
+"""
+Exportaciones CSV en streaming y su caché en disco.
+
+Las filas salen de values_list(...).iterator(): nunca se crean instancias
+de los modelos ni se carga el resultado entero en memoria. Se escriben con
+csv.writer sobre un único buffer que se vacía tras cada bloque y se
+comprimen con gzip sobre la marcha.
+
+En PostgreSQL la consulta se envuelve en COPY (...) TO STDOUT WITH CSV y
+el servidor entrega el CSV ya formateado (fechas y etiquetas incluidas), sin
+pasar cada fila por Python.
+
+Con ?archived=1 la exportación de movimientos incluye también los
+archivados (StockMovementArchive, ver archive_movements) en lugar de las
+filas de saldo de apertura que los resumen.
+
+Cada exportación se guarda en MEDIA_ROOT/exports/ con un nombre que depende
+del tipo, de los filtros normalizados y de la versión de los datos (ver
+core/cache.data_state): mientras nada cambie, la misma consulta se sirve
+desde el fichero, también en otros procesos. Los ficheros caducan por
+antigüedad y se borran los más viejos si la carpeta supera el tamaño máximo.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass
+from itertools import chain, islice
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, Case, CharField, F, Func, IntegerField, Value, When
+from django.http import FileResponse, QueryDict, StreamingHttpResponse
+
+from .filters import ProductFilter, StockMovementFilter
+from .models import Product, StockMovement, StockMovementArchive, ExportJob
+
+
+# Filas por bloque leído de la base de datos y por trozo enviado
+EXPORT_CHUNK_SIZE = 2000
+
+# Carpeta de la caché dentro de MEDIA_ROOT
+EXPORT_DIR = 'exports'
+
+# Parámetros que no cambian el contenido de la exportación
+IGNORED_PARAMS = ('page', 'cursor', 'compress')
+
+PRODUCT_HEADER = ['Nombre', 'SKU', 'Categoría', 'Proveedor', 'Stock', 'Precio']
+
+MOVEMENT_HEADER = ['Fecha', 'Producto', 'Categoría', 'Tipo', 'Cantidad', 'Saldo', 'Usuario']
+
+OPENING_LABEL = 'Saldo de apertura'
+
+
+def csv_chunks(header, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Genera el CSV en trozos de `chunk_size` filas reutilizando el mismo
+    buffer.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if batch:
+            writer.writerows(batch)
+        if buffer.tell():
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if len(batch) < chunk_size:
+            return
+
+
+def copy_chunks(header, queryset, on_rows=None):
+    """
+    CSV generado por PostgreSQL con COPY. `queryset` es un values_list con
+    las columnas ya formateadas. on_rows(n) recibe las filas de cada trozo.
+    Con header=None no se escribe la cabecera (continuación de otro CSV).
+    """
+    if header is not None:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(header)
+        yield buffer.getvalue()
+
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    seen = 0
+    with connections[queryset.db].cursor() as cursor:
+        with cursor.copy(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv)', params) as copy:
+            for data in copy:
+                data = bytes(data)
+                if on_rows:
+                    # Aproximado (un texto puede llevar saltos de línea); se
+                    # corrige con rowcount al terminar
+                    rows = data.count(b'\n')
+                    seen += rows
+                    on_rows(rows)
+                yield data
+        if on_rows and cursor.rowcount > seen:
+            on_rows(cursor.rowcount - seen)
+
+
+def gzip_chunks(chunks):
+    # wbits=31: formato gzip (cabecera y CRC), no zlib en crudo
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def product_rows(queryset):
+    return queryset.values_list(
+        'name', 'sku', 'category__name', 'supplier__name', 'stock', 'price'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def movement_rows(queryset):
+    types = dict(StockMovement.MOVEMENT_TYPE_CHOICES)
+    rows = queryset.values_list(
+        'created_at', 'product__name', 'product__category__name', 'movement_type',
+        'quantity', 'balance_after', 'created_by__username', 'is_opening',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    for created_at, product, category, movement_type, quantity, balance, user, is_opening in rows:
+        if is_opening:
+            # Cantidad neta archivada, con signo
+            label = OPENING_LABEL
+            quantity = quantity if movement_type == StockMovement.ENTRY else -quantity
+        else:
+            label = types[movement_type]
+        yield (created_at.strftime('%Y-%m-%d %H:%M'), product, category, label, quantity, balance, user)
+
+
+def product_copy_values(queryset):
+    return queryset.values_list('name', 'sku', 'category__name', 'supplier__name', 'stock', 'price')
+
+
+def movement_copy_values(queryset):
+    # Mismo formato que movement_rows, calculado en la base de datos (la
+    # conexión trabaja en UTC, como los datetime de values_list)
+    return queryset.annotate(
+        export_date=Func(
+            F('created_at'), Value('YYYY-MM-DD HH24:MI'), function='to_char', output_field=CharField()
+        ),
+        export_type=Case(
+            When(is_opening=True, then=Value(OPENING_LABEL)),
+            *[When(movement_type=value, then=Value(label)) for value, label in StockMovement.MOVEMENT_TYPE_CHOICES],
+            output_field=CharField(),
+        ),
+        export_quantity=Case(
+            When(is_opening=True, movement_type=StockMovement.EXIT, then=-F('quantity')),
+            default=F('quantity'),
+            output_field=IntegerField(),
+        ),
+    ).values_list(
+        'export_date', 'product__name', 'product__category__name', 'export_type',
+        'export_quantity', 'balance_after', 'created_by__username',
+    )
+
+
+def product_queryset(params):
+    return ProductFilter(params, queryset=Product.objects.all()).qs
+
+
+def movement_queryset(params):
+    queryset = StockMovementFilter(params, queryset=StockMovement.objects.all()).qs
+    if params.get('archived'):
+        # Los movimientos archivados sustituyen a sus filas de apertura
+        queryset = queryset.filter(is_opening=False)
+    return queryset.order_by('-created_at', '-id')
+
+
+def archived_movement_queryset(params):
+    if not params.get('archived'):
+        return None
+    # Mismos filtros y columnas que los movimientos; todos son anteriores a
+    # los que siguen en StockMovement, así que van detrás en el CSV
+    queryset = StockMovementArchive.objects.annotate(is_opening=Value(False, output_field=BooleanField()))
+    return StockMovementFilter(params, queryset=queryset).qs.order_by('-created_at', '-id')
+
+
+@dataclass(frozen=True)
+class ExportKind:
+    filename: str
+    header: list
+    queryset: Callable
+    rows: Callable
+    copy_values: Callable
+    archived_queryset: Callable = None
+
+
+EXPORTS = {
+    ExportJob.PRODUCTS: ExportKind(
+        'productos.csv', PRODUCT_HEADER, product_queryset, product_rows, product_copy_values,
+    ),
+    ExportJob.MOVEMENTS: ExportKind(
+        'movimientos_stock.csv', MOVEMENT_HEADER, movement_queryset, movement_rows, movement_copy_values,
+        archived_movement_queryset,
+    ),
+}
+
+
+def export_querysets(export, params):
+    """Consultas de la exportación, en orden: la principal y, si se pide, la del archivo."""
+    querysets = [export.queryset(params)]
+    if export.archived_queryset is not None:
+        archived = export.archived_queryset(params)
+        if archived is not None:
+            querysets.append(archived)
+    return querysets
+
+
+def export_chunks(export, querysets, on_rows=None):
+    """
+    Trozos del CSV (str o bytes) con las filas de `querysets` una tras
+    otra: COPY en PostgreSQL, csv.writer en el resto. on_rows(n) se llama
+    según se van generando filas.
+    """
+    if connections[querysets[0].db].vendor == 'postgresql':
+        return chain.from_iterable(
+            copy_chunks(export.header if index == 0 else None, export.copy_values(queryset), on_rows)
+            for index, queryset in enumerate(querysets)
+        )
+
+    def counted(rows):
+        for row in rows:
+            if on_rows:
+                on_rows(1)
+            yield row
+
+    rows = chain.from_iterable(export.rows(queryset) for queryset in querysets)
+    return csv_chunks(export.header, counted(rows))
+
+
+def normalize_query(params):
+    """
+    Filtros de la petición en un orden fijo y sin valores vacíos, para que
+    ?a=1&b= y ?b=&a=1 compartan fichero.
+    """
+    return urlencode(sorted(
+        (key, value)
+        for key in params
+        if key not in IGNORED_PARAMS
+        for value in params.getlist(key)
+        if value != ''
+    ))
+
+
+def cache_file_name(kind, query, version):
+    key = hashlib.sha256(f'{kind}|{version}|{query}'.encode('utf-8')).hexdigest()[:40]
+    return f'{EXPORT_DIR}/{kind}-{key}.csv.gz'
+
+
+def export_path(file_name):
+    return Path(settings.MEDIA_ROOT) / file_name
+
+
+def open_export(file_name):
+    """
+    El fichero ya abierto si existe y no ha caducado; si no, None. Abierto
+    una sola vez antes de responder: si evict_exports lo borra después, la
+    descarga en curso sigue leyendo del descriptor.
+    """
+    try:
+        f = open(export_path(file_name), 'rb')
+    except FileNotFoundError:
+        return None
+    if time.time() - os.fstat(f.fileno()).st_mtime >= settings.EXPORT_CACHE_MAX_AGE:
+        f.close()
+        return None
+    return f
+
+
+def write_export(kind, query, file_name, progress=None, progress_every=50_000, keep_open=False):
+    """
+    Genera la exportación en un temporal y lo mueve a su sitio de forma
+    atómica. Devuelve el número de filas. Si se indica, progress(filas) se
+    llama cada `progress_every` filas. Con keep_open=True devuelve además
+    el fichero abierto y al principio, como open_export.
+    """
+    export = EXPORTS[kind]
+    path = export_path(file_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+
+    def on_rows(rows):
+        nonlocal count
+        before, count = count, count + rows
+        if progress and count // progress_every > before // progress_every:
+            progress(count)
+
+    chunks = export_chunks(export, export_querysets(export, QueryDict(query)), on_rows)
+    tmp = tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False)
+    try:
+        for data in gzip_chunks(chunks):
+            tmp.write(data)
+    except BaseException:
+        tmp.close()
+        os.unlink(tmp.name)
+        raise
+    os.replace(tmp.name, path)
+
+    # El temporal sigue abierto: la respuesta lo lee aunque la limpieza de
+    # otra exportación borre el fichero
+    evict_exports()
+    if not keep_open:
+        tmp.close()
+        return count
+    tmp.seek(0)
+    return count, tmp
+
+
+def evict_exports(max_age=None, max_size=None):
+    """
+    Borra los ficheros caducados y, si la carpeta sigue ocupando más de
+    max_size, los más antiguos. El más reciente se conserva siempre.
+    """
+    max_age = settings.EXPORT_CACHE_MAX_AGE if max_age is None else max_age
+    max_size = settings.EXPORT_CACHE_MAX_SIZE if max_size is None else max_size
+    directory = export_path(EXPORT_DIR)
+    if not directory.exists():
+        return 0
+
+    now = time.time()
+    files = []
+    removed = 0
+    for entry in os.scandir(directory):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if entry.name.endswith('.tmp'):
+            # Temporales de otra exportación en curso: solo si llevan mucho tiempo abandonados
+            if now - stat.st_mtime >= max_age:
+                os.unlink(entry.path)
+                removed += 1
+            continue
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = 0
+    for index, (mtime, size, path) in enumerate(sorted(files, reverse=True)):
+        total += size
+        if index and (now - mtime >= max_age or total > max_size):
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+    return removed
+
+
+class GzipReader:
+    """
+    Descomprime un fichero abierto por bloques. La respuesta llama a
+    close() al terminar, también si nunca llegó a leerse.
+    """
+
+    def __init__(self, f, block_size=64 * 1024):
+        self.file = f
+        self.block_size = block_size
+
+    def __iter__(self):
+        with gzip.GzipFile(fileobj=self.file, mode='rb') as g:
+            while block := g.read(self.block_size):
+                yield block
+
+    def close(self):
+        self.file.close()
+
+
+def export_response(f, filename, compressed):
+    """Respuesta con el fichero ya abierto `f` (ver open_export)."""
+    if compressed:
+        return FileResponse(
+            f, as_attachment=True, filename=filename + '.gz', content_type='application/gzip'
+        )
+    response = StreamingHttpResponse(GzipReader(f), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
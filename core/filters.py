@@ -1,17 +1,18 @@
 import django_filters
 from .models import Product, Category, Supplier, StockMovement
+from .search import search_products
+from .services import reference_choices
 from django.db import models
 from django import forms
+from django.utils.choices import CallableChoiceIterator
 
 class ProductFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(
-        field_name='name',
-        lookup_expr='icontains',
+        method='filter_search',
         label='Nombre'
     )
     sku = django_filters.CharFilter(
-        field_name='sku',
-        lookup_expr='icontains',
+        method='filter_search',
         label='SKU'
     )
     category = django_filters.ModelChoiceFilter(
@@ -31,6 +32,25 @@ class ProductFilter(django_filters.FilterSet):
         model = Product
         fields = []  # dejamos vacío porque definimos los filtros arriba
 
+    @property
+    def form(self):
+        if not hasattr(self, '_form'):
+            form = super().form
+            # Desplegables desde la caché (ver services.reference_choices), y
+            # solo si se pintan: las exportaciones usan el filtro sin dibujarlo.
+            # El valor elegido se valida contra la base de datos, que también
+            # ve las categorías y proveedores creados desde otros procesos
+            for name, model in (('category', Category), ('supplier', Supplier)):
+                field = form.fields[name]
+                field.widget.choices = CallableChoiceIterator(
+                    lambda field=field, model=model: [('', field.empty_label)] + reference_choices(model)
+                )
+        return self._form
+
+    def filter_search(self, queryset, name, value):
+        # Índice de texto completo si está disponible (ver core/search.py)
+        return search_products(queryset, value, name)
+
     def filter_low_stock(self, queryset, name, value):
         if value:
             return queryset.filter(stock__lte=models.F('min_stock'))
@@ -38,6 +58,12 @@ class ProductFilter(django_filters.FilterSet):
 
 # Filtro para movimientos de stock
 class StockMovementFilter(django_filters.FilterSet):
+    # Texto en lugar de un desplegable con todos los productos del catálogo
+    product = django_filters.CharFilter(
+        method='filter_product',
+        label='Producto',
+        widget=forms.TextInput(attrs={'placeholder': 'Nombre o SKU'})
+    )
     start_date = django_filters.DateFilter(
         field_name="created_at", 
         lookup_expr='gte', 
@@ -53,4 +79,8 @@ class StockMovementFilter(django_filters.FilterSet):
     
     class Meta:
         model = StockMovement
-        fields = ['product', 'movement_type', 'start_date', 'end_date']
\ No newline at end of file
+        fields = ['product', 'movement_type', 'start_date', 'end_date']
+
+    def filter_product(self, queryset, name, value):
+        products = search_products(Product.objects.all(), value)
+        return queryset.filter(product__in=products.values('pk'))
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django import forms
-from .models import Supplier, Product, StockMovement
+from .models import Category, Supplier, Product, StockMovement
+from .services import reference_choices
 from django.core.exceptions import ValidationError
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
@@ -24,6 +25,13 @@ class ProductForm(forms.ModelForm):
             'is_active'
         ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Desplegables desde la caché; solo la validación consulta la base de datos
+        for name, model in (('category', Category), ('supplier', Supplier)):
+            field = self.fields[name]
+            field.choices = [('', field.empty_label)] + reference_choices(model)
+
 
 class StockMovementForm(forms.ModelForm):
     class Meta:
@@ -39,7 +47,7 @@ class StockMovementForm(forms.ModelForm):
         quantity = cleaned_data.get("quantity")
         movement_type = cleaned_data.get("movement_type")
     
-        if movement_type == StockMovement.EXIT and quantity:
+        if movement_type == StockMovement.EXIT and quantity and product:
             if quantity > product.stock:
                 raise ValidationError(
                     f"Stock insuficiente. Disponible: {product.stock}"
@@ -54,6 +62,12 @@ class ProductImportForm(forms.Form):
         help_text="Sube un CSV con columnas: name, sku, category, supplier, price, stock"
     )
 
+class MovementImportForm(forms.Form):
+    csv_file = forms.FileField(
+        label="Archivo CSV",
+        help_text="Sube un CSV con columnas: sku, type (entrada/salida), quantity, reason"
+    )
+
 # Registro de usuario personalizado
 class CustomUserCreationForm(UserCreationForm):
     email = forms.EmailField(required=True, help_text="Correo electrónico válido")
@@ -0,0 +1,362 @@
+"""
+Importación masiva de productos y movimientos de stock desde CSV.
+
+El fichero se decodifica en streaming y se escribe por bloques: cada bloque
+resuelve categorías y proveedores con los mapas nombre→id cargados una sola
+vez y hace un único INSERT ... ON CONFLICT (sku) DO UPDATE. En PostgreSQL
+las filas del bloque llegan a una tabla temporal con COPY y el upsert se
+hace desde ahí. Los errores de una fila se anotan y la importación continúa.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction, DatabaseError
+from django.utils import timezone
+
+from .cache import bump_reference_version
+from django.core.exceptions import ValidationError
+
+from .models import Category, Supplier, Product, StockMovement, record_movements
+
+
+# Columnas del CSV de productos (las mismas en la web y en la línea de comandos)
+PRODUCT_COLUMNS = ('name', 'sku', 'category', 'supplier', 'price', 'stock')
+
+PRODUCT_UPDATE_FIELDS = ['name', 'category', 'supplier', 'price', 'stock', 'updated_at']
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Tabla temporal de cada conexión PostgreSQL para el upsert con COPY
+PRODUCT_STAGING_TABLE = 'core_product_import'
+
+# Columnas del CSV de movimientos
+MOVEMENT_COLUMNS = ('sku', 'type', 'quantity', 'reason')
+
+# Valores admitidos en la columna 'type'
+MOVEMENT_TYPES = {
+    'in': StockMovement.ENTRY,
+    'entry': StockMovement.ENTRY,
+    'entrada': StockMovement.ENTRY,
+    'out': StockMovement.EXIT,
+    'exit': StockMovement.EXIT,
+    'salida': StockMovement.EXIT,
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+    def merge(self, other):
+        self.created += other.created
+        self.updated += other.updated
+        self.errors.extend(other.errors)
+
+
+@dataclass
+class Chunk:
+    rows: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    last_line: int = None
+
+
+def iter_csv_rows(binary_file, start=2):
+    """
+    Lee un CSV binario sin cargarlo entero en memoria. Devuelve pares
+    (número de fila, dict); la fila 1 es la cabecera.
+    """
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        yield from enumerate(csv.DictReader(text), start=start)
+    finally:
+        # No cerramos el fichero subido al liberar el wrapper
+        if not binary_file.closed:
+            text.detach()
+
+
+def parse_product_row(row):
+    """
+    Valida una fila y devuelve los valores limpios. Lanza RowError con un
+    mensaje legible si algo no es correcto.
+    """
+    missing = [column for column in PRODUCT_COLUMNS if row.get(column) is None]
+    if missing:
+        raise RowError(f"faltan columnas: {', '.join(missing)}")
+
+    values = {column: row[column].strip() for column in PRODUCT_COLUMNS}
+    for column in ('name', 'sku', 'category', 'supplier'):
+        if not values[column]:
+            raise RowError(f"'{column}' está vacío")
+    if len(values['name']) > 200:
+        raise RowError("'name' supera los 200 caracteres")
+    if len(values['sku']) > 50:
+        raise RowError("'sku' supera los 50 caracteres")
+
+    try:
+        values['price'] = Decimal(values['price']).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(f"precio no válido: {values['price']!r}")
+    if values['price'] < 0 or values['price'] >= Decimal('1e8'):
+        raise RowError(f"precio fuera de rango: {values['price']}")
+
+    try:
+        values['stock'] = int(values['stock'])
+    except ValueError:
+        raise RowError(f"stock no válido: {values['stock']!r}")
+    if values['stock'] < 0:
+        raise RowError("el stock no puede ser negativo")
+
+    return values
+
+
+def parse_movement_row(row):
+    """
+    Valida una fila del CSV de movimientos. Lanza RowError si algo no es
+    correcto.
+    """
+    missing = [column for column in MOVEMENT_COLUMNS if row.get(column) is None]
+    if missing:
+        raise RowError(f"faltan columnas: {', '.join(missing)}")
+
+    values = {column: row[column].strip() for column in MOVEMENT_COLUMNS}
+    if not values['sku']:
+        raise RowError("'sku' está vacío")
+
+    movement_type = MOVEMENT_TYPES.get(values.pop('type').lower())
+    if movement_type is None:
+        raise RowError(f"tipo no válido (usa {', '.join(MOVEMENT_TYPES)})")
+    values['movement_type'] = movement_type
+
+    try:
+        values['quantity'] = int(values['quantity'])
+    except ValueError:
+        raise RowError(f"cantidad no válida: {values['quantity']!r}")
+    if values['quantity'] <= 0:
+        raise RowError("la cantidad debe ser mayor que cero")
+
+    if len(values['reason']) > 255:
+        raise RowError("'reason' supera los 255 caracteres")
+
+    return values
+
+
+def chunk_rows(numbered_rows, parse_row, chunk_size):
+    """
+    Agrupa filas (número, dict) en bloques. Cada bloque lleva sus filas
+    válidas, los errores de validación y el número de la última fila
+    leída, para poder confirmar y reanudar bloque a bloque.
+    """
+    chunk = Chunk()
+    for line, row in numbered_rows:
+        chunk.last_line = line
+        try:
+            chunk.rows.append((line, parse_row(row)))
+        except RowError as e:
+            chunk.errors.append(f"Fila {line}: {e}")
+        if len(chunk.rows) >= chunk_size:
+            yield chunk
+            chunk = Chunk()
+    if chunk.last_line is not None:
+        yield chunk
+
+
+class ProductImporter:
+    """
+    Escribe bloques de filas ya validadas. Mantiene en memoria los mapas
+    nombre→id de categorías y proveedores y solo crea los que faltan.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.categories = dict(Category.objects.order_by().values_list('name', 'id'))
+        self.suppliers = dict(Supplier.objects.order_by().values_list('name', 'id'))
+
+    def resolve(self, model, cache, names):
+        missing = {name for name in names if name not in cache}
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+            # bulk_create no emite señales: los desplegables se invalidan a mano
+            bump_reference_version(model._meta.label_lower)
+            cache.update(model.objects.filter(name__in=missing).order_by().values_list('name', 'id'))
+
+    def build_products(self, rows):
+        return [
+            Product(
+                name=values['name'],
+                sku=values['sku'],
+                category_id=self.categories[values['category']],
+                supplier_id=self.suppliers[values['supplier']],
+                price=values['price'],
+                stock=values['stock'],
+            )
+            for values in rows
+        ]
+
+    def copy_upsert(self, rows):
+        """
+        Upsert del bloque en PostgreSQL: COPY a una tabla temporal (vacía al
+        confirmar cada transacción) e INSERT ... SELECT ... ON CONFLICT.
+        """
+        columns = ['name', 'sku', 'category_id', 'supplier_id', 'price', 'stock']
+        field = Product._meta.get_field
+        updates = ', '.join(f'{field(name).column} = EXCLUDED.{field(name).column}' for name in PRODUCT_UPDATE_FIELDS)
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS {PRODUCT_STAGING_TABLE} ('
+                'name varchar(200), sku varchar(50), category_id bigint, supplier_id bigint, '
+                'price numeric(10, 2), stock integer) ON COMMIT DELETE ROWS'
+            )
+            with cursor.copy(f'COPY {PRODUCT_STAGING_TABLE} ({", ".join(columns)}) FROM STDIN') as copy:
+                for product in self.build_products(rows):
+                    copy.write_row([getattr(product, column) for column in columns])
+            cursor.execute(
+                f'INSERT INTO core_product ({", ".join(columns)}, min_stock, is_active, created_at, updated_at) '
+                f'SELECT {", ".join(columns)}, %s, %s, %s, %s FROM {PRODUCT_STAGING_TABLE} '
+                f'ON CONFLICT (sku) DO UPDATE SET {updates}',
+                [field('min_stock').get_default(), field('is_active').get_default(), now, now],
+            )
+            cursor.execute(f'TRUNCATE {PRODUCT_STAGING_TABLE}')
+
+    def upsert(self, rows):
+        if connection.vendor == 'postgresql':
+            self.copy_upsert(rows)
+        else:
+            Product.objects.bulk_create(
+                self.build_products(rows),
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=PRODUCT_UPDATE_FIELDS,
+            )
+
+    def write_chunk(self, rows):
+        """
+        rows: lista de (número de fila, valores limpios). Devuelve un
+        ImportResult. Todo el bloque va en una transacción.
+        """
+        result = ImportResult()
+        # Si un SKU se repite en el bloque gana la última fila
+        by_sku = {values['sku']: (line, values) for line, values in rows}
+        rows = list(by_sku.values())
+        if not rows:
+            return result
+
+        with transaction.atomic():
+            self.resolve(Category, self.categories, {values['category'] for _, values in rows})
+            self.resolve(Supplier, self.suppliers, {values['supplier'] for _, values in rows})
+
+            existing = set(Product.objects.filter(sku__in=by_sku).values_list('sku', flat=True))
+            try:
+                with transaction.atomic():
+                    self.upsert([values for _, values in rows])
+                result.updated = len(existing)
+                result.created = len(rows) - len(existing)
+            except DatabaseError:
+                # Algo en el bloque falla en la base de datos: fila a fila para aislarlo
+                for line, values in rows:
+                    try:
+                        with transaction.atomic():
+                            Product.objects.bulk_create(
+                                self.build_products([values]),
+                                update_conflicts=True,
+                                unique_fields=['sku'],
+                                update_fields=PRODUCT_UPDATE_FIELDS,
+                            )
+                    except DatabaseError as e:
+                        result.errors.append(f"Fila {line}: {e}")
+                    else:
+                        if values['sku'] in existing:
+                            result.updated += 1
+                        else:
+                            result.created += 1
+
+        return result
+
+    def chunks(self, numbered_rows):
+        return chunk_rows(numbered_rows, parse_product_row, self.chunk_size)
+
+    def import_chunk(self, chunk):
+        result = self.write_chunk(chunk.rows)
+        result.errors[:0] = chunk.errors
+        return result
+
+    def run(self, numbered_rows):
+        result = ImportResult()
+        for chunk in self.chunks(numbered_rows):
+            result.merge(self.import_chunk(chunk))
+        return result
+
+
+def import_products_csv(binary_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    return ProductImporter(chunk_size).run(iter_csv_rows(binary_file))
+
+
+class MovementImporter:
+    """
+    Registra movimientos de stock por bloques. Cada bloque resuelve sus SKUs
+    con una sola consulta y se guarda con record_movements: si dejaría algún
+    producto con stock negativo se rechaza el bloque entero.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, user=None):
+        self.chunk_size = chunk_size
+        self.user = user
+
+    def write_chunk(self, rows):
+        result = ImportResult()
+        if not rows:
+            return result
+
+        skus = {values['sku'] for _, values in rows}
+        product_ids = dict(Product.objects.filter(sku__in=skus).order_by().values_list('sku', 'pk'))
+
+        movements = []
+        for line, values in rows:
+            product_id = product_ids.get(values['sku'])
+            if product_id is None:
+                result.errors.append(f"Fila {line}: no existe ningún producto con SKU {values['sku']!r}")
+                continue
+            movements.append(StockMovement(
+                product_id=product_id,
+                movement_type=values['movement_type'],
+                quantity=values['quantity'],
+                reason=values['reason'],
+            ))
+
+        if movements:
+            try:
+                result.created = len(record_movements(movements, user=self.user))
+            except ValidationError as e:
+                first, last = rows[0][0], rows[-1][0]
+                result.errors.append(f"Filas {first}-{last} rechazadas: {'; '.join(e.messages)}")
+        return result
+
+    def chunks(self, numbered_rows):
+        return chunk_rows(numbered_rows, parse_movement_row, self.chunk_size)
+
+    def import_chunk(self, chunk):
+        result = self.write_chunk(chunk.rows)
+        result.errors[:0] = chunk.errors
+        return result
+
+    def run(self, numbered_rows):
+        result = ImportResult()
+        for chunk in self.chunks(numbered_rows):
+            result.merge(self.import_chunk(chunk))
+        return result
+
+
+def import_movements_csv(binary_file, user=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    return MovementImporter(chunk_size, user).run(iter_csv_rows(binary_file))
@@ -0,0 +1,147 @@
+"""
+Ejecución de importaciones y exportaciones en segundo plano.
+
+Las tablas ImportJob y ExportJob hacen de cola (sin broker externo). Un trabajo se reclama
+con SELECT ... FOR UPDATE SKIP LOCKED donde la base de datos lo admite
+(PostgreSQL) y con un UPDATE condicional en SQLite, así dos workers nunca
+procesan el mismo. Cada
+bloque importado y el progreso del trabajo se confirman en la misma
+transacción: si el worker muere, otro retoma el trabajo desde la última
+fila confirmada cuando su señal de vida caduca.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .exports import write_export
+from .importers import ProductImporter, iter_csv_rows, DEFAULT_CHUNK_SIZE
+from .models import ImportJob, ExportJob
+
+
+logger = logging.getLogger(__name__)
+
+# Un trabajo "en curso" sin señal de vida durante este tiempo se da por abandonado
+STALE_AFTER = timedelta(minutes=2)
+
+
+class JobLost(Exception):
+    """Otro worker ha reclamado el trabajo (este se consideró caído)."""
+
+
+def claimable_jobs(model=ImportJob):
+    stale = timezone.now() - STALE_AFTER
+    return model.objects.filter(
+        Q(status=model.PENDING) | Q(status=model.RUNNING, heartbeat_at__lt=stale)
+    )
+
+
+def claim_next_job(worker, model=ImportJob):
+    if connection.features.has_select_for_update_skip_locked:
+        # Cada worker salta las filas que otro está reclamando: no hay
+        # esperas ni reintentos aunque muchos consulten la cola a la vez
+        with transaction.atomic():
+            job = (
+                claimable_jobs(model).order_by('created_at')
+                .select_for_update(skip_locked=True).first()
+            )
+            if job is None:
+                return None
+            job.status = model.RUNNING
+            job.worker = worker
+            job.heartbeat_at = timezone.now()
+            job.save(update_fields=['status', 'worker', 'heartbeat_at'])
+            return job
+
+    # SQLite no tiene bloqueos por fila: UPDATE condicional sobre unos
+    # pocos candidatos
+    candidates = claimable_jobs(model).order_by('created_at').values_list('pk', flat=True)[:10]
+    for pk in candidates:
+        claimed = claimable_jobs(model).filter(pk=pk).update(
+            status=model.RUNNING,
+            worker=worker,
+            heartbeat_at=timezone.now(),
+        )
+        if claimed:
+            return model.objects.get(pk=pk)
+    return None
+
+
+def save_progress(job, chunk, result):
+    job.errors = (job.errors + result.errors)[:ImportJob.MAX_ERRORS]
+    updated = ImportJob.objects.filter(pk=job.pk, worker=job.worker).update(
+        last_line=chunk.last_line,
+        created_count=F('created_count') + result.created,
+        updated_count=F('updated_count') + result.updated,
+        error_count=F('error_count') + len(result.errors),
+        errors=job.errors,
+        heartbeat_at=timezone.now(),
+    )
+    if not updated:
+        raise JobLost(f"El trabajo {job.pk} ya no pertenece a {job.worker}")
+    job.last_line = chunk.last_line
+
+
+def run_job(job, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Procesa un trabajo ya reclamado, saltando las filas confirmadas en
+    ejecuciones anteriores.
+    """
+    job.start_line = job.last_line
+    job.started_at = timezone.now()
+    job.save(update_fields=['start_line', 'started_at'])
+
+    importer = ProductImporter(chunk_size)
+    try:
+        with job.file.open('rb') as f:
+            rows = ((line, row) for line, row in iter_csv_rows(f) if line > job.start_line)
+            # Cada bloque confirmado cambia por sí solo la versión de los datos
+            # (su MAX(updated_at)): ETag y exportaciones no esperan al final
+            for chunk in importer.chunks(rows):
+                with transaction.atomic():
+                    result = importer.import_chunk(chunk)
+                    save_progress(job, chunk, result)
+    except JobLost:
+        logger.warning("Trabajo %s reclamado por otro worker", job.pk)
+        return
+    except Exception as e:
+        logger.exception("Error en la importación %s", job.pk)
+        ImportJob.objects.filter(pk=job.pk, worker=job.worker).update(
+            status=ImportJob.FAILED, message=str(e), finished_at=timezone.now()
+        )
+        return
+
+    ImportJob.objects.filter(pk=job.pk, worker=job.worker).update(
+        status=ImportJob.DONE, finished_at=timezone.now()
+    )
+
+
+def run_export_job(job):
+    """
+    Genera el fichero de una exportación ya reclamada. No se reanuda: si el
+    worker muere, otro la repite entera.
+    """
+    def heartbeat(rows):
+        updated = ExportJob.objects.filter(pk=job.pk, worker=job.worker).update(
+            rows=rows, heartbeat_at=timezone.now()
+        )
+        if not updated:
+            raise JobLost(f"El trabajo {job.pk} ya no pertenece a {job.worker}")
+
+    try:
+        rows = write_export(job.kind, job.query, job.file_name, progress=heartbeat)
+    except JobLost:
+        logger.warning("Exportación %s reclamada por otro worker", job.pk)
+        return
+    except Exception as e:
+        logger.exception("Error en la exportación %s", job.pk)
+        ExportJob.objects.filter(pk=job.pk, worker=job.worker).update(
+            status=ExportJob.FAILED, message=str(e), finished_at=timezone.now()
+        )
+        return
+
+    ExportJob.objects.filter(pk=job.pk, worker=job.worker).update(
+        status=ExportJob.DONE, rows=rows, finished_at=timezone.now()
+    )
@@ -0,0 +1,86 @@
+"""
+Utilidades compartidas por los comandos de benchmark.
+
+Los benchmarks trabajan sobre una base de datos de prueba temporal, igual que
+los tests, para no modificar nunca los datos reales.
+"""
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection
+
+from core.models import Category, Supplier, Product
+
+
+@contextmanager
+def benchmark_database(test_name=None):
+    # test_name: fichero para la base temporal (por defecto SQLite la crea en
+    # memoria, que otros procesos no pueden abrir)
+    # Ninguna conexión abierta con la base real: la siguiente se abre ya con
+    # el nombre de la temporal
+    connection.close()
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST']['NAME']
+    if test_name is not None:
+        connection.settings_dict['TEST']['NAME'] = test_name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+
+
+@contextmanager
+def timer():
+    # Uso: with timer() as t: ...; t['seconds']
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - start
+
+
+def create_products(count, stock=0, prefix='BENCH', batch_size=10_000):
+    category, _ = Category.objects.get_or_create(name='Benchmark')
+    supplier, _ = Supplier.objects.get_or_create(name='Benchmark')
+    # Por lotes para no tener millones de instancias en memoria a la vez
+    for first in range(0, count, batch_size):
+        Product.objects.bulk_create(
+            [
+                Product(
+                    name=f'Producto {i}',
+                    sku=f'{prefix}-{i:08d}',
+                    category=category,
+                    supplier=supplier,
+                    stock=stock,
+                    price=Decimal('9.99'),
+                )
+                for i in range(first, min(first + batch_size, count))
+            ],
+            batch_size=1000,
+        )
+    return list(Product.objects.filter(sku__startswith=f'{prefix}-').values_list('pk', flat=True))
+
+
+def percentile(values, fraction):
+    # Valor por debajo del cual queda esa fracción de las muestras
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+@contextmanager
+def explicit_created_at(*models):
+    # Permite fijar created_at a mano en bulk_create (auto_now_add lo pisaría)
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
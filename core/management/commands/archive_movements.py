@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import StockMovement, StockMovementArchive
+
+
+ARCHIVE_FIELDS = [
+    'id', 'product_id', 'movement_type', 'quantity', 'reason', 'created_at', 'created_by_id', 'balance_after',
+]
+
+# Ids por DELETE (SQLite admite 999 parámetros por consulta)
+DELETE_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve a StockMovementArchive, por bloques, los movimientos anteriores a '
+        '--older-than días. Cada producto conserva una fila de saldo de apertura con '
+        'la cantidad neta archivada, así el stock, los saldos y la reconciliación cuadran.'
+    )
+
+    reason = 'Saldo de apertura (movimientos archivados)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True,
+                            help='Días: se archiva todo lo anterior a esa medianoche')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Movimientos archivados por transacción')
+
+    def cutoff(self, days):
+        # A medianoche (hora local): ningún día queda repartido entre las dos
+        # tablas y rebuild_daily_summary puede sumarlas sin solaparse
+        day = timezone.localdate() - timedelta(days=days)
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def handle(self, *args, **options):
+        cutoff = self.cutoff(options['older_than'])
+        total = 0
+        while True:
+            with transaction.atomic():
+                archived = self.archive_chunk(cutoff, options['chunk_size'])
+            if not archived:
+                break
+            total += archived
+            self.stdout.write(f'  {total} movimientos archivados')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} movimientos anteriores al {cutoff:%Y-%m-%d} archivados'
+        ))
+
+    def archive_chunk(self, cutoff, chunk_size):
+        rows = list(
+            StockMovement.objects.filter(created_at__lt=cutoff, is_opening=False)
+            .order_by('id')
+            .values_list(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return 0
+
+        StockMovementArchive.objects.bulk_create(
+            [StockMovementArchive(**dict(zip(ARCHIVE_FIELDS, row))) for row in rows]
+        )
+
+        # Cantidad neta y último movimiento (fecha, id, saldo) de cada producto
+        net = defaultdict(int)
+        last = {}
+        for movement_id, product_id, movement_type, quantity, _, created_at, _, balance in rows:
+            net[product_id] += quantity if movement_type == StockMovement.ENTRY else -quantity
+            if product_id not in last or (created_at, movement_id) > last[product_id][:2]:
+                last[product_id] = (created_at, movement_id, balance)
+
+        openings = {
+            movement.product_id: movement
+            for movement in StockMovement.objects.filter(product_id__in=net, is_opening=True)
+        }
+        new_openings = [
+            StockMovement(product_id=product_id, movement_type=StockMovement.ENTRY, quantity=0,
+                          reason=self.reason, is_opening=True)
+            for product_id in net if product_id not in openings
+        ]
+        # created_at es auto_now_add: se fija después con bulk_update
+        for movement in StockMovement.objects.bulk_create(new_openings):
+            movement.created_at = None
+            openings[movement.product_id] = movement
+
+        for product_id, delta in net.items():
+            opening = openings[product_id]
+            created_at, _, balance = last[product_id]
+            if opening.created_at is None or created_at > opening.created_at:
+                opening.created_at = created_at
+                opening.balance_after = balance
+            signed = opening.quantity if opening.movement_type == StockMovement.ENTRY else -opening.quantity
+            signed += delta
+            opening.movement_type = StockMovement.ENTRY if signed >= 0 else StockMovement.EXIT
+            opening.quantity = abs(signed)
+
+        StockMovement.objects.bulk_update(
+            openings.values(), ['movement_type', 'quantity', 'created_at', 'balance_after'], batch_size=500
+        )
+        # DELETE directo: QuerySet.delete() cargaría las filas en cuanto
+        # StockMovement tuviera receptores de pre_delete o post_delete.
+        # Ningún modelo apunta a StockMovement, no hay cascadas que seguir
+        table = connection.ops.quote_name(StockMovement._meta.db_table)
+        ids = [row[0] for row in rows]
+        with connection.cursor() as cursor:
+            for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                batch = ids[i:i + DELETE_BATCH_SIZE]
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(batch))})', batch
+                )
+        return len(rows)
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Product, StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula el saldo (balance_after) de los movimientos existentes, por bloques '
+        'de productos. Ejecutar sin escrituras concurrentes de movimientos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Productos procesados por transacción')
+        parser.add_argument('--all', action='store_true',
+                            help='Recalcula también los productos que ya tienen saldo')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        products = Product.objects.order_by('pk')
+        if not options['all']:
+            products = products.filter(movements__balance_after__isnull=True).distinct()
+        product_ids = list(products.values_list('pk', flat=True))
+
+        updated = 0
+        skipped = []
+        for i in range(0, len(product_ids), chunk_size):
+            with transaction.atomic():
+                chunk_updated, chunk_skipped = self.backfill_chunk(product_ids[i:i + chunk_size])
+            updated += chunk_updated
+            skipped += chunk_skipped
+            self.stdout.write(f'  {min(i + chunk_size, len(product_ids))}/{len(product_ids)} productos')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {updated} movimientos actualizados'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️  {len(skipped)} productos omitidos: su stock no cuadra con los movimientos '
+                f'(ids: {", ".join(map(str, skipped[:20]))})'
+            ))
+
+    def backfill_chunk(self, product_ids):
+        """
+        Recorre los movimientos de cada producto del más reciente al más antiguo
+        partiendo del stock actual: el saldo del último movimiento es el stock y
+        cada anterior es el siguiente menos su variación.
+        """
+        stocks = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'))
+        movements = (
+            StockMovement.objects.filter(product_id__in=product_ids)
+            .order_by('product_id', '-created_at', '-id')
+            .values_list('id', 'product_id', 'movement_type', 'quantity')
+        )
+
+        pending = {}
+        balances = {}
+        broken = set()
+        for movement_id, product_id, movement_type, quantity in movements.iterator(chunk_size=2000):
+            balance = balances.get(product_id, stocks[product_id])
+            if balance < 0:
+                broken.add(product_id)
+            pending[movement_id] = (product_id, balance)
+            balances[product_id] = balance - quantity if movement_type == StockMovement.ENTRY else balance + quantity
+
+        # El saldo previo al primer movimiento tampoco puede ser negativo
+        broken.update(pk for pk, balance in balances.items() if balance < 0)
+
+        to_update = [
+            StockMovement(id=movement_id, balance_after=balance)
+            for movement_id, (product_id, balance) in pending.items()
+            if product_id not in broken
+        ]
+        StockMovement.objects.bulk_update(to_update, ['balance_after'], batch_size=1000)
+        return len(to_update), sorted(broken)
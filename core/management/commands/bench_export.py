@@ -0,0 +1,120 @@
+import resource
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from django.test import RequestFactory, override_settings
+
+from core.exports import EXPORTS, export_chunks, export_querysets, gzip_chunks
+from core.models import ExportJob, StockMovement
+from core.views import export_products, export_movements
+from ._bench import benchmark_database, timer, create_products
+
+
+def rss_mb():
+    """
+    RSS actual en MB (Linux). Se muestrea tras cada trozo exportado: el pico
+    de getrusage incluye la carga de datos y no se puede reiniciar.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss va en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo, el volumen (MB/s) y la memoria pico de las exportaciones CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Productos y movimientos a exportar')
+
+    def load_movements(self, total, product_ids, user):
+        for first in range(0, total, 10_000):
+            StockMovement.objects.bulk_create([
+                StockMovement(
+                    product_id=product_ids[i % len(product_ids)],
+                    movement_type=StockMovement.ENTRY if i % 3 else StockMovement.EXIT,
+                    quantity=1 + i % 10,
+                    reason='benchmark',
+                    created_by=user,
+                )
+                for i in range(first, min(first + 10_000, total))
+            ], batch_size=1000)
+
+    def generate(self, kind, compress=False):
+        # El generador en streaming directamente, sin la caché de ficheros:
+        # cada ejecución mide la consulta y el CSV completos
+        export = EXPORTS[kind]
+        chunks = export_chunks(export, export_querysets(export, QueryDict()))
+        return gzip_chunks(chunks) if compress else chunks
+
+    def serve(self, view, path, user):
+        request = RequestFactory().get(path)
+        request.user = user
+        return view(request).streaming_content
+
+    def measure(self, make_chunks, rows):
+        rss_before = peak = rss_mb()
+        size = 0
+        with timer() as t:
+            for chunk in make_chunks():
+                size += len(chunk)
+                peak = max(peak, rss_mb())
+        megabytes = size / 1024 / 1024
+        return {
+            'seconds': t['seconds'],
+            'megabytes': megabytes,
+            'throughput': megabytes / t['seconds'],
+            'rows_per_second': rows / t['seconds'],
+            'peak_rss': peak,
+            'rss_growth': peak - rss_before,
+        }
+
+    def handle(self, *args, **options):
+        total = options['rows']
+
+        # Sin trabajos en segundo plano (ninguna exportación pasa de `total`
+        # filas) y con una caché de ficheros vacía
+        settings = override_settings(MEDIA_ROOT=tempfile.mkdtemp(), EXPORT_ASYNC_ROWS=total)
+        with benchmark_database(), settings:
+            self.stdout.write(f'Cargando {total} productos y {total} movimientos...')
+            user = get_user_model().objects.create_user('benchmark')
+            product_ids = create_products(total)
+            self.load_movements(total, product_ids, user)
+            del product_ids
+
+            # Generación (CSV y CSV comprimido, como el fichero de la caché) y,
+            # aparte, la vista sirviendo el fichero ya cacheado
+            products, movements = ExportJob.PRODUCTS, ExportJob.MOVEMENTS
+            cases = [
+                ('Productos', lambda: self.generate(products)),
+                ('  gzip', lambda: self.generate(products, compress=True)),
+                ('  vista, caché', lambda: self.serve(export_products, '/products/export/', user)),
+                ('Movimientos', lambda: self.generate(movements)),
+                ('  gzip', lambda: self.generate(movements, compress=True)),
+                ('  vista, caché', lambda: self.serve(export_movements, '/movements/export/', user)),
+            ]
+            # Fuera de la medición: la primera petición a cada vista genera su fichero
+            for view, path in [(export_products, '/products/export/'), (export_movements, '/movements/export/')]:
+                for _ in self.serve(view, path, user):
+                    pass
+            self.stdout.write(
+                f"{'Exportación':<18} {'Tiempo':>9} {'Tamaño':>10} {'MB/s':>8} {'Filas/s':>10} "
+                f"{'RSS pico':>10} {'Crece':>8}"
+            )
+            for label, make_chunks in cases:
+                r = self.measure(make_chunks, total)
+                self.stdout.write(
+                    f"{label:<18} {r['seconds']:>8.2f}s {r['megabytes']:>8.1f}MB {r['throughput']:>8.1f} "
+                    f"{r['rows_per_second']:>10,.0f} {r['peak_rss']:>8.0f}MB {r['rss_growth']:>6.0f}MB"
+                )
+            self.stdout.write(self.style.SUCCESS(
+                '✅ "Crece" es lo que sube el RSS del proceso durante cada exportación'
+            ))
@@ -0,0 +1,80 @@
+import csv
+import io
+import random
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from core.importers import PRODUCT_COLUMNS, import_products_csv
+from core.models import Category, Supplier, Product
+from ._bench import benchmark_database, timer
+
+
+class Command(BaseCommand):
+    help = 'Mide el rendimiento (filas/s) de la importación de productos desde CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200_000)
+        parser.add_argument('--legacy-rows', type=int, default=5_000,
+                            help='Filas para medir el importador fila a fila anterior')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def write_csv(self, f, rows, rng):
+        text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(PRODUCT_COLUMNS)
+        for i in range(rows):
+            writer.writerow([
+                f'Producto "{i}", modelo {rng.randint(1, 999)}',
+                f'SKU-{i:08d}',
+                f'Categoría {rng.randint(1, 50)}',
+                f'Proveedor {rng.randint(1, 200)}',
+                f'{rng.uniform(1, 500):.2f}',
+                rng.randint(0, 1000),
+            ])
+        text.detach()
+        f.seek(0)
+
+    def legacy_import(self, f):
+        # El importador anterior: get_or_create/update_or_create por fila
+        for row in csv.DictReader(io.TextIOWrapper(f, encoding='utf-8')):
+            category, _ = Category.objects.get_or_create(name=row['category'])
+            supplier, _ = Supplier.objects.get_or_create(name=row['supplier'])
+            Product.objects.update_or_create(
+                sku=row['sku'],
+                defaults={
+                    'name': row['name'],
+                    'category': category,
+                    'supplier': supplier,
+                    'price': float(row['price']),
+                    'stock': int(row['stock']),
+                }
+            )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with benchmark_database():
+            with tempfile.TemporaryFile() as f:
+                self.write_csv(f, options['legacy_rows'], rng)
+                with timer() as legacy:
+                    self.legacy_import(f)
+            Product.objects.all().delete()
+
+            with tempfile.TemporaryFile() as f:
+                self.write_csv(f, options['rows'], rng)
+                with timer() as streaming:
+                    result = import_products_csv(f, chunk_size=options['chunk_size'])
+
+            # Segunda pasada: todas las filas son actualizaciones
+            with tempfile.TemporaryFile() as f:
+                self.write_csv(f, options['rows'], rng)
+                with timer() as update:
+                    import_products_csv(f, chunk_size=options['chunk_size'])
+
+        self.stdout.write(f"Fila a fila:         {options['legacy_rows'] / legacy['seconds']:>10.0f} filas/s")
+        self.stdout.write(f"Streaming (altas):   {options['rows'] / streaming['seconds']:>10.0f} filas/s")
+        self.stdout.write(f"Streaming (cambios): {options['rows'] / update['seconds']:>10.0f} filas/s")
+        if result.errors:
+            self.stdout.write(self.style.WARNING(f'⚠️  {len(result.errors)} filas con errores'))
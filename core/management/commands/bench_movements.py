@@ -0,0 +1,56 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from core.models import StockMovement, record_movements
+from ._bench import benchmark_database, timer, create_products
+
+
+class Command(BaseCommand):
+    help = 'Compara el guardado movimiento a movimiento con record_movements()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 10_000, 100_000])
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def build_batch(self, size, product_ids, rng):
+        return [
+            StockMovement(
+                product_id=rng.choice(product_ids),
+                movement_type=StockMovement.ENTRY if rng.random() < 0.7 else StockMovement.EXIT,
+                quantity=rng.randint(1, 20),
+                reason='benchmark',
+            )
+            for _ in range(size)
+        ]
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with benchmark_database():
+            product_ids = create_products(options['products'], stock=10**9)
+
+            self.stdout.write(f"{'Líneas':>10} {'Por fila (s)':>14} {'Lote (s)':>10} {'Mejora':>8} {'Filas/s lote':>14}")
+            for size in options['sizes']:
+                batch = self.build_batch(size, product_ids, rng)
+
+                with timer() as per_row:
+                    for movement in batch:
+                        # save() necesita el producto; lo cargamos como haría la vista
+                        StockMovement(
+                            product=movement.product,
+                            movement_type=movement.movement_type,
+                            quantity=movement.quantity,
+                            reason=movement.reason,
+                        ).save()
+                StockMovement.objects.all().delete()
+
+                with timer() as bulk:
+                    record_movements(batch)
+                StockMovement.objects.all().delete()
+
+                self.stdout.write(
+                    f"{size:>10} {per_row['seconds']:>14.3f} {bulk['seconds']:>10.3f} "
+                    f"{per_row['seconds'] / bulk['seconds']:>7.1f}x {size / bulk['seconds']:>14.0f}"
+                )
@@ -0,0 +1,71 @@
+import random
+from datetime import timedelta
+
+from django.core.paginator import Paginator
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import StockMovement
+from core.pagination import cursor_paginate, encode_cursor
+from ._bench import benchmark_database, timer, create_products, explicit_created_at
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia de la paginación OFFSET y por cursor en páginas profundas'
+
+    ordering = ('-created_at', '-id')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movements', type=int, default=1_000_000)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--pages', nargs='+', type=int, default=[1, 1000, 100_000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def load_movements(self, total, product_ids):
+        rng = random.Random(1)
+        start = timezone.now() - timedelta(days=365)
+        step = timedelta(days=365) / total
+        with explicit_created_at(StockMovement):
+            for first in range(0, total, 10_000):
+                StockMovement.objects.bulk_create([
+                    StockMovement(
+                        product_id=rng.choice(product_ids),
+                        movement_type=StockMovement.ENTRY,
+                        quantity=1,
+                        created_at=start + step * i,
+                    )
+                    for i in range(first, min(first + 10_000, total))
+                ])
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        repeat = options['repeat']
+
+        with benchmark_database():
+            product_ids = create_products(100)
+            self.stdout.write(f"Cargando {options['movements']} movimientos...")
+            self.load_movements(options['movements'], product_ids)
+            queryset = StockMovement.objects.select_related('product')
+            ordered = queryset.order_by(*self.ordering)
+
+            self.stdout.write(f"{'Página':>10} {'OFFSET + COUNT (ms)':>20} {'Cursor (ms)':>12}")
+            for page in options['pages']:
+                # El cursor de la página N son los valores de la última fila de la N-1
+                offset = (page - 1) * page_size
+                token = None
+                if offset:
+                    token = encode_cursor(ordered.values_list('created_at', 'id')[offset - 1])
+
+                with timer() as offset_time:
+                    for _ in range(repeat):
+                        paginator = Paginator(ordered, page_size)
+                        list(paginator.page(page).object_list)
+
+                with timer() as cursor_time:
+                    for _ in range(repeat):
+                        cursor_paginate(queryset, self.ordering, page_size, token)
+
+                self.stdout.write(
+                    f"{page:>10} {offset_time['seconds'] * 1000 / repeat:>20.2f} "
+                    f"{cursor_time['seconds'] * 1000 / repeat:>12.2f}"
+                )
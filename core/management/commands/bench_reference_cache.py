@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Category, Supplier
+from ._bench import benchmark_database, timer, create_products
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide lo que ahorra la caché de categorías y proveedores al pintar el '
+        'listado de productos y el formulario de alta'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=500)
+        parser.add_argument('--suppliers', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def measure(self, client, url, repeat, cold):
+        queries = 0
+        with timer() as t:
+            for _ in range(repeat):
+                if cold:
+                    # Sin caché: equivale al comportamiento anterior
+                    cache.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    client.get(url)
+                queries += len(ctx)
+        return t['seconds'] * 1000 / repeat, queries / repeat
+
+    def handle(self, *args, **options):
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=['*']):
+            Category.objects.bulk_create([Category(name=f'Categoría {i}') for i in range(options['categories'])])
+            Supplier.objects.bulk_create([Supplier(name=f'Proveedor {i}') for i in range(options['suppliers'])])
+            create_products(1000)
+
+            client = Client()
+            client.force_login(get_user_model().objects.create_superuser('benchmark'))
+
+            self.stdout.write(f"{'Página':<22} {'Sin caché':>18} {'Con caché':>18}")
+            for label, url in [('Listado de productos', reverse('product_list')),
+                               ('Alta de producto', reverse('product_create'))]:
+                cold_ms, cold_queries = self.measure(client, url, options['repeat'], cold=True)
+                client.get(url)
+                warm_ms, warm_queries = self.measure(client, url, options['repeat'], cold=False)
+                self.stdout.write(
+                    f"{label:<22} {cold_ms:>8.2f}ms {cold_queries:>4.0f} cons. "
+                    f"{warm_ms:>8.2f}ms {warm_queries:>4.0f} cons."
+                )
+            self.stdout.write(self.style.SUCCESS('✅ Las consultas incluyen sesión y usuario'))
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from core.views import ProductListView
+from ._bench import benchmark_database, timer, create_products
+
+
+def templates_without_cached_loader():
+    templates = [dict(engine, OPTIONS=dict(engine['OPTIONS'])) for engine in settings.TEMPLATES]
+    templates[0]['OPTIONS']['loaders'] = [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]
+    return templates
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de pintar una página de 100 productos con y sin las cachés de plantillas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def measure(self, view, user, repeat, clear_cache):
+        with timer() as t:
+            for _ in range(repeat):
+                if clear_cache:
+                    cache.clear()
+                request = RequestFactory().get('/products/')
+                request.user = user
+                view(request).render()
+        return t['seconds'] * 1000 / repeat
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        # Una sola página con todas las filas
+        view = ProductListView.as_view(paginate_by=options['rows'])
+
+        with benchmark_database():
+            create_products(options['rows'])
+            user = get_user_model().objects.create_user('benchmark')
+
+            with override_settings(TEMPLATES=templates_without_cached_loader()):
+                baseline = self.measure(view, user, repeat, clear_cache=True)
+            cold = self.measure(view, user, repeat, clear_cache=True)
+            warm = self.measure(view, user, repeat, clear_cache=False)
+
+            self.stdout.write(f"Página de {options['rows']} productos (media de {repeat} peticiones):")
+            self.stdout.write(f'  Sin caché de plantillas ni de filas:  {baseline:8.2f} ms')
+            self.stdout.write(f'  Plantillas en caché, filas en frío:   {cold:8.2f} ms')
+            self.stdout.write(f'  Plantillas y filas en caché:          {warm:8.2f} ms')
+            self.stdout.write(self.style.SUCCESS(f'✅ {baseline / warm:.1f}x más rápido con ambas cachés'))
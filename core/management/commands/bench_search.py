@@ -0,0 +1,74 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core.models import Category, Supplier, Product
+from core.search import search_products, fts_available
+from ._bench import benchmark_database, timer
+
+
+WORDS = [
+    'Monitor', 'Teclado', 'Ratón', 'Cable', 'Disco', 'Memoria', 'Silla', 'Lámpara',
+    'Taladro', 'Papel', 'Carpeta', 'Escritorio', 'Bolígrafo', 'Auriculares', 'Router',
+    'LED', 'USB', 'HDMI', 'Inalámbrico', 'Ergonómica', 'Metálica', 'Pro', 'Mini', 'XL',
+]
+
+
+class Command(BaseCommand):
+    help = 'Mide la búsqueda de productos (FTS5 frente a icontains) sobre un catálogo grande'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def load_products(self, total, rng):
+        category = Category.objects.create(name='Benchmark')
+        supplier = Supplier.objects.create(name='Benchmark')
+        for first in range(0, total, 10_000):
+            Product.objects.bulk_create([
+                Product(
+                    name=' '.join(rng.sample(WORDS, 3)) + f' {i}',
+                    sku=f'{rng.choice(WORDS)[:3].upper()}-{i:08d}',
+                    category=category,
+                    supplier=supplier,
+                    price=Decimal('9.99'),
+                )
+                for i in range(first, min(first + 10_000, total))
+            ])
+
+    def measure(self, queryset_for, repeat):
+        # Lo mismo que hace el listado: COUNT y primera página ordenada por nombre
+        with timer() as t:
+            for _ in range(repeat):
+                queryset = queryset_for()
+                queryset.count()
+                list(queryset.order_by('name').values_list('pk', flat=True)[:10])
+        return t['seconds'] * 1000 / repeat
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+
+        with benchmark_database() as connection:
+            self.stdout.write(f"Cargando {options['products']} productos...")
+            self.load_products(options['products'], rng)
+            if not fts_available(connection):
+                self.stdout.write(self.style.WARNING('⚠️  FTS5 no disponible: solo se mide icontains'))
+
+            queries = [
+                ('name', 'ergonómica'),
+                ('name', 'Monitor USB'),
+                ('sku', '-0012345'),
+                ('sku', 'no-existe'),
+            ]
+            self.stdout.write(f"{'Búsqueda':>25} {'icontains (ms)':>15} {'FTS5 (ms)':>10}")
+            for column, text in queries:
+                icontains = self.measure(
+                    lambda: Product.objects.filter(**{f'{column}__icontains': text}), repeat
+                )
+                fts = self.measure(
+                    lambda: search_products(Product.objects.all(), text, column), repeat
+                )
+                self.stdout.write(f"{column + ':' + text:>25} {icontains:>15.2f} {fts:>10.2f}")
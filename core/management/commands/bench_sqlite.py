@@ -0,0 +1,121 @@
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from core.models import Product, StockMovement, record_movements
+from ._bench import benchmark_database, create_products, percentile
+
+
+# Configuración por defecto de Django y SQLite: diario DELETE, sin espera
+# propia (la de 5 s del módulo sqlite3) y BEGIN diferido
+DEFAULT_OPTIONS = {}
+
+PAGE_SIZE = 20
+
+
+def configure_worker(options):
+    # Cada proceso abre su propia conexión con las opciones del perfil
+    connection.settings_dict['OPTIONS'] = options
+    connection.close()
+
+
+def run_worker(role, seconds, product_ids, seed):
+    """
+    Lectores: una página del listado de productos. Escritores: un movimiento
+    con record_movements(). Devuelve operaciones, bloqueos y latencias.
+    """
+    rng = random.Random(seed)
+    latencies = []
+    locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if role == 'read':
+                offset = rng.randrange(max(1, len(product_ids) - PAGE_SIZE))
+                list(
+                    Product.objects.select_related('category', 'supplier')
+                    .order_by('name')[offset:offset + PAGE_SIZE]
+                )
+            else:
+                record_movements([StockMovement(
+                    product_id=rng.choice(product_ids),
+                    movement_type=StockMovement.ENTRY,
+                    quantity=1,
+                    reason='benchmark',
+                )])
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    return role, latencies, locked
+
+
+class Command(BaseCommand):
+    help = 'Lecturas y escrituras concurrentes sobre SQLite: configuración por defecto frente a la de settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def set_journal_mode(self, options):
+        # El modo del diario se guarda en el fichero y solo se puede cambiar
+        # sin otras conexiones abiertas: lo fija el proceso principal
+        mode = 'WAL' if 'journal_mode=WAL' in options.get('init_command', '') else 'DELETE'
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={mode}')
+        connection.close()
+
+    def run_profile(self, options, product_ids, args):
+        self.set_journal_mode(options)
+        roles = ['read'] * args['readers'] + ['write'] * args['writers']
+        with ProcessPoolExecutor(
+            max_workers=len(roles), initializer=configure_worker, initargs=(options,)
+        ) as pool:
+            futures = [
+                pool.submit(run_worker, role, args['seconds'], product_ids, args['seed'] + i)
+                for i, role in enumerate(roles)
+            ]
+            results = [future.result() for future in futures]
+
+        summary = {}
+        for role in ('read', 'write'):
+            latencies = [value for r, values, _ in results if r == role for value in values]
+            summary[role] = {
+                'ops': len(latencies) / args['seconds'],
+                'locked': sum(locked for r, _, locked in results if r == role),
+                'p95_ms': percentile(latencies, 0.95) * 1000,
+            }
+        return summary
+
+    def handle(self, *args, **options):
+        tuned_options = dict(connection.settings_dict['OPTIONS'])
+        profiles = [('Por defecto', DEFAULT_OPTIONS), ('Ajustado', tuned_options)]
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                benchmark_database(test_name=os.path.join(tmp, 'bench.sqlite3')):
+            product_ids = create_products(options['products'], stock=10)
+
+            self.stdout.write(
+                f"{'Perfil':<12} {'Lecturas/s':>11} {'p95 (ms)':>9} {'Bloqueos':>9} "
+                f"{'Escrituras/s':>13} {'p95 (ms)':>9} {'Bloqueos':>9}"
+            )
+            for name, profile_options in profiles:
+                summary = self.run_profile(profile_options, product_ids, options)
+                read, write = summary['read'], summary['write']
+                self.stdout.write(
+                    f"{name:<12} {read['ops']:>11.0f} {read['p95_ms']:>9.1f} {read['locked']:>9} "
+                    f"{write['ops']:>13.0f} {write['p95_ms']:>9.1f} {write['locked']:>9}"
+                )
+            configure_worker(tuned_options)
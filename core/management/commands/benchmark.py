@@ -0,0 +1,468 @@
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from statistics import mean
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.middleware import QUERY_COUNT_HEADER
+from core.models import Category, Supplier, Product, StockMovement
+from ._bench import benchmark_database, percentile
+
+
+BENCHMARK_USER = 'benchmark'
+
+DEFAULT_MIX = 'products=4,movements=3,dashboard=2,post=2,export=1'
+
+
+# Escenarios: cada uno elige una petición (método, ruta, datos del POST)
+
+def browse_products(rng, data):
+    params = rng.choice([
+        {},
+        {'page': rng.randint(1, data['product_pages'])},
+        {'name': rng.choice(data['words'])},
+        {'category': rng.choice(data['categories'])},
+        {'supplier': rng.choice(data['suppliers'])},
+        {'low_stock': 'true'},
+    ])
+    return 'GET', reverse('product_list') + '?' + urlencode(params), None
+
+
+def page_movements(rng, data):
+    since = (timezone.localdate() - timedelta(days=rng.choice((7, 30, 90)))).isoformat()
+    params = rng.choice([
+        {'page': rng.randint(1, data['movement_pages'])},
+        {'start_date': since},
+        {'movement_type': rng.choice((StockMovement.ENTRY, StockMovement.EXIT)), 'page': rng.randint(1, min(5, data['movement_pages']))},
+        {'product': rng.choice(data['words'])},
+    ])
+    return 'GET', reverse('movement_list') + '?' + urlencode(params), None
+
+
+def post_movement(rng, data):
+    product = rng.choice(data['products'])
+    movement_type = rng.choice((StockMovement.ENTRY, StockMovement.EXIT))
+    name = 'movement_create_entry' if movement_type == StockMovement.ENTRY else 'movement_create_exit'
+    # Una salida sin stock vuelve al formulario con el error (200): también cuenta
+    payload = {'product': product, 'movement_type': movement_type, 'quantity': 1, 'reason': 'benchmark'}
+    return 'POST', reverse(name, args=[product]), payload
+
+
+def export(rng, data):
+    if rng.random() < 0.5:
+        return 'GET', reverse('product_export') + '?' + urlencode({'category': rng.choice(data['categories'])}), None
+    since = (timezone.localdate() - timedelta(days=rng.choice((1, 7)))).isoformat()
+    return 'GET', reverse('movement_export') + '?' + urlencode({'start_date': since}), None
+
+
+def dashboard(rng, data):
+    return 'GET', reverse('home'), None
+
+
+SCENARIOS = {
+    'products': browse_products,
+    'movements': page_movements,
+    'post': post_movement,
+    'export': export,
+    'dashboard': dashboard,
+}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise CommandError(f'Escenario desconocido: {name} (disponibles: {", ".join(SCENARIOS)})')
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f'Peso no válido para {name}: {weight}')
+    return mix
+
+
+class ClientSession:
+    """Peticiones al WSGI de Django en el mismo proceso, con todo el middleware."""
+
+    def __init__(self, username):
+        self.client = Client()
+        self.client.force_login(get_user_model().objects.get(username=username))
+
+    def request(self, method, path, payload=None):
+        if method == 'POST':
+            response = self.client.post(path, payload)
+        else:
+            response = self.client.get(path)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code, response.headers.get(QUERY_COUNT_HEADER)
+
+    def close(self):
+        connections.close_all()
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Se mide cada petición por separado: la redirección no se sigue
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """Peticiones HTTP a un servidor (gunicorn) con su propia sesión iniciada."""
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.request('GET', reverse('login'))
+        status, _ = self.request('POST', reverse('login'), {'username': username, 'password': password})
+        if status != 302:
+            raise CommandError(f'No se pudo iniciar sesión en {self.base_url} (estado {status})')
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def request(self, method, path, payload=None):
+        body = None
+        if method == 'POST':
+            body = urlencode(dict(payload, csrfmiddlewaretoken=self.csrf_token())).encode()
+        request = urllib.request.Request(
+            self.base_url + path, data=body, method=method, headers={'Referer': self.base_url + '/'}
+        )
+        try:
+            response = self.opener.open(request, timeout=120)
+        except urllib.error.HTTPError as e:
+            # También las redirecciones (NoRedirect) y los 4xx/5xx
+            response = e
+        with response:
+            while response.read(64 * 1024):
+                pass
+            return response.status, response.headers.get(QUERY_COUNT_HEADER)
+
+    def close(self):
+        pass
+
+
+def open_session(target):
+    if target['url']:
+        return HttpSession(target['url'], target['username'], target['password'])
+    return ClientSession(target['username'])
+
+
+def run_worker(worker, target, data, mix, options):
+    """
+    Lanza peticiones durante --warmup + --duration segundos. Devuelve las
+    muestras tomadas después del calentamiento: (escenario, segundos, estado,
+    consultas).
+    """
+    rng = random.Random(options['seed'] + worker)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    session = open_session(target)
+    samples = []
+    try:
+        start = time.perf_counter()
+        measure_from = start + options['warmup']
+        deadline = measure_from + options['duration']
+        while (now := time.perf_counter()) < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path, payload = SCENARIOS[name](rng, data)
+            status, queries = session.request(method, path, payload)
+            elapsed = time.perf_counter() - now
+            if now >= measure_from:
+                samples.append((name, elapsed, status, None if queries is None else int(queries)))
+    finally:
+        session.close()
+    return samples
+
+
+def summarize(samples, seconds):
+    latencies = [elapsed for _, elapsed, _, _ in samples]
+    queries = [count for _, _, _, count in samples if count is not None]
+    statuses = defaultdict(int)
+    for _, _, status, _ in samples:
+        statuses[str(status)] += 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, status, _ in samples if status >= 400),
+        'throughput': len(samples) / seconds if seconds else 0.0,
+        'mean_ms': mean(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'queries_per_request': mean(queries) if queries else None,
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def gunicorn_server(workers, env):
+    """Arranca gunicorn con la app en un puerto libre y lo para al terminar."""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'inventory.wsgi', '--workers', str(workers),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+        cwd=settings.BASE_DIR, env=env,
+    )
+    url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn terminó al arrancar (código {process.returncode})')
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError('gunicorn no respondió en 30 s')
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de las vistas: escenarios (listado de productos con filtros, páginas de '
+        'movimientos, entradas y salidas, exportaciones y panel) lanzados por un grupo de hilos o '
+        'procesos contra la app en el mismo proceso, un gunicorn local o una URL. Muestra p50/p95/p99, '
+        'peticiones por segundo y consultas por petición, y guarda el resultado en JSON para '
+        'compararlo con una referencia.'
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--gunicorn', type=int, metavar='WORKERS',
+                            help='Arranca gunicorn con ese número de workers y mide por HTTP')
+        target.add_argument('--url', help='Servidor ya arrancado (misma base de datos que este comando)')
+        parser.add_argument('--existing', action='store_true',
+                            help='Usa la base de datos configurada tal cual (p. ej. tras generate_dataset); '
+                                 'por defecto se crea una temporal con datos sintéticos')
+        parser.add_argument('--products', type=int, default=5_000,
+                            help='Productos de la base temporal')
+        parser.add_argument('--movements', type=int, default=50_000,
+                            help='Movimientos de la base temporal')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Escenarios y pesos (por defecto {DEFAULT_MIX})')
+        parser.add_argument('--workers', type=int, default=4, help='Clientes concurrentes')
+        parser.add_argument('--pool', choices=('thread', 'process'), default='thread',
+                            help='Hilos o procesos para los clientes (con la app en el mismo proceso, '
+                                 'los procesos evitan que el GIL cuente como latencia)')
+        parser.add_argument('--duration', type=float, default=20, help='Segundos de medición')
+        parser.add_argument('--warmup', type=float, default=3, help='Segundos iniciales sin medir')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Fichero JSON con el resultado')
+        parser.add_argument('--baseline', help='Resultado JSON anterior con el que comparar')
+        parser.add_argument('--max-regression', type=float, metavar='PCT',
+                            help='Con --baseline: error si el p95 de algún escenario empeora más de PCT %%')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        if options['workers'] < 1:
+            raise CommandError('--workers debe ser al menos 1')
+        if options['pool'] == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('--pool process necesita fork (Linux o macOS); usa --pool thread')
+        if options['url'] and not options['existing']:
+            # El servidor externo no ve la base temporal de este comando
+            raise CommandError('--url necesita --existing: el servidor usa la base de datos configurada')
+
+        with ExitStack() as stack:
+            tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            if not options['existing']:
+                if options['gunicorn'] and connection.vendor != 'sqlite':
+                    raise CommandError('--gunicorn con base temporal solo con SQLite; usa --existing')
+                # En un fichero: los procesos de gunicorn o del pool tienen que poder abrirla
+                stack.enter_context(benchmark_database(test_name=os.path.join(tmp, 'benchmark.sqlite3')))
+                self.stdout.write(f"Generando {options['products']} productos y {options['movements']} movimientos...")
+                call_command('generate_dataset', products=options['products'], movements=options['movements'],
+                             seed=options['seed'], stdout=open(os.devnull, 'w'))
+                # Sin trabajos en segundo plano ni ficheros de otras ejecuciones
+                stack.enter_context(override_settings(MEDIA_ROOT=os.path.join(tmp, 'media')))
+
+            data = self.sample_data()
+            target = self.prepare_target(options, stack, tmp)
+            result = self.run(target, data, mix, options)
+
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultado guardado en {options['output']}")
+        if options['baseline']:
+            self.compare(result, options['baseline'], options['max_regression'])
+
+    def sample_data(self):
+        """Ids y palabras de búsqueda que usan los escenarios."""
+        products = list(Product.objects.order_by().values_list('pk', flat=True)[:50_000])
+        if not products:
+            raise CommandError('No hay productos: genera datos con generate_dataset o quita --existing')
+        names = Product.objects.order_by().values_list('name', flat=True)[:1000]
+        # Páginas pedidas: solo las primeras 20, que son las que se visitan
+        def pages(count):
+            return max(1, min(20, count // 10))
+
+        return {
+            'products': products,
+            'product_pages': pages(Product.objects.count()),
+            'movement_pages': pages(StockMovement.objects.count()),
+            'categories': list(Category.objects.values_list('pk', flat=True)) or [0],
+            'suppliers': list(Supplier.objects.values_list('pk', flat=True)) or [0],
+            'words': sorted({name.split()[0] for name in names if name.split()}) or ['a'],
+        }
+
+    def prepare_target(self, options, stack, tmp):
+        # Contraseña nueva en cada ejecución: el cliente HTTP inicia sesión con ella
+        password = secrets.token_urlsafe(16)
+        user, _ = get_user_model().objects.get_or_create(username=BENCHMARK_USER)
+        user.set_password(password)
+        user.save()
+
+        target = {'url': options['url'], 'username': BENCHMARK_USER, 'password': password}
+        if options['gunicorn']:
+            env = dict(os.environ, QUERY_COUNT_HEADER='1')
+            if not options['existing']:
+                env['DATABASE_URL'] = f"sqlite:///{connection.settings_dict['NAME']}"
+            target['url'] = stack.enter_context(gunicorn_server(options['gunicorn'], env))
+            target['name'] = f"gunicorn ({options['gunicorn']} workers)"
+        elif options['url']:
+            target['name'] = options['url']
+        else:
+            # Mismo WSGI y middleware que en producción, más el contador de consultas
+            stack.enter_context(override_settings(
+                MIDDLEWARE=['core.middleware.QueryCountMiddleware', *settings.MIDDLEWARE],
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ))
+            target['name'] = 'en proceso'
+        return target
+
+    def run(self, target, data, mix, options):
+        workers = options['workers']
+        self.stdout.write(
+            f"{workers} clientes ({options['pool']}) contra {target['name']}: "
+            f"{options['warmup']:g} s de calentamiento y {options['duration']:g} s de medición"
+        )
+        if workers == 1:
+            # En el mismo hilo: sirve también dentro de una transacción (tests)
+            batches = [run_worker(0, target, data, mix, options)]
+        else:
+            if options['pool'] == 'process':
+                # Cada proceso hijo abre sus propias conexiones. Con fork heredan
+                # la configuración ya cambiada a la base temporal; con spawn o
+                # forkserver volverían a leer settings y abrirían la real
+                connections.close_all()
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+            else:
+                pool = ThreadPoolExecutor(max_workers=workers)
+            with pool:
+                futures = [pool.submit(run_worker, i, target, data, mix, options) for i in range(workers)]
+                batches = [future.result() for future in futures]
+
+        samples = [sample for batch in batches for sample in batch]
+        seconds = options['duration']
+        return {
+            'created_at': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'target': target['name'],
+            'database': connection.vendor,
+            'options': {
+                key: options[key]
+                for key in ('workers', 'pool', 'duration', 'warmup', 'seed', 'existing', 'products', 'movements')
+            } | {'mix': mix},
+            'total': summarize(samples, seconds),
+            'scenarios': {
+                name: summarize([s for s in samples if s[0] == name], seconds) for name in mix
+            },
+        }
+
+    def report(self, result):
+        self.stdout.write(
+            f"{'Escenario':<12} {'Peticiones':>10} {'Errores':>8} {'Pet/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Consultas':>10}"
+        )
+        rows = list(result['scenarios'].items()) + [('TOTAL', result['total'])]
+        for name, r in rows:
+            queries = '—' if r['queries_per_request'] is None else f"{r['queries_per_request']:.1f}"
+            self.stdout.write(
+                f"{name:<12} {r['requests']:>10} {r['errors']:>8} {r['throughput']:>8.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {queries:>10}"
+            )
+
+    def compare(self, result, path, max_regression):
+        try:
+            with open(path, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer la referencia {path}: {e}')
+
+        def change(new, old):
+            return (new - old) / old * 100 if old else 0.0
+
+        self.stdout.write(f"Frente a {path} ({baseline.get('commit') or 'sin commit'}):")
+        self.stdout.write(f"{'Escenario':<12} {'p95 ms':>16} {'Cambio':>8} {'Pet/s':>16} {'Cambio':>8}")
+        regressions = []
+        rows = list(result['scenarios'].items()) + [('TOTAL', result['total'])]
+        for name, r in rows:
+            old = baseline['total'] if name == 'TOTAL' else baseline.get('scenarios', {}).get(name)
+            if not old or not old.get('requests'):
+                continue
+            p95 = change(r['p95_ms'], old['p95_ms'])
+            throughput = change(r['throughput'], old['throughput'])
+            self.stdout.write(
+                f"{name:<12} {old['p95_ms']:>7.1f} → {r['p95_ms']:>6.1f} {p95:>+7.1f}% "
+                f"{old['throughput']:>7.1f} → {r['throughput']:>6.1f} {throughput:>+7.1f}%"
+            )
+            if max_regression is not None and p95 > max_regression:
+                regressions.append(f'{name} (p95 {p95:+.1f}%)')
+
+        if regressions:
+            raise CommandError('Empeoran más de lo permitido: ' + ', '.join(regressions))
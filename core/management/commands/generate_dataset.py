@@ -0,0 +1,344 @@
+import math
+import random
+from bisect import bisect
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.cache import bump_reference_version
+from core.models import Category, Supplier, Product, StockMovement, DailyMovementSummary
+from core.search import fts_available, install_fts, uninstall_fts
+from ._bench import timer
+
+
+SKU_PREFIX = 'GEN'
+
+NOUNS = [
+    'Silla', 'Mesa', 'Monitor', 'Teclado', 'Ratón', 'Lámpara', 'Cable', 'Cargador', 'Taladro', 'Martillo',
+    'Destornillador', 'Cuaderno', 'Bolígrafo', 'Grapadora', 'Archivador', 'Estantería', 'Router', 'Disco',
+    'Memoria', 'Impresora', 'Auriculares', 'Altavoz', 'Webcam', 'Escritorio', 'Armario', 'Sierra', 'Llave',
+    'Cinta', 'Batería', 'Proyector',
+]
+
+ADJECTIVES = [
+    'ergonómico', 'inalámbrico', 'compacto', 'profesional', 'básico', 'reforzado', 'plegable', 'portátil',
+    'industrial', 'premium', 'económico', 'modular', 'digital', 'metálico', 'USB-C', 'gris', 'negro', 'blanco',
+]
+
+# Peso de cada día de la semana (lunes = 0): los fines de semana casi no hay actividad
+WEEKDAY_WEIGHTS = [1.0, 1.1, 1.1, 1.0, 0.9, 0.3, 0.1]
+
+# Peso de cada hora del día: jornada de mañana y tarde
+HOUR_WEIGHTS = [0.1] * 7 + [1, 3, 4, 4, 3, 2] + [1, 2, 3, 3, 2, 1] + [0.5, 0.2] + [0.1] * 3
+
+RESTOCK_SIZES = (10, 12, 20, 24, 50, 100)
+
+# Columnas de los INSERT directos, en el orden de las tuplas
+PRODUCT_COLUMNS = ['name', 'sku', 'category_id', 'supplier_id', 'stock', 'min_stock', 'price', 'is_active',
+                   'created_at', 'updated_at']
+MOVEMENT_COLUMNS = ['product_id', 'movement_type', 'quantity', 'reason', 'created_at', 'created_by_id',
+                    'balance_after', 'is_opening']
+SUMMARY_COLUMNS = ['date', 'product_id', 'movement_type', 'quantity', 'movement_count']
+
+# Ajustes de SQLite durante la carga: sin fsync y con 256 MB de caché de páginas
+RELAXED_PRAGMAS = {'synchronous': 'OFF', 'cache_size': -262144, 'temp_store': 'MEMORY'}
+
+
+def season_weight(day):
+    # Pico en diciembre y valle en agosto, sobre una ondulación anual suave
+    weight = 1 + 0.3 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 350) / 365)
+    if day.month == 12:
+        weight *= 1.5
+    elif day.month == 8:
+        weight *= 0.6
+    return weight * WEEKDAY_WEIGHTS[day.weekday()]
+
+
+def split_counts(total, weights):
+    """Reparte `total` en proporción a `weights` (sumas exactas y deterministas)."""
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    remainders = sorted(range(len(weights)), key=lambda i: counts[i] - weights[i] * scale)
+    for i in remainders[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def zipf_cum_weights(count, exponent, rng):
+    """
+    Pesos acumulados tipo Zipf (el k-ésimo más popular pesa 1/k^s) con los
+    rangos repartidos al azar: los productos populares no son los primeros.
+    """
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return list(accumulate(1 / rank ** exponent for rank in ranks))
+
+
+def insert_sql(model, columns):
+    quote = connection.ops.quote_name
+    return (
+        f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(quote(c) for c in columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+
+
+def insert_rows(sql, rows):
+    # executemany en lugar de bulk_create: con millones de filas, preparar
+    # cada valor con el ORM costaba varias veces más que el propio INSERT
+    if rows:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+
+@contextmanager
+def relaxed_durability(conn):
+    """
+    Durante la carga se renuncia a la durabilidad de cada commit: si el
+    proceso se cae se pierde la carga, no la base de datos. Al terminar se
+    restauran los valores de la conexión.
+    """
+    if conn.in_atomic_block:
+        # Dentro de una transacción SQLite no deja cambiar synchronous, y
+        # tampoco hace falta: solo habrá un commit, el de fuera
+        yield
+        return
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            previous = {}
+            for pragma, value in RELAXED_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma}')
+                previous[pragma] = cursor.fetchone()[0]
+                cursor.execute(f'PRAGMA {pragma}={value}')
+        elif conn.vendor == 'postgresql':
+            cursor.execute('SET synchronous_commit = off')
+    try:
+        yield
+    finally:
+        with conn.cursor() as cursor:
+            if conn.vendor == 'sqlite':
+                for pragma, value in previous.items():
+                    cursor.execute(f'PRAGMA {pragma}={value}')
+            elif conn.vendor == 'postgresql':
+                cursor.execute('RESET synchronous_commit')
+
+
+@contextmanager
+def deferred_indexes(conn, model):
+    """
+    En SQLite borra los índices secundarios de la tabla durante la carga y
+    los vuelve a crear al final con su misma definición: construir un
+    índice de una vez es mucho más rápido que mantenerlo fila a fila.
+    """
+    if conn.vendor != 'sqlite' or conn.in_atomic_block:
+        yield
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+            [model._meta.db_table],
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {conn.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with conn.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera un catálogo y un historial de movimientos sintéticos para pruebas de rendimiento: '
+        'popularidad de SKUs tipo Zipf, estacionalidad por mes, día y hora, y saldos coherentes. '
+        'Con la misma semilla y fecha final los datos son siempre los mismos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--movements', type=int, default=100_000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--suppliers', type=int, default=50)
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--days', type=int, default=365,
+                            help='Días de historial que cubren los movimientos')
+        parser.add_argument('--end', type=date.fromisoformat, default=None,
+                            help='Último día del historial (AAAA-MM-DD); por defecto, ayer')
+        parser.add_argument('--zipf', type=float, default=1.0,
+                            help='Exponente de la popularidad: más alto, más concentrada')
+        parser.add_argument('--batch-size', type=int, default=50_000,
+                            help='Filas por transacción')
+
+    def handle(self, *args, **options):
+        if options['products'] < 1 or options['categories'] < 1 or options['suppliers'] < 1:
+            raise CommandError('Hacen falta al menos un producto, una categoría y un proveedor')
+        if Product.objects.filter(sku__startswith=f'{SKU_PREFIX}-').exists():
+            raise CommandError(
+                f'Ya hay productos generados ({SKU_PREFIX}-...): usa una base de datos vacía '
+                '(por ejemplo DATABASE_URL=sqlite:////tmp/bench.sqlite3 y migrate)'
+            )
+
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        with relaxed_durability(connection), timer() as total:
+            categories, suppliers, users = self.create_references(options)
+
+            with timer() as t:
+                # Con los triggers de FTS5 cada INSERT actualiza también el índice
+                # de búsqueda: es mucho más rápido regenerarlo una vez al final
+                fts = fts_available()
+                if fts:
+                    uninstall_fts()
+                with deferred_indexes(connection, Product):
+                    product_ids = self.create_products(rng, options['products'], categories, suppliers, batch_size)
+                if fts:
+                    install_fts()
+                    fts_available()  # vuelve a consultarlo y lo deja en caché
+            self.report('productos', len(product_ids), t['seconds'])
+
+            with timer() as t, deferred_indexes(connection, StockMovement):
+                balances = self.create_movements(rng, product_ids, users, options)
+            self.report('movimientos', options['movements'], t['seconds'])
+
+            with timer() as t:
+                self.save_stock(product_ids, balances, batch_size)
+            self.stdout.write(f'  stock final en {t["seconds"]:.1f} s')
+
+        # bulk_create y los INSERT directos no emiten señales
+        bump_reference_version(Category._meta.label_lower)
+        bump_reference_version(Supplier._meta.label_lower)
+        self.stdout.write(self.style.SUCCESS(f'✅ Datos generados en {total["seconds"]:.1f} s'))
+
+    def report(self, label, rows, seconds):
+        self.stdout.write(f'  {rows} {label} en {seconds:.1f} s ({rows / max(seconds, 1e-9):,.0f} filas/s)')
+
+    def create_references(self, options):
+        categories = Category.objects.bulk_create([
+            Category(name=f'Categoría {i + 1:03d}', description='Generada para pruebas de rendimiento')
+            for i in range(options['categories'])
+        ])
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(name=f'Proveedor {i + 1:03d}', email=f'proveedor{i + 1}@example.com')
+            for i in range(options['suppliers'])
+        ])
+        # Sin contraseña utilizable: solo aparecen como autores de los movimientos
+        password = make_password(None)
+        User = get_user_model()
+        users = [
+            User.objects.get_or_create(username=f'operario{i + 1:02d}', defaults={'password': password})[0].pk
+            for i in range(options['users'])
+        ]
+        return [c.pk for c in categories], [s.pk for s in suppliers], users
+
+    def create_products(self, rng, count, categories, suppliers, batch_size):
+        # Unas categorías y proveedores tienen muchos más productos que otros
+        category_weights = zipf_cum_weights(len(categories), 1.0, rng)
+        supplier_weights = zipf_cum_weights(len(suppliers), 0.8, rng)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        sql = insert_sql(Product, PRODUCT_COLUMNS)
+
+        for first in range(0, count, batch_size):
+            rows = []
+            for i in range(first, min(first + batch_size, count)):
+                rows.append((
+                    f'{rng.choice(NOUNS)} {rng.choice(ADJECTIVES)} {i + 1}',
+                    f'{SKU_PREFIX}-{i + 1:08d}',
+                    rng.choices(categories, cum_weights=category_weights)[0],
+                    rng.choices(suppliers, cum_weights=supplier_weights)[0],
+                    0,
+                    rng.choice((0, 5, 5, 10, 10, 20)),
+                    Decimal(f'{min(rng.lognormvariate(3, 1), 99_999):.2f}'),
+                    True, now, now,
+                ))
+            insert_rows(sql, rows)
+        return list(
+            Product.objects.filter(sku__startswith=f'{SKU_PREFIX}-').order_by('sku').values_list('pk', flat=True)
+        )
+
+    def days(self, options):
+        end = options['end'] or timezone.localdate() - timedelta(days=1)
+        return [end - timedelta(days=n) for n in range(options['days'] - 1, -1, -1)]
+
+    def create_movements(self, rng, product_ids, users, options):
+        """
+        Inserta los movimientos día a día en orden cronológico, con sus
+        resúmenes diarios, y devuelve el stock final de cada producto. Cada
+        producto empieza en 0: cuando su saldo no cubre la salida, recibe
+        una reposición.
+        """
+        days = self.days(options)
+        per_day = split_counts(options['movements'], [season_weight(day) for day in days])
+        product_weights = zipf_cum_weights(len(product_ids), options['zipf'], rng)
+        hour_weights = list(accumulate(HOUR_WEIGHTS))
+        balances = [0] * len(product_ids)
+        positions = range(len(product_ids))
+
+        movement_sql = insert_sql(StockMovement, MOVEMENT_COLUMNS)
+        summary_sql = insert_sql(DailyMovementSummary, SUMMARY_COLUMNS)
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        adapt_date = connection.ops.adapt_datefield_value
+
+        movements = []
+        summaries = []
+        for day, count in zip(days, per_day):
+            if not count:
+                continue
+            # En UTC y sin zona: así adapt_datetimefield_value no tiene que
+            # convertir cada fecha (es lo que más costaba por fila)
+            start = timezone.make_naive(timezone.make_aware(datetime.combine(day, time.min)), dt_timezone.utc)
+            seconds = sorted(
+                hour * 3600 + rng.randrange(3600)
+                for hour in (bisect(hour_weights, rng.random() * hour_weights[-1]) for _ in range(count))
+            )
+            picks = rng.choices(positions, cum_weights=product_weights, k=count)
+            totals = defaultdict(lambda: [0, 0])
+            for second, position in zip(seconds, picks):
+                balance = balances[position]
+                wanted = 1 + int(rng.expovariate(0.4))
+                if balance >= wanted and rng.random() < 0.85:
+                    movement_type, quantity, reason = StockMovement.EXIT, wanted, 'Venta'
+                    balance -= quantity
+                else:
+                    # Reposición: una caja o un palé
+                    movement_type, quantity, reason = StockMovement.ENTRY, rng.choice(RESTOCK_SIZES), 'Reposición'
+                    balance += quantity
+                balances[position] = balance
+                movements.append((
+                    product_ids[position], movement_type, quantity, reason,
+                    adapt_datetime(start + timedelta(seconds=second)),
+                    rng.choice(users) if users else None,
+                    balance, False,
+                ))
+                total = totals[product_ids[position], movement_type]
+                total[0] += quantity
+                total[1] += 1
+
+            date_value = adapt_date(day)
+            summaries.extend(
+                (date_value, product_id, movement_type, quantity, movement_count)
+                for (product_id, movement_type), (quantity, movement_count) in totals.items()
+            )
+            if len(movements) >= options['batch_size']:
+                insert_rows(movement_sql, movements)
+                insert_rows(summary_sql, summaries)
+                movements, summaries = [], []
+        insert_rows(movement_sql, movements)
+        insert_rows(summary_sql, summaries)
+        return balances
+
+    def save_stock(self, product_ids, balances, batch_size):
+        table = connection.ops.quote_name(Product._meta.db_table)
+        sql = f'UPDATE {table} SET stock = %s WHERE id = %s'
+        changed = [(balance, pk) for pk, balance in zip(product_ids, balances) if balance]
+        for first in range(0, len(changed), batch_size):
+            insert_rows(sql, changed[first:first + batch_size])
@@ -0,0 +1,203 @@
+import csv
+import io
+import json
+import mmap
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.importers import PRODUCT_COLUMNS, ImportResult, ProductImporter, RowError, parse_product_row
+
+
+def split_ranges(mm, start, target_size, quote=None):
+    """
+    Divide [start, len(mm)) en tramos de unos `target_size` bytes que
+    terminan siempre en un salto de línea. Con quote=b'"' (CSV) no corta
+    dentro de un campo entrecomillado: un salto de línea solo cierra el
+    tramo si el tramo lleva hasta ahí un número par de comillas (las
+    escapadas, "", cuentan dos).
+    """
+    ranges = []
+    size = len(mm)
+    while start < size:
+        end = min(start + target_size, size)
+        quotes = mm[start:end].count(quote) if quote else 0
+        while end < size:
+            newline = mm.find(b'\n', end)
+            if newline == -1:
+                end = size
+                break
+            if quote:
+                quotes += mm[end:newline + 1].count(quote)
+            end = newline + 1
+            if quotes % 2 == 0:
+                break
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def parse_range(path, start, end, fmt, fieldnames):
+    """
+    Se ejecuta en los procesos del pool: lee su tramo del fichero mapeado en
+    memoria y valida las filas. Devuelve (filas válidas, errores, nº de
+    líneas) con números de línea relativos al tramo.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8')
+
+    rows, errors = [], []
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(text, newline=''), fieldnames=fieldnames)
+        line = 0
+        for row in reader:
+            line = reader.line_num
+            try:
+                rows.append((line, parse_product_row(row)))
+            except RowError as e:
+                errors.append((line, str(e)))
+        lines = text.count('\n') + (0 if text.endswith('\n') or not text else 1)
+    else:
+        raw_lines = text.splitlines()
+        lines = len(raw_lines)
+        for line, raw in enumerate(raw_lines, start=1):
+            if not raw.strip():
+                continue
+            try:
+                data = json.loads(raw)
+                if not isinstance(data, dict):
+                    raise RowError('se esperaba un objeto JSON')
+                row = {key: ('' if value is None else str(value)) for key, value in data.items()}
+                rows.append((line, parse_product_row(row)))
+            except (RowError, ValueError) as e:
+                errors.append((line, str(e)))
+    return rows, errors, lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa un catálogo de productos muy grande (CSV o JSON Lines) en paralelo: '
+        'los procesos del pool validan tramos del fichero y un único escritor '
+        'hace las altas/actualizaciones en bloque. Columnas: ' + ', '.join(PRODUCT_COLUMNS)
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Por defecto se deduce de la extensión')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--split-size', type=int, default=8,
+                            help='Tamaño de cada tramo en MB')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Filas por INSERT ... ON CONFLICT')
+        parser.add_argument('--transaction-rows', type=int, default=100_000,
+                            help='Filas por transacción')
+        parser.add_argument('--max-errors', type=int, default=100,
+                            help='Errores mostrados al final')
+
+    def detect_format(self, path, fmt):
+        if fmt:
+            return fmt
+        return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No existe el fichero {path}')
+        if os.path.getsize(path) == 0:
+            # mmap no admite ficheros vacíos
+            raise CommandError(f'El fichero {path} está vacío')
+        fmt = self.detect_format(path, options['format'])
+
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start, fieldnames, header_lines = 0, None, 0
+            if fmt == 'csv':
+                newline = mm.find(b'\n')
+                header_end = len(mm) if newline == -1 else newline + 1
+                fieldnames = next(csv.reader([mm[:header_end].decode('utf-8-sig')]))
+                fieldnames = [name.strip() for name in fieldnames]
+                missing = set(PRODUCT_COLUMNS) - set(fieldnames)
+                if missing:
+                    raise CommandError(f"Faltan columnas en la cabecera: {', '.join(sorted(missing))}")
+                start, header_lines = header_end, 1
+            quote = b'"' if fmt == 'csv' else None
+            ranges = split_ranges(mm, start, options['split_size'] * 1024 * 1024, quote)
+
+        self.stdout.write(f'{path}: {len(ranges)} tramos, {options["workers"]} procesos, formato {fmt}')
+        result = self.run(path, fmt, fieldnames, ranges, header_lines, options)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {result.imported} productos importados ({result.created} nuevos, {result.updated} actualizados)'
+        ))
+        if result.errors:
+            self.stdout.write(self.style.WARNING(f'⚠️  {len(result.errors)} filas con errores:'))
+            for error in result.errors[:options['max_errors']]:
+                self.stdout.write(f'  {error}')
+
+    def run(self, path, fmt, fieldnames, ranges, header_lines, options):
+        importer = ProductImporter(options['batch_size'])
+        result = ImportResult()
+        base_line = header_lines
+        processed = 0
+        started = time.perf_counter()
+
+        pending_rows = []
+        rows_in_transaction = 0
+        transaction_ctx = None
+
+        def flush(rows):
+            nonlocal transaction_ctx, rows_in_transaction
+            if transaction_ctx is None:
+                transaction_ctx = transaction.atomic()
+                transaction_ctx.__enter__()
+            result.merge(importer.write_chunk(rows))
+            rows_in_transaction += len(rows)
+            if rows_in_transaction >= options['transaction_rows']:
+                transaction_ctx.__exit__(None, None, None)
+                transaction_ctx, rows_in_transaction = None, 0
+
+        # Como mucho 2 tramos por proceso en vuelo: la memoria no crece con el fichero
+        window = options['workers'] * 2
+        try:
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+                queue = deque()
+                next_range = 0
+                while queue or next_range < len(ranges):
+                    while next_range < len(ranges) and len(queue) < window:
+                        range_start, range_end = ranges[next_range]
+                        queue.append(pool.submit(parse_range, path, range_start, range_end, fmt, fieldnames))
+                        next_range += 1
+
+                    # Se consumen en orden para numerar las líneas de forma absoluta
+                    rows, errors, lines = queue.popleft().result()
+                    result.errors.extend(f'Fila {base_line + line}: {message}' for line, message in errors)
+                    for line, values in rows:
+                        pending_rows.append((base_line + line, values))
+                        if len(pending_rows) >= options['batch_size']:
+                            flush(pending_rows)
+                            pending_rows = []
+                    base_line += lines
+                    processed += len(rows) + len(errors)
+
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'\r  {processed} filas · {processed / elapsed:,.0f} filas/s', ending=''
+                    )
+                    self.stdout.flush()
+
+            if pending_rows:
+                flush(pending_rows)
+            if transaction_ctx is not None:
+                transaction_ctx.__exit__(None, None, None)
+                transaction_ctx = None
+        except BaseException as e:
+            if transaction_ctx is not None:
+                transaction_ctx.__exit__(type(e), e, e.__traceback__)
+            raise
+        return result
@@ -0,0 +1,44 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import MOVEMENT_COLUMNS, import_movements_csv
+
+
+class Command(BaseCommand):
+    help = (
+        'Registra movimientos de stock desde un CSV con columnas: ' + ', '.join(MOVEMENT_COLUMNS) +
+        '. Un bloque que dejaría stock negativo se rechaza entero.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', help='Usuario que figura como autor de los movimientos')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Filas por bloque (cada bloque se guarda o se rechaza entero)')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No existe el usuario {options['user']}")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as f:
+                result = import_movements_csv(f, user=user, chunk_size=options['chunk_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {result.created} movimientos registrados en {elapsed:.2f}s '
+            f'({result.created / elapsed:,.0f} filas/s)'
+        ))
+        if result.errors:
+            self.stdout.write(self.style.WARNING(f'⚠️  {len(result.errors)} errores:'))
+            for error in result.errors:
+                self.stdout.write(f'  {error}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.search import install_fts
+
+
+class Command(BaseCommand):
+    help = 'Crea o regenera el índice de búsqueda FTS5 de productos (solo SQLite)'
+
+    def handle(self, *args, **options):
+        if install_fts():
+            self.stdout.write(self.style.SUCCESS('✅ Índice de búsqueda regenerado'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                '⚠️  La base de datos no soporta FTS5; se usarán búsquedas icontains'
+            ))
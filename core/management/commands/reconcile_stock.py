@@ -0,0 +1,113 @@
+import csv
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from core.models import Product, StockMovement, DailyMovementSummary
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el stock de cada producto con la suma de sus movimientos y '
+        'genera un informe de diferencias. Con --fix registra movimientos de ajuste '
+        'para que el historial cuadre con el stock actual.'
+    )
+
+    reason = 'Ajuste de reconciliación'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', help='Ruta del CSV con las diferencias encontradas')
+        parser.add_argument('--fix', action='store_true',
+                            help='Crea movimientos de ajuste para los productos descuadrados')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def ledger(self, product_ids=None):
+        # Una sola consulta agrupada: (product_id, cantidad neta) ordenado por producto
+        movements = StockMovement.objects.all()
+        if product_ids is not None:
+            movements = movements.filter(product_id__in=product_ids)
+        return (
+            movements.order_by('product_id')
+            .values_list('product_id')
+            .annotate(net=Sum(StockMovement.signed_quantity()))
+        )
+
+    def find_drift(self, chunk_size):
+        """
+        Recorre a la vez productos y totales del historial, ambos ordenados por
+        id, sin construir instancias de modelo ni cargar todo en memoria.
+        """
+        products = Product.objects.order_by('pk').values_list('pk', 'sku', 'stock').iterator(chunk_size=chunk_size)
+        ledger = self.ledger().iterator(chunk_size=chunk_size)
+        current = next(ledger, None)
+
+        for pk, sku, stock in products:
+            while current is not None and current[0] < pk:
+                current = next(ledger, None)
+            net = current[1] if current is not None and current[0] == pk else 0
+            if stock != net:
+                yield pk, sku, stock, net
+
+    def handle(self, *args, **options):
+        # El informe se escribe según se recorre el catálogo; para --fix solo
+        # se guardan los ids (los ajustes se crean después: escribir movimientos
+        # con el cursor del historial abierto alteraría lo que queda por leer)
+        drifted = 0
+        fix_ids = []
+        with ExitStack() as stack:
+            writer = None
+            if options['report']:
+                f = stack.enter_context(open(options['report'], 'w', newline='', encoding='utf-8'))
+                writer = csv.writer(f)
+                writer.writerow(['product_id', 'sku', 'stock', 'movimientos', 'diferencia'])
+
+            for pk, sku, stock, net in self.find_drift(options['chunk_size']):
+                drifted += 1
+                if writer is not None:
+                    writer.writerow((pk, sku, stock, net, stock - net))
+                if drifted <= 20:
+                    self.stdout.write(f'  {sku}: stock {stock}, movimientos {net} ({stock - net:+d})')
+                if options['fix']:
+                    fix_ids.append(pk)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('✅ El stock cuadra con los movimientos'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'⚠️  {drifted} productos descuadrados'))
+
+        if options['fix']:
+            created = 0
+            for i in range(0, len(fix_ids), 500):
+                created += self.fix_chunk(fix_ids[i:i + 500])
+            self.stdout.write(self.style.SUCCESS(f'✅ {created} movimientos de ajuste creados'))
+
+    def fix_chunk(self, product_ids):
+        # Se vuelve a calcular dentro de la transacción por si algo cambió
+        with transaction.atomic():
+            stocks = dict(
+                Product.objects.select_for_update()
+                .filter(pk__in=product_ids)
+                .order_by()
+                .values_list('pk', 'stock')
+            )
+            ledger = dict(self.ledger(product_ids))
+
+            adjustments = []
+            for pk, stock in stocks.items():
+                diff = stock - ledger.get(pk, 0)
+                if diff == 0:
+                    continue
+                # Los ajustes no tocan Product.stock: solo explican la diferencia
+                adjustments.append(StockMovement(
+                    product_id=pk,
+                    movement_type=StockMovement.ENTRY if diff > 0 else StockMovement.EXIT,
+                    quantity=abs(diff),
+                    reason=self.reason,
+                    balance_after=stock,
+                ))
+            StockMovement.objects.bulk_create(adjustments, batch_size=1000)
+            DailyMovementSummary.add_movements(adjustments)
+        return len(adjustments)
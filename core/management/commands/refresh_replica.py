@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.replicas import refresh_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = 'Copia la base de datos SQLite a la réplica de solo lectura (DATABASE_REPLICA_URL=sqlite:///...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Segundos entre copias; 0 = una sola copia')
+
+    def handle(self, *args, **options):
+        path = settings.SQLITE_REPLICA_PATH
+        if not path:
+            raise CommandError('No hay réplica SQLite configurada (DATABASE_REPLICA_URL=sqlite:///...)')
+        if connection.vendor != 'sqlite':
+            raise CommandError('La copia con la API de backup solo sirve si la base de datos principal es SQLite')
+
+        while True:
+            started = time.perf_counter()
+            refresh_sqlite_replica(path)
+            self.stdout.write(f'Réplica copiada en {time.perf_counter() - started:.2f} s → {path}')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
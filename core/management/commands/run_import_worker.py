@@ -0,0 +1,61 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.jobs import claim_next_job, run_job, run_export_job
+from core.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Procesa las importaciones y exportaciones en segundo plano (cola en la base de datos, sin broker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Segundos de espera cuando no hay trabajos')
+        parser.add_argument('--once', action='store_true',
+                            help='Procesa los trabajos pendientes y termina')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def work(self, index, options, stop):
+        worker = f'{socket.gethostname()}:{os.getpid()}:{index}'
+        try:
+            while not stop.is_set():
+                job = claim_next_job(worker)
+                if job is not None:
+                    self.stdout.write(f'[{worker}] importación {job.pk} (desde la fila {job.last_line})')
+                    run_job(job, chunk_size=options['chunk_size'])
+                    continue
+
+                job = claim_next_job(worker, ExportJob)
+                if job is not None:
+                    self.stdout.write(f'[{worker}] exportación {job.pk} ({job.get_kind_display()})')
+                    run_export_job(job)
+                    continue
+
+                if options['once']:
+                    return
+                stop.wait(options['poll_interval'])
+        finally:
+            # Cada hilo tiene su propia conexión
+            connection.close()
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        self.stdout.write(self.style.SUCCESS(f"Worker de importación y exportación con {options['threads']} hilos"))
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            futures = [pool.submit(self.work, i, options, stop) for i in range(options['threads'])]
+            try:
+                while not all(f.done() for f in futures):
+                    time.sleep(0.5)
+            except KeyboardInterrupt:
+                self.stdout.write('Deteniendo worker...')
+                stop.set()
+            for future in futures:
+                future.result()
@@ -0,0 +1,36 @@
+"""
+Middleware de medición.
+
+QueryCountMiddleware añade a cada respuesta la cabecera X-DB-Queries con el
+número de consultas SQL de la petición (en todas las bases de datos). Se
+activa con QUERY_COUNT_HEADER=1 y lo usa el comando benchmark para
+calcular las consultas por petición también contra gunicorn.
+"""
+from contextlib import ExitStack
+
+from django.db import connections
+
+
+QUERY_COUNT_HEADER = 'X-DB-Queries'
+
+
+class QueryCountMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        # En las respuestas en streaming solo cuenta lo hecho antes del primer byte
+        response[QUERY_COUNT_HEADER] = str(count)
+        return response
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 20:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_stockmovement'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='balance_after',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Saldo'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'created_at'], name='core_stockm_product_ef6271_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-18 21:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_summary(apps, schema_editor):
+    StockMovement = apps.get_model('core', 'StockMovement')
+    DailyMovementSummary = apps.get_model('core', 'DailyMovementSummary')
+
+    rows = (
+        StockMovement.objects.annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values_list('day', 'product_id', 'movement_type')
+        .annotate(quantity=Sum('quantity'), movement_count=Count('id'))
+    )
+    DailyMovementSummary.objects.bulk_create(
+        (
+            DailyMovementSummary(
+                date=day,
+                product_id=product_id,
+                movement_type=movement_type,
+                quantity=quantity,
+                movement_count=movement_count,
+            )
+            for day, product_id, movement_type, quantity, movement_count in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_stockmovement_balance_after'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMovementSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Día')),
+                ('movement_type', models.CharField(choices=[('IN', 'Entrada'), ('OUT', 'Salida')], max_length=3, verbose_name='Tipo')),
+                ('quantity', models.PositiveBigIntegerField(default=0, verbose_name='Cantidad')),
+                ('movement_count', models.PositiveIntegerField(default=0, verbose_name='Movimientos')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='core.product', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de movimientos',
+                'verbose_name_plural': 'Resúmenes diarios de movimientos',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['product', 'date'], name='core_dailym_product_c20858_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product', 'movement_type'), name='unique_daily_movement_summary')],
+            },
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 6.0.1 on 2026-10-18 22:05
+
+from django.db import OperationalError, migrations
+
+
+# SQL congelado: la migración no depende de cómo evolucione core.search
+CREATE_FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_product_fts USING fts5(
+        name, sku, content='core_product', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_product_fts_ai AFTER INSERT ON core_product BEGIN
+        INSERT INTO core_product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_product_fts_ad AFTER DELETE ON core_product BEGIN
+        INSERT INTO core_product_fts(core_product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_product_fts_au AFTER UPDATE OF name, sku ON core_product BEGIN
+        INSERT INTO core_product_fts(core_product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+        INSERT INTO core_product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+    "INSERT INTO core_product_fts(core_product_fts) VALUES ('rebuild')",
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS core_product_fts_ai",
+    "DROP TRIGGER IF EXISTS core_product_fts_ad",
+    "DROP TRIGGER IF EXISTS core_product_fts_au",
+    "DROP TABLE IF EXISTS core_product_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with schema_editor.connection.cursor() as cursor:
+            for sql in CREATE_FTS_SQL:
+                cursor.execute(sql)
+    except OperationalError:
+        # SQLite compilado sin FTS5 o sin tokenizador trigram
+        pass
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_FTS_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
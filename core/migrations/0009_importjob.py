@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 22:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_product_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='imports/', verbose_name='Archivo')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('running', 'En curso'), ('done', 'Completado'), ('failed', 'Fallido')], default='pending', max_length=10, verbose_name='Estado')),
+                ('last_line', models.PositiveIntegerField(default=1, verbose_name='Última fila confirmada')),
+                ('start_line', models.PositiveIntegerField(default=1, verbose_name='Fila inicial de la ejecución actual')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Creados')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='Actualizados')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='Errores')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Detalle de errores')),
+                ('message', models.TextField(blank=True, verbose_name='Mensaje')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Última señal del worker')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminado')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Importación',
+                'verbose_name_plural': 'Importaciones',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='core_import_status_6f3c45_idx')],
+            },
+        ),
+    ]
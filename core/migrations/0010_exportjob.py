@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_importjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('products', 'Productos'), ('movements', 'Movimientos')], max_length=20, verbose_name='Tipo')),
+                ('query', models.TextField(blank=True, verbose_name='Filtros')),
+                ('data_version', models.CharField(max_length=40, verbose_name='Versión de los datos')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('running', 'En curso'), ('done', 'Completado'), ('failed', 'Fallido')], default='pending', max_length=10, verbose_name='Estado')),
+                ('file_name', models.CharField(blank=True, max_length=255, verbose_name='Fichero')),
+                ('rows', models.PositiveBigIntegerField(default=0, verbose_name='Filas')),
+                ('message', models.TextField(blank=True, verbose_name='Mensaje')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Última señal del worker')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminado')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Exportación',
+                'verbose_name_plural': 'Exportaciones',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='core_export_status_2ad959_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+# SQL congelado (el de 0008): la migración no depende de cómo evolucione
+# core.search
+FTS_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_product_fts_ai AFTER INSERT ON core_product BEGIN
+        INSERT INTO core_product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_product_fts_ad AFTER DELETE ON core_product BEGIN
+        INSERT INTO core_product_fts(core_product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_product_fts_au AFTER UPDATE OF name, sku ON core_product BEGIN
+        INSERT INTO core_product_fts(core_product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+        INSERT INTO core_product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+    "INSERT INTO core_product_fts(core_product_fts) VALUES ('rebuild')",
+]
+
+
+def reinstall_fts(apps, schema_editor):
+    # En SQLite añadir la columna reconstruye core_product y se pierden los
+    # triggers del índice de búsqueda
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or 'core_product_fts' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for sql in FTS_TRIGGERS_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Actualizada'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Actualizado'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Actualizado'),
+        ),
+        migrations.RunPython(reinstall_fts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:40
+
+from django.db import migrations
+
+
+# SQL congelado: la migración no depende de cómo evolucione core.search
+CREATE_TRIGRAM_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    'CREATE INDEX IF NOT EXISTS core_product_name_trgm ON core_product USING gin (UPPER("name"::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS core_product_sku_trgm ON core_product USING gin (UPPER("sku"::text) gin_trgm_ops)',
+]
+
+DROP_TRIGRAM_SQL = [
+    "DROP INDEX IF EXISTS core_product_name_trgm",
+    "DROP INDEX IF EXISTS core_product_sku_trgm",
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in CREATE_TRIGRAM_SQL:
+            cursor.execute(sql)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_TRIGRAM_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
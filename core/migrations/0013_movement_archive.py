@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-19 00:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_product_trigram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='is_opening',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Saldo de apertura'),
+        ),
+        migrations.CreateModel(
+            name='StockMovementArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('movement_type', models.CharField(choices=[('IN', 'Entrada'), ('OUT', 'Salida')], max_length=3, verbose_name='Tipo')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('reason', models.CharField(blank=True, max_length=255, verbose_name='Motivo')),
+                ('created_at', models.DateTimeField(verbose_name='Fecha')),
+                ('balance_after', models.PositiveIntegerField(blank=True, null=True, verbose_name='Saldo')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Archivado')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_movements', to='core.product', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Movimiento archivado',
+                'verbose_name_plural': 'Movimientos archivados',
+                'indexes': [models.Index(fields=['product', 'created_at'], name='core_stockm_product_58fb5a_idx'), models.Index(fields=['created_at', 'id'], name='core_stockm_created_40aba3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 21:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_movement_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__lte', models.F('min_stock'))), fields=['name', 'id'], name='core_product_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['movement_type', 'created_at'], name='core_stockm_movemen_de9fd0_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:10
+
+import time
+
+from django.db import migrations, models
+
+
+def create_row(apps, schema_editor):
+    # Versión inicial basada en la hora: no coincide con ninguna usada antes
+    DataVersion = apps.get_model('core', 'DataVersion')
+    DataVersion.objects.using(schema_editor.connection.alias).get_or_create(
+        pk=1, defaults={'version': time.time_ns()}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Versión')),
+                ('modified', models.DateTimeField(blank=True, null=True, verbose_name='Última escritura')),
+            ],
+            options={
+                'verbose_name': 'Versión de los datos',
+                'verbose_name_plural': 'Versión de los datos',
+            },
+        ),
+        migrations.RunPython(create_row, migrations.RunPython.noop),
+    ]
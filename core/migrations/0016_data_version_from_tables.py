@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_data_version'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='DataVersion',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at'], name='core_produc_updated_c8b5c0_idx'),
+        ),
+    ]
@@ -1,10 +1,30 @@
-from django.db import models
+from django.db import models, transaction, connection
+from django.db.models import F, Q, Case, When
+from django.db.models.expressions import RawSQL
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-
+from django.utils import timezone
 
 User = get_user_model()
 
+# Filas por UPDATE ... SET x = x + CASE ...: cada fila usa hasta 5 parámetros
+# y SQLite admite 999 por consulta
+CASE_UPDATE_BATCH_SIZE = 150
+
+
+def case_by_key(column, values):
+    """
+    CASE <column> WHEN clave THEN valor ... ELSE 0 END a partir de un dict.
+    Con cientos de ramas es mucho más barato de construir que Case/When.
+    """
+    branches = ' '.join(['WHEN %s THEN %s'] * len(values))
+    params = [item for pair in values.items() for item in pair]
+    return RawSQL(
+        f'CASE {connection.ops.quote_name(column)} {branches} ELSE 0 END',
+        params,
+        output_field=models.BigIntegerField(),
+    )
+
 # Create your models here.
 class Category(models.Model):
     name = models.CharField(
@@ -24,6 +44,10 @@ class Category(models.Model):
         auto_now_add=True,
         verbose_name="Creada"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Actualizada"
+    )
 
     class Meta:
         verbose_name = "Categoría"
@@ -66,6 +90,10 @@ class Supplier(models.Model):
         auto_now_add=True,
         verbose_name="Creado"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Actualizado"
+    )
 
     class Meta:
         verbose_name = "Proveedor"
@@ -119,6 +147,10 @@ class Product(models.Model):
         auto_now_add=True,
         verbose_name="Creado"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Actualizado"
+    )
 
     class Meta:
         verbose_name = "Producto"
@@ -127,6 +159,16 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['sku']),
             models.Index(fields=['name']),
+            models.Index(fields=['name', 'id']),
+            # MAX(updated_at) de la versión de los datos (core.cache.data_state)
+            models.Index(fields=['updated_at']),
+            # Índice parcial: solo los productos con stock bajo, en el orden
+            # del listado (filtro low_stock y su recuento)
+            models.Index(
+                fields=['name', 'id'],
+                condition=Q(stock__lte=F('min_stock')),
+                name='core_product_low_stock_idx',
+            ),
         ]
 
     def __str__(self):
@@ -136,6 +178,39 @@ class Product(models.Model):
     def low_stock(self):
         return self.stock <= self.min_stock
 
+    def stock_at(self, when):
+        """
+        Stock del producto en un instante dado, usando el saldo guardado en
+        el último movimiento anterior (una búsqueda por índice).
+        """
+        movements = self.movements.order_by('-created_at', '-id')
+        last = movements.filter(created_at__lte=when).values_list('balance_after', flat=True).first()
+        if last is not None:
+            return last
+
+        # Sin movimientos previos: saldo antes del primer movimiento posterior
+        first = (
+            self.movements.filter(created_at__gt=when)
+            .order_by('created_at', 'id')
+            .values('movement_type', 'quantity', 'balance_after', 'is_opening')
+            .first()
+        )
+        if first is None or first['balance_after'] is None:
+            return self.stock
+        if first['is_opening']:
+            # Antes de la fila de apertura el historial está en el archivo
+            archived = (
+                self.archived_movements.filter(created_at__lte=when)
+                .order_by('-created_at', '-id')
+                .values_list('balance_after', flat=True)
+                .first()
+            )
+            if archived is not None:
+                return archived
+        if first['movement_type'] == StockMovement.ENTRY:
+            return first['balance_after'] - first['quantity']
+        return first['balance_after'] + first['quantity']
+
 
 class StockMovement(models.Model):
 
@@ -177,37 +252,547 @@ class StockMovement(models.Model):
         blank=True,
         verbose_name="Usuario"
     )
+    balance_after = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Saldo"
+    )
+    # Fila que resume los movimientos archivados de un producto (ver
+    # archive_movements): entrada o salida por la cantidad neta archivada
+    is_opening = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Saldo de apertura"
+    )
 
     class Meta:
         verbose_name = "Movimiento de stock"
         verbose_name_plural = "Movimientos de stock"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            models.Index(fields=['created_at', 'id']),
+            # Listado y exportación filtrados por tipo, en orden de fecha
+            models.Index(fields=['movement_type', 'created_at']),
+        ]
         
     
+    @staticmethod
+    def signed_quantity():
+        # Cantidad con signo: positiva para entradas y negativa para salidas
+        return Case(
+            When(movement_type=StockMovement.ENTRY, then=F('quantity')),
+            default=-F('quantity'),
+            output_field=models.IntegerField(),
+        )
+
     def save(self, *args, **kwargs):
         """
         Actualiza el stock del producto al crear un movimiento.
         - ENTRY suma stock
         - EXIT resta stock (no permite stock negativo)
+
+        El cambio de stock se hace con un UPDATE condicional en la base de
+        datos dentro de la misma transacción que inserta el movimiento, así
+        dos peticiones concurrentes no pueden perder actualizaciones ni
+        dejar el stock en negativo.
         """
 
-        if not self.pk:
+        if self.pk:
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            products = Product.objects.filter(pk=self.product_id)
+            # update() no aplica auto_now: updated_at se fija a mano (caché de filas)
+            now = timezone.now()
+
             if self.movement_type == self.ENTRY:
-                self.product.stock += self.quantity
+                products.update(stock=F('stock') + self.quantity, updated_at=now)
 
             elif self.movement_type == self.EXIT:
-                if self.quantity > self.product.stock:
+                updated = products.filter(stock__gte=self.quantity).update(
+                    stock=F('stock') - self.quantity, updated_at=now
+                )
+                if not updated:
+                    current = products.values_list('stock', flat=True).first()
                     raise ValidationError(
-                        f"No hay stock suficiente. Stock actual: {self.product.stock}"
+                        f"No hay stock suficiente. Stock actual: {current}"
                     )
-                self.product.stock -= self.quantity
-
-            self.product.save()
 
-        super().save(*args, **kwargs)
+            # Dentro de la transacción la fila ya está bloqueada por el UPDATE,
+            # por lo que el valor leído es el resultante de este movimiento
+            self.product.stock = products.values_list('stock', flat=True).get()
+            self.product.updated_at = now
+            self.balance_after = self.product.stock
 
-        
+            super().save(*args, **kwargs)
+            DailyMovementSummary.add_movements([self])
 
     def __str__(self):
         # Método para mostrar una representación legible del movimiento de stock
-        return f"{self.get_movement_type_display()} - {self.product.name} ({self.quantity})"
\ No newline at end of file
+        return f"{self.get_movement_type_display()} - {self.product.name} ({self.quantity})"
+
+
+class StockMovementArchive(models.Model):
+    """
+    Movimientos antiguos sacados de StockMovement por archive_movements.
+    Conservan el id original; en su lugar queda una fila de saldo de
+    apertura por producto para que stock, saldos y reconciliación cuadren.
+    """
+
+    id = models.BigIntegerField(
+        primary_key=True
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='archived_movements',
+        verbose_name="Producto"
+    )
+    movement_type = models.CharField(
+        max_length=3,
+        choices=StockMovement.MOVEMENT_TYPE_CHOICES,
+        verbose_name="Tipo"
+    )
+    quantity = models.PositiveIntegerField(
+        verbose_name="Cantidad"
+    )
+    reason = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Motivo"
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Fecha"
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Usuario"
+    )
+    balance_after = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Saldo"
+    )
+    archived_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Archivado"
+    )
+
+    class Meta:
+        verbose_name = "Movimiento archivado"
+        verbose_name_plural = "Movimientos archivados"
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_movement_type_display()} - {self.product_id} ({self.quantity})"
+
+
+class DailyMovementSummary(models.Model):
+    """
+    Totales diarios de movimientos por producto y tipo. Se mantiene en la
+    misma transacción que cada movimiento para que gráficos y métricas no
+    tengan que agregar toda la tabla StockMovement.
+    """
+
+    date = models.DateField(
+        verbose_name="Día"
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_summaries',
+        verbose_name="Producto"
+    )
+    movement_type = models.CharField(
+        max_length=3,
+        choices=StockMovement.MOVEMENT_TYPE_CHOICES,
+        verbose_name="Tipo"
+    )
+    quantity = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Cantidad"
+    )
+    movement_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Movimientos"
+    )
+
+    class Meta:
+        verbose_name = "Resumen diario de movimientos"
+        verbose_name_plural = "Resúmenes diarios de movimientos"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'product', 'movement_type'],
+                name='unique_daily_movement_summary',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product_id} {self.movement_type} ({self.quantity})"
+
+    @classmethod
+    def add_movements(cls, movements):
+        """
+        Suma movimientos ya guardados a su fila diaria: un INSERT que ignora
+        las filas existentes y un UPDATE incremental por día y tipo (con un
+        CASE por producto).
+        """
+        totals = {}
+        for movement in movements:
+            key = (timezone.localdate(movement.created_at), movement.product_id, movement.movement_type)
+            quantity, count = totals.get(key, (0, 0))
+            totals[key] = (quantity + movement.quantity, count + 1)
+
+        if not totals:
+            return
+
+        cls.objects.bulk_create(
+            [
+                cls(date=day, product_id=product_id, movement_type=movement_type)
+                for day, product_id, movement_type in totals
+            ],
+            ignore_conflicts=True,
+        )
+        by_day = {}
+        for (day, product_id, movement_type), value in totals.items():
+            by_day.setdefault((day, movement_type), {})[product_id] = value
+
+        for (day, movement_type), products in by_day.items():
+            product_ids = list(products)
+            for i in range(0, len(product_ids), CASE_UPDATE_BATCH_SIZE):
+                ids = product_ids[i:i + CASE_UPDATE_BATCH_SIZE]
+                cls.objects.filter(date=day, movement_type=movement_type, product_id__in=ids).update(
+                    quantity=F('quantity') + case_by_key('product_id', {pk: products[pk][0] for pk in ids}),
+                    movement_count=F('movement_count') + case_by_key('product_id', {pk: products[pk][1] for pk in ids}),
+                )
+
+
+class ImportJob(models.Model):
+    """
+    Importación de productos en segundo plano. La propia tabla hace de cola:
+    el worker (manage.py run_import_worker) reclama los trabajos pendientes y
+    guarda el progreso en la misma transacción que cada bloque importado, de
+    modo que un trabajo interrumpido se reanuda desde el último bloque
+    confirmado.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pendiente'),
+        (RUNNING, 'En curso'),
+        (DONE, 'Completado'),
+        (FAILED, 'Fallido'),
+    )
+
+    # Errores guardados como máximo (el resto solo se cuentan)
+    MAX_ERRORS = 500
+
+    file = models.FileField(
+        upload_to='imports/',
+        verbose_name="Archivo"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name="Estado"
+    )
+    last_line = models.PositiveIntegerField(
+        default=1,
+        verbose_name="Última fila confirmada"
+    )
+    start_line = models.PositiveIntegerField(
+        default=1,
+        verbose_name="Fila inicial de la ejecución actual"
+    )
+    created_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Creados"
+    )
+    updated_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Actualizados"
+    )
+    error_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Errores"
+    )
+    errors = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Detalle de errores"
+    )
+    message = models.TextField(
+        blank=True,
+        verbose_name="Mensaje"
+    )
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="Worker"
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Última señal del worker"
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Usuario"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Creado"
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Iniciado"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Terminado"
+    )
+
+    class Meta:
+        verbose_name = "Importación"
+        verbose_name_plural = "Importaciones"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Importación {self.pk} ({self.get_status_display()})"
+
+    @property
+    def rows_processed(self):
+        # Filas de datos leídas (la fila 1 es la cabecera)
+        return self.last_line - 1
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0
+        end = self.finished_at or timezone.now()
+        seconds = (end - self.started_at).total_seconds()
+        return round((self.last_line - self.start_line) / seconds, 1) if seconds > 0 else 0
+
+
+class ExportJob(models.Model):
+    """
+    Exportación grande generada en segundo plano por el mismo worker que las
+    importaciones. El resultado es el fichero comprimido de la caché de
+    exportaciones (ver core/exports.py).
+    """
+
+    # Mismos estados que las importaciones: la cola funciona igual
+    PENDING = ImportJob.PENDING
+    RUNNING = ImportJob.RUNNING
+    DONE = ImportJob.DONE
+    FAILED = ImportJob.FAILED
+
+    PRODUCTS = 'products'
+    MOVEMENTS = 'movements'
+
+    KIND_CHOICES = (
+        (PRODUCTS, 'Productos'),
+        (MOVEMENTS, 'Movimientos'),
+    )
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        verbose_name="Tipo"
+    )
+    query = models.TextField(
+        blank=True,
+        verbose_name="Filtros"
+    )
+    data_version = models.CharField(
+        max_length=40,
+        verbose_name="Versión de los datos"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=ImportJob.STATUS_CHOICES,
+        default=PENDING,
+        verbose_name="Estado"
+    )
+    file_name = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Fichero"
+    )
+    rows = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Filas"
+    )
+    message = models.TextField(
+        blank=True,
+        verbose_name="Mensaje"
+    )
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="Worker"
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Última señal del worker"
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Usuario"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Creado"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Terminado"
+    )
+
+    class Meta:
+        verbose_name = "Exportación"
+        verbose_name_plural = "Exportaciones"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Exportación {self.pk} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+
+def apply_stock_deltas(deltas):
+    """
+    Suma a cada producto su variación ({product_id: delta}) con un UPDATE
+    ... SET stock = stock + CASE id WHEN ... por cada bloque de productos.
+    El WHERE exige stock >= -delta a las variaciones negativas:
+    si alguna fila no se actualiza se lanza ValidationError y la
+    transacción del llamador deshace todo.
+    """
+    product_ids = list(deltas)
+    for i in range(0, len(product_ids), CASE_UPDATE_BATCH_SIZE):
+        ids = product_ids[i:i + CASE_UPDATE_BATCH_SIZE]
+
+        updated = Product.objects.filter(
+            pk__in=ids,
+            stock__gte=case_by_key('id', {pk: max(0, -deltas[pk]) for pk in ids}),
+        ).update(
+            stock=F('stock') + case_by_key('id', {pk: deltas[pk] for pk in ids}),
+            updated_at=timezone.now(),
+        )
+
+        if updated != len(ids):
+            # Solo en caso de error: averiguamos qué producto ha fallado
+            current = {
+                pk: (sku, stock)
+                for pk, sku, stock in Product.objects.filter(pk__in=ids).order_by().values_list('pk', 'sku', 'stock')
+            }
+            for pk in ids:
+                if pk not in current:
+                    raise ValidationError(f"El producto {pk} no existe")
+                sku, stock = current[pk]
+                if stock + deltas[pk] < 0:
+                    raise ValidationError(f"No hay stock suficiente para {sku}. Stock actual: {stock}")
+            raise ValidationError("No se ha podido actualizar el stock")
+
+
+def record_movements(batch, user=None):
+    """
+    Registra un lote de movimientos de stock en una única transacción.
+
+    Valida todo el lote, agrupa las cantidades por producto y aplica las
+    variaciones con UPDATEs por bloques (apply_stock_deltas) antes de insertar
+    los movimientos con bulk_create.
+    Si cualquier producto no existe o se quedaría con stock negativo no se
+    guarda nada (todo o nada).
+
+    Los movimientos se aplican en el orden del lote: cada uno guarda su
+    saldo (balance_after) y ninguno puede dejar el stock en negativo. Las
+    instancias de Product cargadas en memoria no se actualizan; usar
+    refresh_from_db() si se necesitan.
+    """
+
+    movements = list(batch)
+    errors = []
+    deltas = {}
+
+    for line, movement in enumerate(movements, start=1):
+        if user is not None and movement.created_by_id is None:
+            movement.created_by = user
+        if movement.product_id is None:
+            errors.append(f"Línea {line}: falta el producto")
+            continue
+        try:
+            movement.clean_fields(exclude=['product', 'created_by'])
+        except ValidationError as e:
+            errors.append(f"Línea {line}: {'; '.join(e.messages)}")
+            continue
+
+        delta = movement.quantity if movement.movement_type == StockMovement.ENTRY else -movement.quantity
+        deltas[movement.product_id] = deltas.get(movement.product_id, 0) + delta
+
+    if errors:
+        raise ValidationError(errors)
+
+    with transaction.atomic():
+        apply_stock_deltas(deltas)
+
+        # Saldo inicial de cada producto = stock final - variación del lote
+        product_ids = list(deltas)
+        balances = {}
+        for i in range(0, len(product_ids), 500):
+            stocks = Product.objects.filter(pk__in=product_ids[i:i + 500]).order_by().values_list('pk', 'stock')
+            balances.update((pk, stock - deltas[pk]) for pk, stock in stocks)
+
+        for line, movement in enumerate(movements, start=1):
+            if movement.movement_type == StockMovement.ENTRY:
+                balances[movement.product_id] += movement.quantity
+            else:
+                balances[movement.product_id] -= movement.quantity
+            if balances[movement.product_id] < 0:
+                raise ValidationError(f"Línea {line}: no hay stock suficiente en ese momento")
+            movement.balance_after = balances[movement.product_id]
+
+        created = StockMovement.objects.bulk_create(movements, batch_size=1000)
+        DailyMovementSummary.add_movements(created)
+    return created
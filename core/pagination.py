@@ -0,0 +1,140 @@
+"""
+Paginación por cursor (keyset) para listados grandes.
+
+En lugar de OFFSET, cada página busca a partir de los valores de la última
+fila vista (p. ej. created_at e id), que un índice compuesto resuelve igual
+de rápido en la página 1 que en la 100.000. Tampoco necesita COUNT(*).
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def encode_cursor(values, reverse=False):
+    values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+    data = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, model, fields):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [
+            model._meta.get_field(name).to_python(value)
+            for name, value in zip(fields, data['v'], strict=True)
+        ]
+        return values, bool(data['r'])
+    except (binascii.Error, ValueError, KeyError, TypeError, OverflowError, ValidationError) as e:
+        # ValidationError: JSON bien formado con valores que no son del campo
+        raise InvalidCursor(str(e))
+
+
+def seek_filter(fields, descending, values, reverse):
+    """
+    Condición "fila posterior a `values`" para una ordenación (a, b, ...):
+    a >= x AND (a > x OR (a = x AND b > y) ...). La primera comparación
+    permite a la base de datos recorrer el índice por rango.
+    """
+    def after(i):
+        field, desc = fields[i], descending[i] != reverse
+        strict = Q(**{f'{field}__{"lt" if desc else "gt"}': values[i]})
+        if i == len(fields) - 1:
+            return strict
+        return strict | (Q(**{field: values[i]}) & after(i + 1))
+
+    first_desc = descending[0] != reverse
+    return Q(**{f'{fields[0]}__{"lte" if first_desc else "gte"}': values[0]}) & after(0)
+
+
+def cursor_paginate(queryset, ordering, page_size, cursor=None):
+    """
+    Devuelve una CursorPage de `queryset` ordenado por `ordering` (que debe
+    acabar en una columna única, normalmente el id).
+    """
+    fields = [name.lstrip('-') for name in ordering]
+    descending = [name.startswith('-') for name in ordering]
+
+    reverse = False
+    if cursor:
+        values, reverse = decode_cursor(cursor, queryset.model, fields)
+        queryset = queryset.filter(seek_filter(fields, descending, values, reverse))
+
+    order = [
+        f'-{field}' if desc != reverse else field
+        for field, desc in zip(fields, descending)
+    ]
+    rows = list(queryset.order_by(*order)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    def values_of(obj):
+        return [getattr(obj, field) for field in fields]
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_more or reverse:
+            next_cursor = encode_cursor(values_of(rows[-1]))
+        if cursor and (has_more or not reverse):
+            previous_cursor = encode_cursor(values_of(rows[0]), reverse=True)
+    return CursorPage(rows, next_cursor, previous_cursor)
+
+
+class CursorPaginationMixin:
+    """
+    Activa la paginación por cursor en un ListView/FilterView cuando
+    settings.CURSOR_PAGINATION está activo o la petición trae un cursor.
+    """
+    cursor_ordering = None
+    cursor_param = 'cursor'
+
+    def cursor_pagination_enabled(self):
+        return bool(self.cursor_ordering) and (
+            settings.CURSOR_PAGINATION or self.cursor_param in self.request.GET
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.cursor_pagination_enabled():
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = cursor_paginate(
+                queryset, self.cursor_ordering, page_size, self.request.GET.get(self.cursor_param)
+            )
+        except InvalidCursor:
+            # Un cursor manipulado o caducado vuelve a la primera página
+            page = cursor_paginate(queryset, self.cursor_ordering, page_size)
+        return (None, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,171 @@
+"""
+Lecturas desde una réplica de solo lectura (opcional).
+
+Si settings.DATABASES tiene el alias 'replica', las vistas marcadas con
+read_from_replica (panel, listados y exportaciones) leen los datos del
+inventario de la réplica. Todo lo demás va a 'default': escrituras,
+sesiones, usuarios y colas de trabajos.
+
+Tras cualquier petición que escribe (POST, PUT, PATCH, DELETE), el
+navegador recibe una cookie que durante REPLICA_STICKY_SECONDS hace leer
+del primario: quien acaba de registrar un movimiento lo ve en el listado
+aunque la réplica aún no lo tenga.
+
+Con SQLite la réplica es una copia del fichero hecha con la API de backup
+(refresh_sqlite_replica, comando refresh_replica) y su fecha de
+modificación entra en la versión de los datos, para que el ETag de las
+páginas y las exportaciones cacheadas cambien al refrescarla.
+"""
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .cache import data_state
+
+
+REPLICA = 'replica'
+
+STICKY_COOKIE = 'primary_until'
+
+# Solo los datos del inventario; sesiones, usuarios y trabajos siempre del primario
+REPLICA_MODELS = {
+    'core.category', 'core.supplier', 'core.product', 'core.stockmovement', 'core.dailymovementsummary',
+    # Con ?archived=1 la exportación lee ambas tablas: de la misma base, o
+    # un archivado a medias duplicaría o perdería filas
+    'core.stockmovementarchive',
+}
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+def sticky_primary(request):
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def use_replica(request):
+    return replica_configured() and not sticky_primary(request)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_from_replica(view):
+    """
+    Decorador de vistas (o de dispatch con method_decorator). Las
+    TemplateResponse se pintan dentro para que las consultas perezosas de
+    la plantilla también vayan a la réplica.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(use_replica(request)):
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+    return wrapper
+
+
+def replica_version():
+    path = getattr(settings, 'SQLITE_REPLICA_PATH', None)
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_state(request):
+    """
+    (versión, última escritura) de los datos que verá la petición: con
+    réplica SQLite se le añade a la versión la fecha de la última copia. Se
+    guarda en la petición; ETag y Last-Modified la leen con una consulta.
+    """
+    if not hasattr(request, '_data_state'):
+        version, modified = data_state()
+        if use_replica(request) and (copied := replica_version()) is not None:
+            version = f'{version}-{copied}'
+        request._data_state = (version, modified)
+    return request._data_state
+
+
+def read_version(request):
+    return read_state(request)[0]
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and model._meta.label_lower in REPLICA_MODELS:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explícito: una instancia leída de la réplica se guarda en el primario
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # La réplica es una copia del primario, no se migra por separado
+        return db != REPLICA
+
+
+class StickyPrimaryMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_configured():
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(time.time() + settings.REPLICA_STICKY_SECONDS),
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+def refresh_sqlite_replica(path, using=DEFAULT_DB_ALIAS):
+    """
+    Copia la base de datos SQLite a `path` con la API de backup (solo datos
+    confirmados) y sustituye el fichero de forma atómica: las conexiones
+    abiertas siguen leyendo la copia anterior hasta que se cierran.
+    """
+    source = connections[using]
+    source.ensure_connection()
+    tmp = f'{path}.tmp'
+    if os.path.exists(tmp):
+        os.unlink(tmp)
+    target = sqlite3.connect(tmp)
+    try:
+        source.connection.backup(target)
+        # La copia hereda el modo WAL, que no se puede abrir en solo lectura
+        # sin los ficheros -wal y -shm
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+    os.replace(tmp, path)
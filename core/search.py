@@ -0,0 +1,143 @@
+"""
+Búsqueda de productos por nombre y SKU.
+
+En SQLite se usa una tabla virtual FTS5 con tokenizador trigram, que resuelve
+búsquedas por subcadena (como icontains) sin recorrer toda la tabla. Unos
+triggers la mantienen sincronizada con core_product. En PostgreSQL se usan
+las búsquedas icontains de siempre, servidas por índices GIN de pg_trgm
+sobre UPPER(name) y UPPER(sku), que es la expresión que genera icontains.
+En el resto de bases de datos, icontains sin índice.
+"""
+from django.db import connection, connections, OperationalError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'core_product_fts'
+
+# Con trigram, FTS5 solo puede buscar textos de al menos 3 caracteres
+MIN_FTS_LENGTH = 3
+
+FTS_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, sku, content='core_product', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON core_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON core_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+    END
+    """,
+    # Solo al cambiar nombre o SKU: los cambios de stock no tocan el índice
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, sku ON core_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+        INSERT INTO {FTS_TABLE}(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+]
+
+TRIGRAM_INDEXES = {
+    'core_product_name_trgm': 'name',
+    'core_product_sku_trgm': 'sku',
+}
+
+_available = {}
+
+
+def install_fts(conn=connection, rebuild=True):
+    """
+    Crea (si no existen) la tabla FTS5 y sus triggers y opcionalmente la
+    regenera desde core_product. Devuelve False si la base de datos no
+    soporta FTS5. Es idempotente. Las migraciones no la usan: llevan su
+    propia copia de este SQL (ver 0008_product_fts) y las que reconstruyen
+    core_product en SQLite deben volver a crear los triggers.
+    """
+    _available.pop(conn.alias, None)
+    if conn.vendor != 'sqlite':
+        return False
+    try:
+        with conn.cursor() as cursor:
+            for sql in FTS_SQL:
+                cursor.execute(sql)
+            if rebuild:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except OperationalError:
+        # SQLite compilado sin FTS5 o sin tokenizador trigram
+        return False
+    return True
+
+
+def uninstall_fts(conn=connection):
+    _available.pop(conn.alias, None)
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def install_trigram_indexes(conn=connection):
+    """
+    Crea la extensión pg_trgm y los índices GIN de búsqueda. Solo en
+    PostgreSQL; devuelve False en otras bases de datos.
+    """
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for index, column in TRIGRAM_INDEXES.items():
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {index} ON core_product '
+                f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+            )
+    return True
+
+
+def uninstall_trigram_indexes(conn=connection):
+    if conn.vendor != 'postgresql':
+        return
+    with conn.cursor() as cursor:
+        for index in TRIGRAM_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def fts_available(conn=connection):
+    if conn.alias not in _available:
+        _available[conn.alias] = (
+            conn.vendor == 'sqlite' and FTS_TABLE in conn.introspection.table_names()
+        )
+    return _available[conn.alias]
+
+
+def fts_query(text, column=None):
+    # Frase entre comillas para que FTS5 no interprete operadores del usuario
+    phrase = '"' + text.replace('"', '""') + '"'
+    return f'{column} : {phrase}' if column else phrase
+
+
+def search_products(queryset, text, column=None):
+    """
+    Filtra un queryset de Product por `text` en `column` ('name' o 'sku')
+    o en ambas si no se indica.
+    """
+    text = text.strip()
+    if not text:
+        return queryset
+
+    if len(text) >= MIN_FTS_LENGTH and fts_available(connections[queryset.db]):
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [fts_query(text, column)],
+        ))
+
+    if column:
+        return queryset.filter(**{f'{column}__icontains': text})
+    return queryset.filter(Q(name__icontains=text) | Q(sku__icontains=text))
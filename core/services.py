@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Sum, F, Q
+from django.utils import timezone
+
+from .cache import (
+    DASHBOARD_METRICS_KEY, DASHBOARD_METRICS_TIMEOUT,
+    REFERENCE_CHOICES_KEY, REFERENCE_CHOICES_TIMEOUT, reference_version,
+)
+from .models import Category, Supplier, Product, StockMovement, DailyMovementSummary
+from .replicas import read_version
+
+
+def compute_dashboard_metrics():
+    """
+    Calcula las métricas del dashboard con un número fijo de consultas
+    agregadas, independiente del tamaño del catálogo.
+    """
+    products = Product.objects.aggregate(
+        total=Count('id'),
+        low_stock=Count('id', filter=Q(stock__lte=F('min_stock'))),
+        value=Sum(F('stock') * F('price')),
+    )
+
+    per_category = (
+        Product.objects.order_by('category__name')
+        .values_list('category__name')
+        .annotate(total=Count('id'))
+    )
+
+    # Los totales salen de la tabla de resúmenes diarios, mucho más pequeña
+    movements = DailyMovementSummary.objects.aggregate(
+        entries=Sum('quantity', filter=Q(movement_type=StockMovement.ENTRY)),
+        exits=Sum('quantity', filter=Q(movement_type=StockMovement.EXIT)),
+    )
+    series = movement_series()
+
+    category_labels = []
+    category_counts = []
+    for name, total in per_category:
+        category_labels.append(name)
+        category_counts.append(total)
+
+    return {
+        'total_products': products['total'],
+        'total_categories': Category.objects.count(),
+        'total_suppliers': Supplier.objects.count(),
+        'low_stock_count': products['low_stock'],
+        'category_labels': category_labels,
+        'category_counts': category_counts,
+        'entries_total': movements['entries'] or 0,
+        'exits_total': movements['exits'] or 0,
+        'valor_inventario': products['value'] or 0,
+        'series_labels': series['labels'],
+        'series_entries': series['entries'],
+        'series_exits': series['exits'],
+    }
+
+
+def movement_series(days=30, product=None):
+    """
+    Entradas y salidas por día de los últimos `days` días (todos los
+    productos o uno concreto), leídas de DailyMovementSummary.
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+
+    summaries = DailyMovementSummary.objects.filter(date__gte=start)
+    if product is not None:
+        summaries = summaries.filter(product=product)
+    rows = (
+        summaries.order_by()
+        .values_list('date', 'movement_type')
+        .annotate(total=Sum('quantity'))
+    )
+
+    dates = [start + timedelta(days=i) for i in range(days)]
+    totals = {(day, movement_type): total for day, movement_type, total in rows}
+    return {
+        'labels': [day.strftime('%d/%m') for day in dates],
+        'entries': [totals.get((day, StockMovement.ENTRY), 0) for day in dates],
+        'exits': [totals.get((day, StockMovement.EXIT), 0) for day in dates],
+    }
+
+
+def get_dashboard_metrics(request):
+    # Métricas cacheadas por versión de los datos que ve la petición: tras una
+    # escritura (cookie del primario) no se reutilizan las leídas de la réplica
+    key = DASHBOARD_METRICS_KEY.format(read_version(request))
+    return cache.get_or_set(key, compute_dashboard_metrics, DASHBOARD_METRICS_TIMEOUT)
+
+
+def reference_choices(model):
+    """
+    Lista [(pk, nombre), ...] de categorías o proveedores ordenada por
+    nombre, servida desde la caché mientras no cambie ninguna fila.
+    """
+    name = model._meta.label_lower
+    key = REFERENCE_CHOICES_KEY.format(name, reference_version(name))
+    return cache.get_or_set(
+        key,
+        lambda: list(model.objects.order_by('name').values_list('pk', 'name')),
+        REFERENCE_CHOICES_TIMEOUT,
+    )
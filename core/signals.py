@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_reference_version
+from .models import Category, Supplier
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Supplier)
+def reference_list_changed(sender, **kwargs):
+    # Desplegables de categorías y proveedores (ver services.reference_choices)
+    bump_reference_version(sender._meta.label_lower)
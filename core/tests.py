@@ -1,3 +1,1516 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import json
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import Q, Sum
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Category, Supplier, Product, StockMovement, StockMovementArchive, DailyMovementSummary, ImportJob, ExportJob,
+    record_movements,
+)
+from .importers import import_products_csv, import_movements_csv, ProductImporter, parse_product_row
+from .exports import EXPORTS, EXPORT_DIR, csv_chunks, copy_chunks, evict_exports, export_path
+from .jobs import claim_next_job, run_job, run_export_job, STALE_AFTER
+from .pagination import InvalidCursor, cursor_paginate, decode_cursor, encode_cursor
+from .search import TRIGRAM_INDEXES, search_products
+from .replicas import REPLICA, ReplicaRouter, read_version, refresh_sqlite_replica, replica_reads
+from .filters import ProductFilter
+from .forms import ProductForm
+from .cache import data_state
+from .services import compute_dashboard_metrics, movement_series, reference_choices
+
+
+def create_product(sku='SKU-1', stock=0, **kwargs):
+    category = kwargs.pop('category', None) or Category.objects.get_or_create(name='Categoría')[0]
+    supplier = kwargs.pop('supplier', None) or Supplier.objects.get_or_create(name='Proveedor')[0]
+    return Product.objects.create(
+        name=kwargs.pop('name', f'Producto {sku}'),
+        sku=sku,
+        category=category,
+        supplier=supplier,
+        stock=stock,
+        price=kwargs.pop('price', Decimal('10.00')),
+        **kwargs
+    )
+
+
+def ledger_total(product):
+    totals = StockMovement.objects.filter(product=product).aggregate(
+        entries=Sum('quantity', filter=Q(movement_type=StockMovement.ENTRY)),
+        exits=Sum('quantity', filter=Q(movement_type=StockMovement.EXIT)),
+    )
+    return (totals['entries'] or 0) - (totals['exits'] or 0)
+
+
+def temporary_directory(test):
+    """Carpeta temporal propia del test, borrada al terminar."""
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    return tmp.name
+
+
+def temporary_media_root(test):
+    """MEDIA_ROOT en una carpeta temporal propia del test."""
+    media = override_settings(MEDIA_ROOT=temporary_directory(test))
+    media.enable()
+    test.addCleanup(media.disable)
+    return settings.MEDIA_ROOT
+
+
+class StockMovementSaveTests(TestCase):
+
+    def setUp(self):
+        self.product = create_product(stock=5)
+
+    def test_entry_adds_stock(self):
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.ENTRY, quantity=3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+    def test_exit_subtracts_stock(self):
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.EXIT, quantity=5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+    def test_exit_without_stock_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            StockMovement.objects.create(product=self.product, movement_type=StockMovement.EXIT, quantity=6)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_stale_instance_does_not_overwrite_stock(self):
+        # Otro proceso consume el stock después de haber leído el producto
+        stale = Product.objects.get(pk=self.product.pk)
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+        with self.assertRaises(ValidationError):
+            StockMovement.objects.create(product=stale, movement_type=StockMovement.EXIT, quantity=5)
+        StockMovement.objects.create(product=stale, movement_type=StockMovement.ENTRY, quantity=2)
+        self.assertEqual(stale.stock, 3)
+
+
+class RecordMovementsTests(TestCase):
+
+    def setUp(self):
+        self.a = create_product(sku='A', stock=10)
+        self.b = create_product(sku='B', stock=0)
+
+    def test_batch_combines_deltas_per_product(self):
+        user = get_user_model().objects.create_user('muelle')
+        created = record_movements([
+            StockMovement(product=self.a, movement_type=StockMovement.EXIT, quantity=4),
+            StockMovement(product=self.a, movement_type=StockMovement.ENTRY, quantity=1),
+            StockMovement(product=self.b, movement_type=StockMovement.ENTRY, quantity=7),
+        ], user=user)
+        self.assertEqual(len(created), 3)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.stock, self.b.stock), (7, 7))
+        self.assertEqual(StockMovement.objects.filter(created_by=user).count(), 3)
+
+    def test_batch_is_all_or_nothing(self):
+        with self.assertRaises(ValidationError):
+            record_movements([
+                StockMovement(product=self.a, movement_type=StockMovement.ENTRY, quantity=5),
+                StockMovement(product=self.b, movement_type=StockMovement.EXIT, quantity=1),
+            ])
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.stock, 10)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_invalid_lines_are_reported(self):
+        with self.assertRaises(ValidationError) as ctx:
+            record_movements([
+                StockMovement(product=self.a, movement_type='XX', quantity=1),
+                StockMovement(movement_type=StockMovement.ENTRY, quantity=1),
+            ])
+        self.assertEqual(len(ctx.exception.messages), 2)
+
+    def test_batch_query_count(self):
+        batch = [
+            StockMovement(product_id=pk, movement_type=StockMovement.ENTRY, quantity=1)
+            for pk in [self.a.pk, self.b.pk] * 50
+        ]
+        # Un UPDATE para todos los productos + lectura de saldos + un INSERT, sin lecturas por línea,
+        # y el resumen diario: un INSERT y un UPDATE por día y tipo
+        with self.assertNumQueries(3 + 2 + 2):  # + SAVEPOINT/RELEASE del atomic
+            record_movements(batch)
+
+
+class BalanceAfterTests(TestCase):
+
+    def setUp(self):
+        self.product = create_product(stock=10)
+
+    def test_save_stores_balance(self):
+        movement = StockMovement.objects.create(product=self.product, movement_type=StockMovement.EXIT, quantity=4)
+        self.assertEqual(movement.balance_after, 6)
+
+    def test_batch_stores_running_balance_in_order(self):
+        created = record_movements([
+            StockMovement(product=self.product, movement_type=StockMovement.EXIT, quantity=10),
+            StockMovement(product=self.product, movement_type=StockMovement.ENTRY, quantity=3),
+        ])
+        self.assertEqual([m.balance_after for m in created], [0, 3])
+
+    def test_batch_rejects_negative_intermediate_balance(self):
+        with self.assertRaises(ValidationError):
+            record_movements([
+                StockMovement(product=self.product, movement_type=StockMovement.EXIT, quantity=12),
+                StockMovement(product=self.product, movement_type=StockMovement.ENTRY, quantity=5),
+            ])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+
+    def test_stock_at(self):
+        now = timezone.now()
+        for days, movement_type, quantity in [(3, StockMovement.ENTRY, 5), (1, StockMovement.EXIT, 8)]:
+            movement = StockMovement.objects.create(product=self.product, movement_type=movement_type, quantity=quantity)
+            StockMovement.objects.filter(pk=movement.pk).update(created_at=now - timedelta(days=days))
+
+        self.assertEqual(self.product.stock_at(now - timedelta(days=4)), 10)
+        self.assertEqual(self.product.stock_at(now - timedelta(days=2)), 15)
+        self.assertEqual(self.product.stock_at(now), 7)
+
+    def test_backfill_balances(self):
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.ENTRY, quantity=5)
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.EXIT, quantity=2)
+        StockMovement.objects.update(balance_after=None)
+
+        call_command('backfill_balances', stdout=StringIO())
+        balances = list(StockMovement.objects.order_by('id').values_list('balance_after', flat=True))
+        self.assertEqual(balances, [15, 13])
+
+
+class ReconcileStockTests(TestCase):
+
+    def test_reports_and_fixes_drift(self):
+        ok = create_product(sku='OK')
+        drifted = create_product(sku='DRIFT')
+        StockMovement.objects.create(product=ok, movement_type=StockMovement.ENTRY, quantity=4)
+        StockMovement.objects.create(product=drifted, movement_type=StockMovement.ENTRY, quantity=4)
+        # Edición directa del stock, como desde el admin o la importación
+        Product.objects.filter(pk=drifted.pk).update(stock=1)
+
+        out = StringIO()
+        report = os.path.join(temporary_directory(self), 'descuadres.csv')
+        call_command('reconcile_stock', '--fix', report=report, stdout=out)
+        self.assertIn('DRIFT: stock 1, movimientos 4 (-3)', out.getvalue())
+        with open(report, encoding='utf-8') as f:
+            self.assertEqual(list(csv.reader(f))[1:], [[str(drifted.pk), 'DRIFT', '1', '4', '-3']])
+
+        adjustment = StockMovement.objects.get(reason='Ajuste de reconciliación')
+        self.assertEqual(
+            (adjustment.product_id, adjustment.movement_type, adjustment.quantity, adjustment.balance_after),
+            (drifted.pk, StockMovement.EXIT, 3, 1),
+        )
+        out = StringIO()
+        call_command('reconcile_stock', stdout=out)
+        self.assertIn('cuadra', out.getvalue())
+
+
+class ArchiveMovementsTests(TestCase):
+
+    def setUp(self):
+        self.product = create_product(stock=10)
+        self.other = create_product(sku='SKU-2', stock=0)
+        now = timezone.now()
+        for product, days, movement_type, quantity in [
+            (self.product, 40, StockMovement.ENTRY, 5),
+            (self.product, 35, StockMovement.EXIT, 12),
+            (self.other, 32, StockMovement.ENTRY, 4),
+            (self.product, 1, StockMovement.ENTRY, 2),
+        ]:
+            movement = StockMovement.objects.create(product=product, movement_type=movement_type, quantity=quantity)
+            StockMovement.objects.filter(pk=movement.pk).update(created_at=now - timedelta(days=days))
+
+    def archive(self, chunk_size=5000):
+        call_command('archive_movements', older_than=30, chunk_size=chunk_size, stdout=StringIO())
+
+    def test_opening_rows_keep_stock_and_balances(self):
+        before = self.product.stock_at(timezone.now() - timedelta(days=36))
+        self.archive(chunk_size=2)
+
+        self.assertEqual(StockMovementArchive.objects.count(), 3)
+        opening = StockMovement.objects.get(product=self.product, is_opening=True)
+        self.assertEqual((opening.movement_type, opening.quantity, opening.balance_after), (StockMovement.EXIT, 7, 3))
+        self.assertEqual(StockMovement.objects.filter(product=self.other, is_opening=True).count(), 1)
+        for product in (self.product, self.other):
+            product.refresh_from_db()
+            self.assertEqual(product.stock, ledger_total(product) + (10 if product == self.product else 0))
+        self.assertEqual(self.product.stock_at(timezone.now() - timedelta(days=36)), before)
+        self.assertEqual(self.product.stock_at(timezone.now() - timedelta(days=10)), 3)
+
+        # Sin nada nuevo que archivar no cambia nada
+        self.archive()
+        self.assertEqual(StockMovement.objects.count(), 3)
+        self.assertEqual(StockMovementArchive.objects.count(), 3)
+
+    def test_rebuild_daily_summary_includes_archive(self):
+        # Las fechas se cambiaron con update(): se parte de un resumen reconstruido
+        call_command('rebuild_daily_summary', stdout=StringIO())
+        expected = list(DailyMovementSummary.objects.order_by('date', 'product', 'movement_type').values_list(
+            'date', 'product', 'movement_type', 'quantity', 'movement_count'
+        ))
+        self.archive()
+        call_command('rebuild_daily_summary', stdout=StringIO())
+        self.assertEqual(
+            list(DailyMovementSummary.objects.order_by('date', 'product', 'movement_type').values_list(
+                'date', 'product', 'movement_type', 'quantity', 'movement_count'
+            )),
+            expected,
+        )
+
+    def test_export_includes_archived_on_request(self):
+        temporary_media_root(self)
+        self.archive()
+        self.client.force_login(get_user_model().objects.create_user('exportador'))
+
+        def export_types(**params):
+            response = self.client.get(reverse('movement_export'), params)
+            rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+            return [(row[3], row[4]) for row in rows[1:]]
+
+        self.assertEqual(export_types(), [('Entrada', '2'), ('Saldo de apertura', '4'), ('Saldo de apertura', '-7')])
+        self.assertEqual(
+            export_types(archived='1'),
+            [('Entrada', '2'), ('Entrada', '4'), ('Salida', '12'), ('Entrada', '5')],
+        )
+
+
+class GenerateDatasetTests(TestCase):
+
+    def generate(self, seed=1):
+        call_command(
+            'generate_dataset', products=30, movements=400, categories=3, suppliers=4, users=2, days=60,
+            end=date(2026, 1, 31), seed=seed, stdout=StringIO(),
+        )
+
+    def snapshot(self):
+        products = list(Product.objects.order_by('sku').values_list(
+            'sku', 'name', 'category__name', 'supplier__name', 'stock', 'min_stock', 'price',
+        ))
+        movements = list(StockMovement.objects.order_by('created_at', 'id').values_list(
+            'product__sku', 'movement_type', 'quantity', 'created_at', 'balance_after', 'created_by__username',
+        ))
+        return products, movements
+
+    def clear(self):
+        StockMovement.objects.all().delete()
+        DailyMovementSummary.objects.all().delete()
+        Product.objects.all().delete()
+        Category.objects.all().delete()
+        Supplier.objects.all().delete()
+
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = self.snapshot()
+        self.clear()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+        self.clear()
+        self.generate(seed=2)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_stock_balances_and_summaries_are_consistent(self):
+        self.generate()
+        self.assertEqual(StockMovement.objects.count(), 400)
+
+        counts = []
+        for product in Product.objects.all():
+            self.assertEqual(product.stock, ledger_total(product))
+            last = product.movements.order_by('created_at', 'id').last()
+            if last is not None:
+                self.assertEqual(last.balance_after, product.stock)
+            counts.append(product.movements.count())
+        # Popularidad tipo Zipf: el producto más movido supera con creces la media
+        self.assertGreater(max(counts), 4 * sum(counts) / len(counts))
+
+        expected = self.summary()
+        call_command('rebuild_daily_summary', stdout=StringIO())
+        self.assertEqual(self.summary(), expected)
+
+        with self.assertRaises(CommandError):
+            self.generate()
+
+    def summary(self):
+        return list(DailyMovementSummary.objects.order_by('date', 'product', 'movement_type').values_list(
+            'date', 'product', 'movement_type', 'quantity', 'movement_count',
+        ))
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def setUp(self):
+        call_command(
+            'generate_dataset', products=30, movements=300, categories=3, suppliers=3, users=1, seed=1,
+            stdout=StringIO(),
+        )
+        self.media = temporary_media_root(self)
+
+    def benchmark(self, **options):
+        output = os.path.join(self.media, 'result.json')
+        call_command(
+            'benchmark', existing=True, workers=1, duration=0.5, warmup=0, output=output,
+            stdout=StringIO(), **options,
+        )
+        with open(output, encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_runs_every_scenario_and_writes_json(self):
+        result = self.benchmark()
+
+        self.assertEqual(set(result['scenarios']), {'products', 'movements', 'post', 'export', 'dashboard'})
+        self.assertGreater(result['total']['requests'], 0)
+        self.assertEqual(result['total']['errors'], 0)
+        self.assertEqual(
+            result['total']['requests'], sum(s['requests'] for s in result['scenarios'].values())
+        )
+        # Las consultas salen de la cabecera de QueryCountMiddleware
+        self.assertGreater(result['total']['queries_per_request'], 0)
+        self.assertLessEqual(result['total']['p50_ms'], result['total']['p99_ms'])
+
+    def test_baseline_regression_fails(self):
+        result = self.benchmark(mix='dashboard')
+        baseline = os.path.join(self.media, 'baseline.json')
+        result['scenarios']['dashboard']['p95_ms'] = result['total']['p95_ms'] = 1e-6
+        with open(baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+
+        with self.assertRaises(CommandError):
+            self.benchmark(mix='dashboard', baseline=baseline, max_regression=50)
+        self.benchmark(mix='dashboard', baseline=baseline)
+
+
+class DashboardMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        for i in range(30):
+            category = Category.objects.create(name=f'Categoría {i}')
+            product = create_product(sku=f'SKU-{i}', stock=i, category=category, min_stock=5)
+            StockMovement.objects.create(product=product, movement_type=StockMovement.ENTRY, quantity=2)
+
+        with self.assertNumQueries(6):
+            metrics = compute_dashboard_metrics()
+        self.assertEqual(metrics['total_products'], 30)
+        self.assertEqual(metrics['total_categories'], 30)
+        self.assertEqual(metrics['low_stock_count'], 4)
+        self.assertEqual(metrics['entries_total'], 60)
+        self.assertEqual(len(metrics['category_labels']), 30)
+
+    def test_home_is_cached_until_data_changes(self):
+        product = create_product(stock=1)
+        self.client.get(reverse('home'))
+        # Solo la versión de los datos (ETag); las métricas salen de la caché
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['entries_total'], 0)
+
+        record_movements([StockMovement(product=product, movement_type=StockMovement.ENTRY, quantity=3)])
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['entries_total'], 3)
+
+        StockMovement.objects.create(product=product, movement_type=StockMovement.EXIT, quantity=1)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['exits_total'], 1)
+
+
+class DailyMovementSummaryTests(TestCase):
+
+    def setUp(self):
+        self.product = create_product(stock=100)
+
+    def summary(self):
+        return list(
+            DailyMovementSummary.objects.order_by('movement_type')
+            .values_list('movement_type', 'quantity', 'movement_count')
+        )
+
+    def test_movements_update_summary(self):
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.ENTRY, quantity=5)
+        record_movements([
+            StockMovement(product=self.product, movement_type=StockMovement.ENTRY, quantity=2),
+            StockMovement(product=self.product, movement_type=StockMovement.EXIT, quantity=3),
+        ])
+        self.assertEqual(self.summary(), [('IN', 7, 2), ('OUT', 3, 1)])
+
+        series = movement_series(days=7, product=self.product)
+        self.assertEqual((series['entries'][-1], series['exits'][-1]), (7, 3))
+        self.assertEqual(len(series['labels']), 7)
+
+    def test_rebuild_matches_incremental(self):
+        for quantity in (1, 2, 3):
+            StockMovement.objects.create(product=self.product, movement_type=StockMovement.EXIT, quantity=quantity)
+        expected = self.summary()
+        DailyMovementSummary.objects.all().delete()
+
+        call_command('rebuild_daily_summary', stdout=StringIO())
+        self.assertEqual(self.summary(), expected)
+
+
+class CursorPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('empleado')
+        self.client.force_login(self.user)
+        # Nombres repetidos para comprobar el desempate por id
+        for i in range(25):
+            create_product(sku=f'SKU-{i:02d}', name=f'Producto {i % 5}', stock=i)
+
+    def test_walks_forward_and_backward(self):
+        queryset = Product.objects.all()
+        expected = list(queryset.order_by('name', 'id'))
+
+        pages = [cursor_paginate(queryset, ('name', 'id'), 10)]
+        while pages[-1].has_next():
+            pages.append(cursor_paginate(queryset, ('name', 'id'), 10, pages[-1].next_cursor))
+        self.assertEqual([obj for page in pages for obj in page], expected)
+        self.assertFalse(pages[0].has_previous())
+
+        back = cursor_paginate(queryset, ('name', 'id'), 10, pages[-1].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        self.assertTrue(back.has_next())
+
+    def test_descending_ordering(self):
+        for product in Product.objects.all()[:3]:
+            StockMovement.objects.create(product=product, movement_type=StockMovement.ENTRY, quantity=1)
+        queryset = StockMovement.objects.all()
+        first = cursor_paginate(queryset, ('-created_at', '-id'), 2)
+        second = cursor_paginate(queryset, ('-created_at', '-id'), 2, first.next_cursor)
+        self.assertEqual(
+            [m.pk for m in first] + [m.pk for m in second],
+            list(queryset.order_by('-created_at', '-id').values_list('pk', flat=True)),
+        )
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_list_view_keeps_filters_and_skips_count(self):
+        url = reverse('product_list')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'name': 'Producto 1'})
+        # El único recuento es el de la versión de los datos (ETag)
+        self.assertFalse(any('__count' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(len(response.context['products']), 5)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+        response = self.client.get(url, {'name': 'Producto', 'cursor': 'no-es-un-cursor'})
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 10)
+        self.assertContains(response, f'?name=Producto&cursor={page.next_cursor}#table')
+
+    def test_cursor_with_bad_values_goes_back_to_the_first_page(self):
+        def token(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+        bad = [
+            {'v': ['garbage', 'x'], 'r': False},
+            {'v': ['Producto 1'], 'r': False},
+            {'v': 'Producto 1', 'r': False},
+        ]
+        for data in bad:
+            with self.subTest(data=data):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(token(data), Product, ['name', 'id'])
+
+        for url, data in [
+            (reverse('product_list'), {'v': ['Producto 1', 'x'], 'r': False}),
+            (reverse('movement_list'), {'v': ['garbage', 1], 'r': False}),
+            (reverse('movement_list'), {'v': ['99999-01-01T00:00:00', 1], 'r': False}),
+        ]:
+            with self.subTest(url=url, data=data):
+                response = self.client.get(url, {'cursor': token(data)})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class ListQueryCountTests(TestCase):
+    """
+    Cada listado debe costar un número fijo de consultas, crezcan o no los datos.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('empleado')
+        self.client.force_login(self.user)
+
+    def add_data(self, count):
+        start = Product.objects.count()
+        for i in range(start, start + count):
+            supplier = Supplier.objects.create(name=f'Proveedor {i}')
+            product = create_product(sku=f'SKU-{i}', supplier=supplier, stock=10)
+            StockMovement.objects.create(
+                product=product, movement_type=StockMovement.EXIT, quantity=1, created_by=self.user
+            )
+
+    def assert_flat_queries(self, url, expected, warm_up=False):
+        for count in (3, 12):
+            self.add_data(count)
+            if warm_up:
+                self.client.get(url)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+        return response
+
+    def test_product_list(self):
+        # sesión, versión de los datos, usuario, COUNT, página; los desplegables salen de la caché
+        self.assert_flat_queries(reverse('product_list'), 5, warm_up=True)
+
+    def test_movement_list(self):
+        # sesión, versión de los datos, usuario, COUNT, página
+        response = self.assert_flat_queries(reverse('movement_list') + '?product=SKU', 5)
+        self.assertContains(response, 'empleado')
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('empleado')
+        self.client.force_login(self.user)
+        self.product = create_product(stock=5)
+        # La primera página fija la cookie CSRF, que también entra en el ETag
+        self.client.get(reverse('home'))
+
+    def assert_not_modified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        # Solo la sesión y la versión de los datos: ni el usuario ni la vista llegan a consultar
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return etag
+
+    def test_lists_answer_304_until_data_changes(self):
+        for url in (reverse('home'), reverse('product_list'), reverse('movement_list')):
+            etag = self.assert_not_modified(url)
+            StockMovement.objects.create(product=self.product, movement_type=StockMovement.ENTRY, quantity=1)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_writes_from_another_process_change_the_etag(self):
+        url = reverse('product_list')
+        etag = self.client.get(url)['ETag']
+        # Un worker o un comando escribe con su propia caché local
+        other_process = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'otro'}}
+        with override_settings(CACHES=other_process):
+            StockMovement.objects.create(product=self.product, movement_type=StockMovement.ENTRY, quantity=1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deletes_change_the_etag(self):
+        url = reverse('product_list')
+        other = create_product(sku='OTRO', name='Otro')
+        etag = self.client.get(url)['ETag']
+        # Borrar no mueve MAX(updated_at): cambia el número de filas
+        other.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_filters_and_user(self):
+        url = reverse('product_list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url + '?sku=X')['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.force_login(get_user_model().objects.create_user('otro'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_anonymous_is_still_redirected(self):
+        etag = self.client.get(reverse('product_list'))['ETag']
+        self.client.logout()
+        response = self.client.get(reverse('product_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_last_modified(self):
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.ENTRY, quantity=1)
+        response = self.client.get(reverse('movement_list'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(
+            reverse('movement_list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class ReferenceChoicesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Oficina')
+
+    def test_cached_until_a_row_changes(self):
+        self.assertEqual(reference_choices(Category), [(self.category.pk, 'Oficina')])
+        with self.assertNumQueries(0):
+            reference_choices(Category)
+
+        self.category.name = 'Papelería'
+        self.category.save()
+        self.assertEqual(reference_choices(Category), [(self.category.pk, 'Papelería')])
+
+        self.category.delete()
+        self.assertEqual(reference_choices(Category), [])
+
+    def test_bulk_import_refreshes_the_list(self):
+        reference_choices(Supplier)
+        import_products_csv(BytesIO(
+            'name,sku,category,supplier,price,stock\nSilla,SIL,Oficina,Muebles SA,50,1\n'.encode('utf-8')
+        ))
+        self.assertIn('Muebles SA', [name for _, name in reference_choices(Supplier)])
+
+    def test_product_form_and_filter_render_without_queries(self):
+        reference_choices(Category)
+        reference_choices(Supplier)
+        with self.assertNumQueries(0):
+            str(ProductForm())
+            str(ProductFilter(queryset=Product.objects.all()).form)
+
+    def test_filter_accepts_a_category_created_by_another_process(self):
+        reference_choices(Category)
+        # Otro worker crea la categoría: esta caché local no se entera
+        other_process = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'otro'}}
+        with override_settings(CACHES=other_process):
+            new = Category.objects.create(name='Otra')
+        self.assertNotIn(new.pk, [pk for pk, _ in reference_choices(Category)])
+
+        create_product(sku='SIL', category=self.category)
+        create_product(sku='OTRO', category=new)
+        product_filter = ProductFilter({'category': str(new.pk)}, queryset=Product.objects.all())
+        self.assertTrue(product_filter.is_valid())
+        self.assertEqual([p.sku for p in product_filter.qs], ['OTRO'])
+
+
+class ProductRowCacheTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('empleado'))
+        self.product = create_product(sku='ROW-1', stock=5)
+
+    def test_rows_refresh_when_stock_or_category_change(self):
+        url = reverse('product_list')
+        self.assertContains(self.client.get(url), '✔ 5')
+
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.ENTRY, quantity=2)
+        record_movements([StockMovement(product=self.product, movement_type=StockMovement.ENTRY, quantity=1)])
+        self.assertContains(self.client.get(url), '✔ 8')
+
+        category = self.product.category
+        category.name = 'Renombrada'
+        category.save()
+        self.assertContains(self.client.get(url), 'Renombrada')
+
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.monitor = create_product(sku='MON-LED-24', name='Monitor LED 24"')
+        self.mouse = create_product(sku='RAT-INAL-001', name='Ratón Inalámbrico')
+
+    def search(self, text, column=None):
+        return list(search_products(Product.objects.order_by('id'), text, column))
+
+    def test_substring_search_by_column(self):
+        self.assertEqual(self.search('led', 'name'), [self.monitor])
+        self.assertEqual(self.search('INAL-0', 'sku'), [self.mouse])
+        self.assertEqual(self.search('inal'), [self.mouse])
+        # Menos de 3 caracteres: se usa icontains
+        self.assertEqual(self.search('24'), [self.monitor])
+
+    def test_index_follows_changes(self):
+        self.mouse.name = 'Ratón con cable'
+        self.mouse.save()
+        self.assertEqual(self.search('cable'), [self.mouse])
+        self.assertEqual(self.search('inalámbrico', 'name'), [])
+        self.monitor.delete()
+        self.assertEqual(self.search('monitor'), [])
+
+    def test_user_input_is_not_fts_syntax(self):
+        self.assertEqual(self.search('"LED" OR *'), [])
+
+    def test_autocomplete(self):
+        self.client.force_login(get_user_model().objects.create_user('empleado'))
+        response = self.client.get(reverse('product_autocomplete'), {'q': 'mon'})
+        self.assertEqual(response.json()['results'], [
+            {'id': self.monitor.pk, 'name': 'Monitor LED 24"', 'sku': 'MON-LED-24'}
+        ])
+
+
+class ProductImportTests(TestCase):
+
+    def csv_file(self, *lines):
+        return BytesIO(('name,sku,category,supplier,price,stock\n' + '\n'.join(lines)).encode('utf-8'))
+
+    def test_upserts_in_chunks_and_reports_bad_rows(self):
+        create_product(sku='OLD', name='Antiguo', stock=1)
+        result = import_products_csv(self.csv_file(
+            '"Monitor, 24""",MON,Electrónica,TechSupply,189.99,15',
+            'Nuevo nombre,OLD,Oficina,TechSupply,5,3',
+            'Sin precio,BAD,Oficina,TechSupply,abc,1',
+            'Teclado,TEC,Electrónica,Otro,79.99,30',
+        ), chunk_size=2)
+
+        self.assertEqual((result.created, result.updated), (2, 1))
+        self.assertEqual(len(result.errors), 1)
+        self.assertTrue(result.errors[0].startswith('Fila 4:'))
+
+        old = Product.objects.select_related('category').get(sku='OLD')
+        self.assertEqual((old.name, old.category.name, old.stock), ('Nuevo nombre', 'Oficina', 3))
+        self.assertEqual(Product.objects.get(sku='MON').name, 'Monitor, 24"')
+        self.assertEqual(Supplier.objects.filter(name__in=['TechSupply', 'Otro']).count(), 2)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        lines = [f'Producto {i},SKU-{i},Categoría {i % 3},Proveedor,1.50,{i}' for i in range(100)]
+        # El INSERT se parte solo por el límite de parámetros de la base (en
+        # SQLite 999 // 10 columnas = 99 filas por INSERT), nunca por fila
+        fields = [f for f in Product._meta.concrete_fields if not f.primary_key]
+        inserts = math.ceil(len(lines) / connection.ops.bulk_batch_size(fields, lines))
+        # Mapas iniciales (2) + por bloque: categorías y proveedores nuevos (2 + 2),
+        # SKUs existentes y savepoints de los dos atomic (1 + 4) e INSERTs
+        with self.assertNumQueries(2 + 4 + 5 + inserts):
+            result = import_products_csv(self.csv_file(*lines), chunk_size=1000)
+        self.assertEqual(result.created, 100)
+
+    def test_import_catalog_command_splits_file_and_numbers_lines(self):
+        lines = [f'Producto {i},SKU-{i},Categoría,Proveedor,1.00,{i}' for i in range(50)]
+        lines.insert(30, 'Roto,,Categoría,Proveedor,1.00,1')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('name,sku,category,supplier,price,stock\n' + '\n'.join(lines) + '\n')
+        self.addCleanup(os.unlink, f.name)
+
+        out = StringIO()
+        # split_size=0 corta en cada salto de línea: un tramo por fila
+        call_command('import_catalog', f.name, workers=2, split_size=0, batch_size=7, stdout=out)
+        self.assertEqual(Product.objects.count(), 50)
+        self.assertIn('Fila 32:', out.getvalue())
+
+    def test_import_catalog_command_keeps_quoted_newlines_in_one_range(self):
+        lines = [f'Producto {i},SKU-{i},Categoría,Proveedor,1.00,{i}' for i in range(10)]
+        lines.insert(3, '"Silla\nazul, ""oficina""",SILLA,Categoría,Proveedor,1.00,1')
+        lines.insert(6, 'Roto,,Categoría,Proveedor,1.00,1')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8', newline='') as f:
+            f.write('name,sku,category,supplier,price,stock\n' + '\n'.join(lines) + '\n')
+        self.addCleanup(os.unlink, f.name)
+
+        out = StringIO()
+        call_command('import_catalog', f.name, workers=2, split_size=0, stdout=out)
+        self.assertEqual(Product.objects.count(), 11)
+        self.assertEqual(Product.objects.get(sku='SILLA').name, 'Silla\nazul, "oficina"')
+        # La fila rota está en la línea física 9: la silla ocupa dos
+        self.assertIn('Fila 9:', out.getvalue())
+        self.assertEqual(out.getvalue().count('Fila '), 1)
+
+    def test_import_catalog_command_rejects_an_empty_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            pass
+        self.addCleanup(os.unlink, f.name)
+        with self.assertRaisesMessage(CommandError, 'vacío'):
+            call_command('import_catalog', f.name, stdout=StringIO())
+
+    def test_import_catalog_command_reads_json_lines(self):
+        create_product(sku='J-1', name='Antiguo')
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as f:
+            f.write('{"name": "Nuevo", "sku": "J-1", "category": "C", "supplier": "S", "price": 2.5, "stock": 4}\n')
+            f.write('[1, 2]\n')
+        self.addCleanup(os.unlink, f.name)
+
+        out = StringIO()
+        call_command('import_catalog', f.name, workers=1, stdout=out)
+        self.assertEqual(Product.objects.get(sku='J-1').name, 'Nuevo')
+        self.assertIn('Fila 2:', out.getvalue())
+
+
+class MovementImportTests(TestCase):
+
+    def setUp(self):
+        self.a = create_product(sku='A', stock=5)
+        self.b = create_product(sku='B', stock=0)
+
+    def csv_file(self, *lines):
+        return BytesIO(('sku,type,quantity,reason\n' + '\n'.join(lines)).encode('utf-8'))
+
+    def test_chunks_are_applied_or_rejected_whole(self):
+        result = import_movements_csv(self.csv_file(
+            'A,salida,3,venta',
+            'B,entrada,2,compra',
+            'B,salida,5,venta',         # el bloque 2 dejaría B en negativo
+            'A,entrada,1,devolución',
+            'X,entrada,1,desconocido',
+            'A,regalo,1,tipo no válido',
+        ), chunk_size=2)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(len(result.errors), 3)
+        self.assertTrue(result.errors[0].startswith('Filas 4-5 rechazadas'))
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.stock, self.b.stock), (2, 2))
+        self.assertEqual(ledger_total(self.b), 2)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        lines = [f'{sku},entrada,1,carga' for sku in ['A', 'B'] * 50]
+        # SKUs + record_movements (UPDATE, saldos, INSERT, resumen diario y
+        # savepoint) sin consultas por fila
+        with self.assertNumQueries(1 + 7):
+            result = import_movements_csv(self.csv_file(*lines), chunk_size=1000)
+        self.assertEqual(result.created, 100)
+
+    def test_upload_view(self):
+        user = get_user_model().objects.create_superuser('admin', password='x')
+        self.client.force_login(user)
+        upload = ContentFile(b'sku,type,quantity,reason\nA,salida,1,venta\n', name='movimientos.csv')
+        response = self.client.post(reverse('movement_import'), {'csv_file': upload})
+        self.assertContains(response, 'Movimientos registrados')
+        self.assertEqual(StockMovement.objects.get().created_by, user)
+
+
+class ImportJobTests(TestCase):
+
+    def setUp(self):
+        temporary_media_root(self)
+
+    def csv_content(self, rows):
+        lines = ['name,sku,category,supplier,price,stock']
+        lines += [f'Producto {i},SKU-{i},Categoría,Proveedor,1.00,{i}' for i in range(rows)]
+        return '\n'.join(lines).encode('utf-8')
+
+    def test_upload_returns_immediately_and_worker_imports(self):
+        user = get_user_model().objects.create_superuser('admin', password='secret')
+        self.client.force_login(user)
+        upload = BytesIO(self.csv_content(3))
+        upload.name = 'productos.csv'
+
+        response = self.client.post(reverse('product_import'), {'csv_file': upload})
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse('import_job_detail', args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual(job.status, ImportJob.PENDING)
+        self.assertFalse(Product.objects.exists())
+
+        run_job(claim_next_job('test'))
+        status = self.client.get(reverse('import_job_status', args=[job.pk])).json()
+        self.assertEqual(
+            (status['status'], status['rows_processed'], status['created'], status['finished']),
+            (ImportJob.DONE, 3, 3, True),
+        )
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_each_committed_chunk_changes_the_data_version(self):
+        # Altas y, en una segunda carga del mismo fichero, solo actualizaciones
+        for _ in range(2):
+            ImportJob.objects.create(file=ContentFile(self.csv_content(5), name='productos.csv'))
+            original = ProductImporter.import_chunk
+            versions = []
+
+            def record_version(importer, chunk):
+                versions.append(data_state()[0])
+                return original(importer, chunk)
+
+            with mock.patch.object(ProductImporter, 'import_chunk', record_version):
+                run_job(claim_next_job('worker-1'), chunk_size=2)
+            versions.append(data_state()[0])
+            self.assertEqual(len(set(versions)), 4)
+
+    def test_crashed_job_resumes_from_last_committed_chunk(self):
+        job = ImportJob.objects.create(file=ContentFile(self.csv_content(5), name='productos.csv'))
+        original = ProductImporter.import_chunk
+        calls = []
+
+        def crash_on_second_chunk(importer, chunk):
+            calls.append(chunk.last_line)
+            if len(calls) == 2:
+                raise KeyboardInterrupt  # el proceso muere a mitad del trabajo
+            return original(importer, chunk)
+
+        with mock.patch.object(ProductImporter, 'import_chunk', crash_on_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                run_job(claim_next_job('worker-1'), chunk_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_line, job.created_count), (ImportJob.RUNNING, 3, 2))
+        # Mientras tiene señal de vida nadie más lo reclama
+        self.assertIsNone(claim_next_job('worker-2'))
+
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - STALE_AFTER * 2)
+        run_job(claim_next_job('worker-2'), chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.rows_processed, job.created_count, job.updated_count),
+            (ImportJob.DONE, 5, 5, 0),
+        )
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        # Cada test deshace sus escrituras y la versión de los datos vuelve
+        # atrás: con una carpeta compartida se servirían ficheros de otro test
+        temporary_media_root(self)
+        self.user = get_user_model().objects.create_user('exportador')
+        self.client.force_login(self.user)
+        self.product = create_product(sku='MON', name='Monitor, 24"', stock=3)
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.EXIT, quantity=1)
+
+    def download(self, url, **params):
+        response = self.client.get(url, params)
+        return response, b''.join(response.streaming_content)
+
+    def test_products_csv_is_quoted(self):
+        response, content = self.download(reverse('product_export'))
+        rows = list(csv.reader(StringIO(content.decode('utf-8'))))
+        self.assertEqual(rows[0], ['Nombre', 'SKU', 'Categoría', 'Proveedor', 'Stock', 'Precio'])
+        self.assertEqual(rows[1], ['Monitor, 24"', 'MON', 'Categoría', 'Proveedor', '2', '10.00'])
+
+    def test_movements_gzip(self):
+        response, content = self.download(reverse('movement_export'), compress='gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('movimientos_stock.csv.gz', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(gzip.decompress(content).decode('utf-8'))))
+        self.assertEqual(rows[1][1:], ['Monitor, 24"', 'Categoría', 'Salida', '1', '2', ''])
+
+    def test_export_queries_do_not_depend_on_rows(self):
+        for i in range(30):
+            create_product(sku=f'P-{i}')
+        with self.assertNumQueries(3 + 2):  # sesión, usuario y versión de los datos + COUNT y SELECT
+            self.download(reverse('product_export'))
+
+    def test_repeated_export_is_served_from_cache_until_data_changes(self):
+        self.download(reverse('product_export'), sku='MON', name='')
+        with self.assertNumQueries(3):  # solo sesión, usuario y versión de los datos
+            # Mismos filtros en otro orden y sin valores vacíos
+            response, content = self.download(reverse('product_export'), page='2', sku='MON')
+        self.assertIn(b'MON', content)
+
+        create_product(sku='MONITOR-2')
+        response, content = self.download(reverse('product_export'), sku='MON')
+        self.assertIn(b'MONITOR-2', content)
+
+    def test_eviction_by_age_and_size(self):
+        self.download(reverse('product_export'))
+        self.download(reverse('movement_export'))
+        directory = export_path(EXPORT_DIR)
+        self.assertEqual(len(os.listdir(directory)), 2)
+        # El más reciente se conserva siempre
+        self.assertEqual(evict_exports(max_age=3600, max_size=1), 1)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_download_survives_eviction_while_streaming(self):
+        url = reverse('product_export')
+        for cached in (False, True):
+            for params in ({}, {'compress': 'gzip'}):
+                with self.subTest(cached=cached, **params):
+                    shutil.rmtree(export_path(EXPORT_DIR), ignore_errors=True)
+                    if cached:
+                        self.download(url)
+                    response = self.client.get(url, params)
+                    # Otra exportación limpia la carpeta antes de que se lea la respuesta
+                    shutil.rmtree(export_path(EXPORT_DIR))
+                    content = b''.join(response.streaming_content)
+                    if params:
+                        content = gzip.decompress(content)
+                    self.assertIn(b'MON', content)
+
+    @override_settings(EXPORT_ASYNC_ROWS=5)
+    def test_size_probe_counts_only_up_to_the_limit(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.download(reverse('product_export'))
+        counts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT COUNT(')]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIMIT 6', counts[0])
+
+    def test_cached_export_sees_writes_from_another_process(self):
+        self.download(reverse('product_export'))
+        # Un worker o un comando escribe con su propia caché local
+        other_process = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'otro'}}
+        with override_settings(CACHES=other_process):
+            create_product(sku='TECLADO', name='Teclado')
+        response, content = self.download(reverse('product_export'))
+        self.assertIn(b'TECLADO', content)
+
+    @override_settings(EXPORT_ASYNC_ROWS=0)
+    def test_large_export_runs_as_background_job(self):
+        response = self.client.get(reverse('movement_export'))
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('export_job_detail', args=[job.pk]))
+        self.assertEqual(self.client.get(reverse('export_job_download', args=[job.pk])).status_code, 404)
+
+        run_export_job(claim_next_job('worker-1', ExportJob))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows), (ExportJob.DONE, 1))
+        response, content = self.download(reverse('export_job_download', args=[job.pk]))
+        self.assertIn(b'Monitor', content)
+        self.assertEqual(self.client.get(reverse('export_job_status', args=[job.pk])).json()['download_url'],
+                         reverse('export_job_download', args=[job.pk]))
+
+    @override_settings(EXPORT_ASYNC_ROWS=0)
+    def test_background_job_is_reused_only_by_its_owner_while_usable(self):
+        self.client.get(reverse('movement_export'))
+        job = ExportJob.objects.get()
+
+        # Otro usuario no puede ver el trabajo: recibe el suyo
+        other = get_user_model().objects.create_user('otro')
+        self.client.force_login(other)
+        response = self.client.get(reverse('movement_export'))
+        other_job = ExportJob.objects.get(created_by=other)
+        self.assertRedirects(response, reverse('export_job_detail', args=[other_job.pk]))
+
+        # Terminado pero con el fichero borrado: se encarga de nuevo
+        self.client.force_login(self.user)
+        run_export_job(claim_next_job('worker-1', ExportJob))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.DONE)
+        export_path(job.file_name).unlink()
+        response = self.client.get(reverse('movement_export'))
+        new_job = ExportJob.objects.filter(created_by=self.user).exclude(pk=job.pk).get()
+        self.assertRedirects(response, reverse('export_job_detail', args=[new_job.pk]))
+
+
+class MovementCreateViewTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('empleado', password='secret')
+        self.client.force_login(self.user)
+        self.product = create_product(stock=2)
+
+    def test_exit_over_stock_shows_form_error(self):
+        response = self.client.post(
+            reverse('movement_create_exit', args=[self.product.pk]),
+            {'product': self.product.pk, 'movement_type': StockMovement.EXIT, 'quantity': 3},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+
+    def test_entry_records_user(self):
+        response = self.client.post(
+            reverse('movement_create_entry', args=[self.product.pk]),
+            {'product': self.product.pk, 'movement_type': StockMovement.ENTRY, 'quantity': 4},
+        )
+        self.assertRedirects(response, reverse('product_list'), fetch_redirect_response=False)
+        movement = StockMovement.objects.get()
+        self.assertEqual(movement.created_by, self.user)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 6)
+
+    def test_form_shows_the_product_trend(self):
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.EXIT, quantity=1)
+        other = create_product(sku='OTRO', stock=9)
+        StockMovement.objects.create(product=other, movement_type=StockMovement.EXIT, quantity=5)
+
+        response = self.client.get(reverse('movement_create_entry', args=[self.product.pk]))
+        self.assertEqual(len(response.context['series_labels']), 30)
+        # Solo los movimientos de este producto
+        self.assertEqual(response.context['series_exits'][-1], 1)
+        self.assertContains(response, 'productSeriesChart')
+
+
+# Tablas grandes: ninguna consulta de las rutas habituales debe recorrerlas enteras
+HOT_TABLES = {'core_product', 'core_stockmovement'}
+
+# En SQLite, "SCAN core_product" (o "SCAN TABLE ..." en versiones antiguas),
+# con o sin índice, recorre la tabla entera
+SQLITE_SCAN = re.compile(
+    r'^SCAN (?:TABLE )?(?P<table>\w+)(?: AS \w+)?(?P<index> USING (?P<covering>COVERING )?INDEX (?P<name>\w+))?'
+)
+
+PG_SCAN = re.compile(r'Seq Scan on (?P<table>\w+)')
+
+# Un índice parcial solo contiene las filas que cumplen su condición
+PARTIAL_INDEXES = {
+    index.name for model in (Product, StockMovement) for index in model._meta.indexes if index.condition
+}
+
+
+def explain(sql):
+    """Líneas del plan de ejecución de `sql` (EXPLAIN QUERY PLAN o EXPLAIN)."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Con las pocas filas de los tests el planificador prefiere Seq
+            # Scan aunque haya índice; así solo lo elige si no hay otro camino
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'EXPLAIN {sql}')
+                return [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.execute('RESET enable_seqscan')
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql):
+    """Tablas grandes que `sql` recorre enteras según su plan."""
+    tables = set()
+    for line in explain(sql):
+        if connection.vendor == 'postgresql':
+            match = PG_SCAN.search(line)
+        else:
+            match = SQLITE_SCAN.match(line.strip())
+            # Recorrer un índice vale si LIMIT lo corta (una página), si basta
+            # con el índice (COUNT(*) sin filtros) o si es parcial
+            if match and match['index'] and (
+                match['covering'] or match['name'] in PARTIAL_INDEXES or ' LIMIT ' in sql
+            ):
+                continue
+        if match:
+            tables.add(match['table'])
+    return tables & HOT_TABLES
+
+
+class QueryPlanTests(TestCase):
+    """
+    Captura las consultas de cada ruta habitual y comprueba con EXPLAIN que
+    ninguna recorre core_product ni core_stockmovement enteras: una consulta
+    nueva sin índice falla aquí antes de llegar a producción.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('empleado')
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name='Oficina')
+        self.supplier = Supplier.objects.create(name='Muebles SA')
+        self.product = create_product(sku='MESA-1', name='Mesa', stock=50, category=self.category)
+        for i in range(5):
+            create_product(sku=f'SILLA-{i}', name=f'Silla {i}', stock=i, min_stock=2, supplier=self.supplier)
+        record_movements([
+            StockMovement(product=self.product, movement_type=movement_type, quantity=1)
+            for movement_type in (StockMovement.ENTRY, StockMovement.EXIT) * 3
+        ], user=self.user)
+
+    def assertUsesIndexes(self, run, allow=()):
+        """
+        Ejecuta `run` y falla si alguna de sus consultas hace un recorrido
+        completo de una tabla grande que no esté en `allow`.
+        """
+        with CaptureQueriesContext(connection) as context:
+            run()
+        self.assertTrue(context.captured_queries)
+
+        problems = []
+        for query in context.captured_queries:
+            sql = query['sql']
+            # INSERT, SAVEPOINT y similares no tienen un plan que revisar
+            if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            if full_scans(sql) - set(allow):
+                problems.append(f'{sql}\n    ' + '\n    '.join(explain(sql)))
+        self.assertFalse(problems, 'Recorridos completos de tablas grandes:\n' + '\n'.join(problems))
+
+    def get(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertIn(response.status_code, (200, 302))
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def test_detects_full_scan(self):
+        # El motivo no tiene índice: la comprobación tiene que saltar
+        with CaptureQueriesContext(connection) as context:
+            list(StockMovement.objects.filter(reason='venta'))
+        self.assertEqual(full_scans(context.captured_queries[0]['sql']), {'core_stockmovement'})
+
+    def test_product_list(self):
+        for params in [
+            {},
+            {'name': 'Silla'},
+            {'sku': 'MES'},
+            {'category': self.category.pk},
+            {'supplier': self.supplier.pk},
+            {'low_stock': 'true'},
+        ]:
+            with self.subTest(**params):
+                cache.clear()
+                self.assertUsesIndexes(lambda: self.get('product_list', **params))
+
+    def test_cursor_pages(self):
+        movement = StockMovement.objects.order_by('-created_at', '-id')[2]
+        for url_name, values in [
+            ('product_list', ['Mesa', self.product.pk]),
+            ('movement_list', [movement.created_at, movement.pk]),
+        ]:
+            with self.subTest(url_name):
+                cursor = encode_cursor(values)
+                self.assertUsesIndexes(lambda: self.get(url_name, cursor=cursor))
+
+    def test_movement_list(self):
+        today = timezone.localdate().isoformat()
+        for params in [
+            {},
+            {'start_date': today},
+            {'start_date': today, 'end_date': today},
+            {'movement_type': StockMovement.EXIT, 'start_date': today},
+            {'product': 'Mesa', 'end_date': today},
+        ]:
+            with self.subTest(**params):
+                cache.clear()
+                self.assertUsesIndexes(lambda: self.get('movement_list', **params))
+
+    def test_dashboard(self):
+        cache.clear()
+        # Total, stock bajo, valor del inventario y productos por categoría
+        # necesitan todas las filas de core_product por definición; el
+        # resultado se cachea hasta que cambian los datos
+        self.assertUsesIndexes(compute_dashboard_metrics, allow={'core_product'})
+
+    def test_exports(self):
+        temporary_media_root(self)
+        today = timezone.localdate().isoformat()
+        for name, params in [
+            ('product_export', {'category': self.category.pk}),
+            ('product_export', {'sku': 'SILLA'}),
+            ('movement_export', {'start_date': today}),
+            ('movement_export', {'movement_type': StockMovement.ENTRY}),
+            ('movement_export', {'product': 'Mesa', 'archived': '1'}),
+        ]:
+            with self.subTest(name, **params):
+                self.assertUsesIndexes(lambda: self.get(name, **params))
+
+    def test_imports(self):
+        products = BytesIO(
+            'name,sku,category,supplier,price,stock\n'
+            'Mesa grande,MESA-1,Oficina,Muebles SA,99.90,4\n'
+            'Lámpara,LAMP-1,Oficina,Muebles SA,19.90,8\n'.encode('utf-8')
+        )
+        self.assertUsesIndexes(lambda: import_products_csv(products))
+
+        movements = BytesIO('sku,type,quantity,reason\nMESA-1,salida,1,venta\nLAMP-1,entrada,2,compra\n'.encode('utf-8'))
+        self.assertUsesIndexes(lambda: import_movements_csv(movements, user=self.user))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'réplica SQLite con la API de backup')
+@override_settings(
+    DATABASE_ROUTERS=['core.replicas.ReplicaRouter'],
+    MIDDLEWARE=settings.MIDDLEWARE + ['core.replicas.StickyPrimaryMiddleware'],
+)
+class SQLiteReplicaTests(TransactionTestCase):
+    """
+    La réplica es una copia real en un fichero temporal. El alias solo
+    existe mientras se ejecuta esta clase (el runner no lo conoce); como
+    espejo de 'default' el test no intenta vaciarla al terminar.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'replica.sqlite3')
+        connections.settings[REPLICA] = dict(
+            connections.settings['default'],
+            NAME=f'file:{cls.path}?mode=ro',
+            CONN_MAX_AGE=0,
+            OPTIONS={},
+            TEST={'MIRROR': 'default'},
+        )
+        cls.databases = {'default', REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.databases = {'default'}
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        override = self.settings(SQLITE_REPLICA_PATH=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = get_user_model().objects.create_user('empleado')
+        self.client.force_login(self.user)
+        self.product = create_product(sku='COPIADO', stock=5)
+        self.refresh()
+
+    def refresh(self):
+        refresh_sqlite_replica(self.path)
+        # El cliente de test no cierra las conexiones al acabar cada petición
+        connections[REPLICA].close()
+
+    def test_lists_read_the_copy_until_it_is_refreshed(self):
+        create_product(sku='NUEVO')
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, 'COPIADO')
+        self.assertNotContains(response, 'NUEVO')
+        etag = response['ETag']
+
+        self.refresh()
+        response = self.client.get(reverse('product_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'NUEVO')
+
+    def test_reads_stay_on_primary_after_a_write(self):
+        self.client.post(reverse('movement_create_entry', args=[self.product.pk]), {
+            'product': self.product.pk, 'movement_type': StockMovement.ENTRY, 'quantity': 3, 'reason': 'compra',
+        })
+        self.assertIn('primary_until', self.client.cookies)
+        self.assertEqual(len(self.client.get(reverse('movement_list')).context['movements']), 1)
+
+        del self.client.cookies['primary_until']
+        self.assertEqual(len(self.client.get(reverse('movement_list')).context['movements']), 0)
+
+    def test_dashboard_metrics_from_replica_are_not_shown_after_a_write(self):
+        self.client.post(reverse('movement_create_entry', args=[self.product.pk]), {
+            'product': self.product.pk, 'movement_type': StockMovement.ENTRY, 'quantity': 3, 'reason': 'compra',
+        })
+        # Otro navegador lee el panel de la réplica y deja sus métricas en caché
+        other = self.client_class()
+        other.force_login(self.user)
+        self.assertEqual(other.get(reverse('home')).context['entries_total'], 0)
+        self.assertEqual(self.client.get(reverse('home')).context['entries_total'], 3)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Product), REPLICA)
+            self.assertEqual(router.db_for_read(StockMovementArchive), REPLICA)
+            self.assertIsNone(router.db_for_read(ImportJob))
+            self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertIsNone(router.db_for_read(Product))
+
+        version = read_version(RequestFactory().get('/'))
+        # La versión se guarda en la petición: otra con la cookie del primario
+        request = RequestFactory().get('/')
+        request.COOKIES['primary_until'] = str(time.time() + 60)
+        self.assertNotEqual(read_version(request), version)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'COPY y pg_trgm de PostgreSQL')
+class PostgresFastPathTests(TestCase):
+    """
+    Se ejecutan con DATABASE_URL=postgres://... python manage.py test core
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('empleado')
+        self.product = create_product(sku='PG-1', name='Silla, "ergonómica"', stock=5)
+        record_movements(
+            [StockMovement(product=self.product, movement_type=StockMovement.EXIT, quantity=2)], user=self.user
+        )
+
+    def parse(self, chunks):
+        text = ''.join(c if isinstance(c, str) else c.decode('utf-8') for c in chunks)
+        return list(csv.reader(StringIO(text)))
+
+    def test_copy_export_matches_csv_writer(self):
+        for export in EXPORTS.values():
+            queryset = export.queryset(QueryDict())
+            self.assertEqual(
+                self.parse(copy_chunks(export.header, export.copy_values(queryset))),
+                self.parse(csv_chunks(export.header, export.rows(queryset))),
+            )
+
+    def test_copy_upsert(self):
+        row = {'name': 'Mesa', 'sku': 'PG-1', 'category': 'Oficina', 'supplier': 'Muebles SA',
+               'price': '10', 'stock': '7'}
+        importer = ProductImporter()
+        result = importer.write_chunk([
+            (2, parse_product_row(row)),
+            (3, parse_product_row(dict(row, sku='PG-2'))),
+        ])
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual(Product.objects.get(sku='PG-1').name, 'Mesa')
+        self.assertEqual(Product.objects.get(sku='PG-2').min_stock, 0)
+
+    def test_trigram_indexes_exist(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Product._meta.db_table)
+        self.assertTrue(set(TRIGRAM_INDEXES) <= set(constraints))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'PRAGMA de SQLite')
+class SQLiteSettingsTests(TestCase):
+
+    def test_pragmas_are_applied_on_connect(self):
+        # Valores de settings.SQLITE_PRAGMAS (por defecto o del entorno)
+        with connection.cursor() as cursor:
+            for pragma in ('busy_timeout', 'cache_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], int(settings.SQLITE_PRAGMAS[pragma]))
+        self.assertEqual(connection.transaction_mode, settings.DATABASES['default']['OPTIONS']['transaction_mode'])
+
+
+class ConcurrentStockMovementTests(TransactionTestCase):
+    """
+    Prueba de estrés: varios hilos registran movimientos a la vez sobre los
+    mismos productos y el stock final debe coincidir con el libro de movimientos.
+    """
+
+    workers = 8
+    movements = 2000
+
+    def retry_locked(self, func):
+        # SQLite serializa las escrituras; reintentamos si la base está bloqueada
+        while True:
+            try:
+                return func()
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+
+    def test_concurrent_movements_match_ledger(self):
+        products = [create_product(sku=f'SKU-{i}', stock=50) for i in range(3)]
+        rng = random.Random(42)
+        plan = [
+            (rng.choice(products).pk, rng.choice([StockMovement.ENTRY, StockMovement.EXIT]), rng.randint(1, 10))
+            for _ in range(self.movements)
+        ]
+        local = threading.local()
+
+        def run(item):
+            product_id, movement_type, quantity = item
+            # Cada hilo trabaja con su propia instancia, como un worker distinto
+            if not hasattr(local, 'products'):
+                local.products = self.retry_locked(
+                    lambda: {p.pk: Product.objects.get(pk=p.pk) for p in products}
+                )
+            movement = StockMovement(
+                product=local.products[product_id],
+                movement_type=movement_type,
+                quantity=quantity,
+            )
+            try:
+                self.retry_locked(movement.save)
+            except ValidationError:
+                return False
+            return True
+
+        def close_connection(_):
+            connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(run, plan))
+            list(pool.map(close_connection, range(self.workers)))
+
+        self.assertEqual(StockMovement.objects.count(), sum(results))
+        for product in products:
+            product.refresh_from_db()
+            self.assertGreaterEqual(product.stock, 0)
+            self.assertEqual(product.stock, 50 + ledger_total(product))
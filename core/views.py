@@ -3,16 +3,25 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin  
 from django_filters.views import FilterView
 from django.views.generic import TemplateView
-from .models import Category, Supplier, Product, StockMovement
+from .models import Category, Supplier, Product, StockMovement, ImportJob, ExportJob
 from django.db.models import Count
-from .forms import SupplierForm, ProductForm, StockMovementForm, ProductImportForm
-from django.shortcuts import render, redirect
+from .forms import SupplierForm, ProductForm, StockMovementForm, ProductImportForm, MovementImportForm
+from django.shortcuts import render, redirect, get_object_or_404
+from django.core.exceptions import ValidationError
 from .filters import ProductFilter, StockMovementFilter
-from django.db import models
-from django.db.models import Sum, F
-import csv
+from .services import get_dashboard_metrics, movement_series
+from .pagination import CursorPaginationMixin
+from .search import search_products
+from .importers import import_movements_csv
+from .exports import (
+    EXPORTS, export_querysets, normalize_query, cache_file_name, open_export, write_export, export_response,
+)
+from .conditional import conditional_page
+from .replicas import read_from_replica, read_version
+from django.utils.decorators import method_decorator
 from django.contrib import messages
-from django.http import StreamingHttpResponse
+from django.http import JsonResponse, Http404, QueryDict
+from django.conf import settings
 from .forms import CustomUserCreationForm
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.models import Group
@@ -20,45 +29,23 @@ from django.contrib.auth.models import Group
 
 
 # Create your views here.
+@method_decorator(read_from_replica, name='dispatch')
+@conditional_page(public=True)
 class HomeView(TemplateView):
     template_name = 'home.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Número de productos, categorías y proveedores
-        context["total_products"] = Product.objects.count()
-        context["total_categories"] = Category.objects.count()
-        context["total_suppliers"] = Supplier.objects.count()
-        
-        # Número de productos con stock bajo
-        context["low_stock_count"] = Product.objects.filter(stock__lte=models.F('min_stock')).count()
-        
-        # Conteo de productos por categoría
-        categories = Product.objects.values_list('category__name', flat=True)
-        context['category_labels'] = list(set(categories))
-        context['category_counts'] = [Product.objects.filter(category__name=c).count() for c in context['category_labels']]
-
-        # Suma total de entradas y salidas
-        total_entries = StockMovement.objects.filter(movement_type=StockMovement.ENTRY)\
-                        .aggregate(total=Sum('quantity'))['total'] or 0
-        total_exits = StockMovement.objects.filter(movement_type=StockMovement.EXIT)\
-                        .aggregate(total=Sum('quantity'))['total'] or 0
-
-        context['entries_total'] = total_entries
-        context['exits_total'] = total_exits
-
-        # Valor total del inventario: stock * precio por producto
-        valor_inventario = Product.objects.aggregate(
-            total=Sum(F('stock') * F('price'))
-        )['total'] or 0
-
-        context['valor_inventario'] = valor_inventario
-        
+
+        # Totales, stock bajo, productos por categoría, entradas/salidas y
+        # valor del inventario (cacheados, ver services.get_dashboard_metrics)
+        context.update(get_dashboard_metrics(self.request))
+
         return context
 
 
 # Listar todas las categorías
+@method_decorator(read_from_replica, name='dispatch')
 class CategoryListView(LoginRequiredMixin, ListView):
     model = Category
     template_name = 'categories/category_list.html'
@@ -131,6 +118,7 @@ class CategoryDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView
         return render(self.request, '403_custom.html', status=403)
 
 # Listar todos los proveedores
+@method_decorator(read_from_replica, name='dispatch')
 class SupplierListView(LoginRequiredMixin, ListView):
     model = Supplier
     template_name = 'suppliers/supplier_list.html'
@@ -205,18 +193,35 @@ class SupplierDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView
         return render(self.request, '403_custom.html', status=403)
 
 # Lista de productos
-class ProductListView(LoginRequiredMixin,FilterView):
+@method_decorator(read_from_replica, name='dispatch')
+@conditional_page()
+class ProductListView(LoginRequiredMixin, CursorPaginationMixin, FilterView):
     model = Product
     filterset_class = ProductFilter
     template_name = 'products/product_list.html'
     context_object_name = 'products'
     paginate_by = 10
+    cursor_ordering = ('name', 'id')
+
+    def get_queryset(self):
+        # Solo las columnas que pinta la plantilla, con categoría y proveedor en el mismo JOIN
+        return (
+            Product.objects
+            .select_related('category', 'supplier')
+            .only(
+                'name', 'sku', 'stock', 'min_stock', 'price', 'updated_at',
+                'category__name', 'category__updated_at', 'supplier__name', 'supplier__updated_at',
+            )
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # Las filas se cachean por producto y fecha de modificación
+        context['row_cache_timeout'] = settings.ROW_CACHE_TIMEOUT
 
         querydict = self.request.GET.copy()
         querydict.pop('page', None)
+        querydict.pop('cursor', None)
 
         context['querystring'] = querydict.urlencode()
         return context
@@ -283,44 +288,89 @@ class ProductDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView)
 
 
 # Listar movimientos de stock
-class MovementListView(LoginRequiredMixin, FilterView, ListView):
+@method_decorator(read_from_replica, name='dispatch')
+@conditional_page()
+class MovementListView(LoginRequiredMixin, CursorPaginationMixin, FilterView, ListView):
     model = StockMovement
     filterset_class = StockMovementFilter
     template_name = 'movements/movement_list.html'
     context_object_name = 'movements'
     paginate_by = 10
     ordering = ['-created_at']
+    cursor_ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        # Solo las columnas que pinta la plantilla, con producto y usuario en el mismo JOIN
+        return (
+            StockMovement.objects
+            .select_related('product', 'created_by')
+            .only(
+                'movement_type', 'quantity', 'balance_after', 'created_at', 'is_opening',
+                'product__name', 'created_by__username',
+            )
+            .order_by(*self.ordering)
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         querydict = self.request.GET.copy()
         querydict.pop('page', None)
+        querydict.pop('cursor', None)
 
         context['querystring'] = querydict.urlencode()
         return context
 
 
-# Crear entrada de stock para un producto específico
-class MovementCreateEntryView(LoginRequiredMixin, CreateView):
+# Lógica común a las vistas de entrada y salida de stock
+class MovementCreateMixin:
     model = StockMovement
     form_class = StockMovementForm
     template_name = 'movements/movement_form.html'
+    movement_type = None
+
+    def get_product(self):
+        # Un solo acceso a base de datos por petición para el producto
+        if not hasattr(self, '_product'):
+            self._product = get_object_or_404(Product, pk=self.kwargs['pk'])
+        return self._product
 
     def get_initial(self):
         return {
-            'product': Product.objects.get(pk=self.kwargs['pk']),
-            'movement_type': StockMovement.ENTRY
+            'product': self.get_product(),
+            'movement_type': self.movement_type
         }
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Tendencia del producto en los últimos 30 días, de los resúmenes diarios
+        series = movement_series(product=self.get_product())
+        context['product'] = self.get_product()
+        context['series_labels'] = series['labels']
+        context['series_entries'] = series['entries']
+        context['series_exits'] = series['exits']
+        return context
+
     def form_valid(self, form):
         # Asignar producto, tipo y usuario
-        form.instance.product = Product.objects.get(pk=self.kwargs['pk'])
-        form.instance.movement_type = StockMovement.ENTRY
-        form.instance.user = self.request.user
+        form.instance.product = self.get_product()
+        form.instance.movement_type = self.movement_type
+        form.instance.created_by = self.request.user
 
-        response = super().form_valid(form)
-        return response
+        try:
+            return super().form_valid(form)
+        except ValidationError as e:
+            # El stock pudo cambiar entre la validación del formulario y el guardado
+            form.add_error(None, e)
+            return self.form_invalid(form)
+
+    def get_success_url(self):
+        return reverse_lazy('product_list')
+
+
+# Crear entrada de stock para un producto específico
+class MovementCreateEntryView(LoginRequiredMixin, MovementCreateMixin, CreateView):
+    movement_type = StockMovement.ENTRY
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -328,29 +378,9 @@ class MovementCreateEntryView(LoginRequiredMixin, CreateView):
         context['title'] = 'Nuevo movimiento de entrada'
         return context
 
-    def get_success_url(self):
-        return reverse_lazy('product_list')
-
 # Crear salida de stock para un producto específico
-class MovementCreateExitView(LoginRequiredMixin, CreateView):
-    model = StockMovement
-    form_class = StockMovementForm
-    template_name = 'movements/movement_form.html'
-
-    def get_initial(self):
-        return {
-            'product': Product.objects.get(pk=self.kwargs['pk']),
-            'movement_type': StockMovement.EXIT
-        }
-
-    def form_valid(self, form):
-        # Asignar producto, tipo y usuario
-        form.instance.product = Product.objects.get(pk=self.kwargs['pk'])
-        form.instance.movement_type = StockMovement.EXIT
-        form.instance.user = self.request.user
-
-        response = super().form_valid(form)
-        return response
+class MovementCreateExitView(LoginRequiredMixin, MovementCreateMixin, CreateView):
+    movement_type = StockMovement.EXIT
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -358,119 +388,177 @@ class MovementCreateExitView(LoginRequiredMixin, CreateView):
         context['title'] = 'Nuevo movimiento de salida'
         return context
 
-    def get_success_url(self):
-        return reverse_lazy('product_list')
-
-# Importar productos desde CSV
+# Importar productos desde CSV (en segundo plano, ver core/jobs.py)
 @login_required
 @permission_required('products.add_product', raise_exception=True)
 def import_products(request):
     if request.method == "POST":
         form = ProductImportForm(request.POST, request.FILES)
         if form.is_valid():
-            csv_file = form.cleaned_data['csv_file']
-            decoded_file = csv_file.read().decode('utf-8').splitlines()
-            reader = csv.DictReader(decoded_file)
-
-            added_count = 0
-            errors = []
-
-            for i, row in enumerate(reader, start=2):  # start=2 para contar encabezado
-                try:
-                    # Obtenemos o creamos categoría y proveedor
-                    category, _ = Category.objects.get_or_create(name=row['category'])
-                    supplier, _ = Supplier.objects.get_or_create(name=row['supplier'])
-
-                    # Creamos o actualizamos producto
-                    product, created = Product.objects.update_or_create(
-                        sku=row['sku'],
-                        defaults={
-                            'name': row['name'],
-                            'category': category,
-                            'supplier': supplier,
-                            'price': float(row['price']),
-                            'stock': int(row['stock'])
-                        }
-                    )
-                    added_count += 1
-
-                except Exception as e:
-                    errors.append(f"Fila {i}: {e}")
-
-            messages.success(request, f"{added_count} productos importados correctamente.")
-            if errors:
-                messages.error(request, f"Errores:\n" + "\n".join(errors))
-
-            return redirect('product_list')
+            # Solo se guarda el archivo: el worker hace la importación
+            job = ImportJob.objects.create(
+                file=form.cleaned_data['csv_file'],
+                created_by=request.user,
+            )
+            messages.success(request, "Archivo recibido. La importación se está procesando.")
+            return redirect('import_job_detail', pk=job.pk)
     else:
         form = ProductImportForm()
 
     return render(request, 'products/import_products.html', {'form': form})
 
-# Exportar productos a CSV
+
+# Importar movimientos de stock desde CSV (síncrono: se registran por bloques)
+@login_required
+@permission_required('core.add_stockmovement', raise_exception=True)
+def import_movements(request):
+    result = None
+    if request.method == "POST":
+        form = MovementImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            result = import_movements_csv(form.cleaned_data['csv_file'], user=request.user)
+            if result.created:
+                messages.success(request, f"{result.created} movimientos registrados.")
+            if result.errors:
+                messages.warning(request, f"{len(result.errors)} errores en el archivo.")
+    else:
+        form = MovementImportForm()
+
+    return render(request, 'movements/import_movements.html', {'form': form, 'result': result})
+
+
+def get_import_job(request, pk):
+    jobs = ImportJob.objects.all()
+    if not request.user.is_superuser:
+        jobs = jobs.filter(created_by=request.user)
+    return get_object_or_404(jobs, pk=pk)
+
+
+# Progreso de una importación
+@login_required
+@permission_required('products.add_product', raise_exception=True)
+def import_job_detail(request, pk):
+    job = get_import_job(request, pk)
+    return render(request, 'products/import_job.html', {'job': job})
+
+
+# Progreso de una importación en JSON (para el sondeo desde la página)
+@login_required
+@permission_required('products.add_product', raise_exception=True)
+def import_job_status(request, pk):
+    job = get_import_job(request, pk)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finished': job.is_finished,
+        'rows_processed': job.rows_processed,
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'error_count': job.error_count,
+        'errors': job.errors[:50],
+        'rows_per_second': job.rows_per_second,
+        'message': job.message,
+    })
+
+# Autocompletado de productos por nombre o SKU
+@login_required
+def product_autocomplete(request):
+    query = request.GET.get('q', '')
+    results = []
+    if query.strip():
+        products = search_products(Product.objects.all(), query).order_by('name').values('id', 'name', 'sku')[:10]
+        results = list(products)
+    return JsonResponse({'results': results})
+
+def export_csv(request, kind):
+    """
+    Sirve la exportación desde la caché de ficheros si la misma consulta ya
+    se generó con la versión actual de los datos. Si no, la genera aquí o,
+    si es muy grande, encarga un trabajo en segundo plano.
+    """
+    export = EXPORTS[kind]
+    query = normalize_query(request.GET)
+    version = read_version(request)
+    file_name = cache_file_name(kind, query, version)
+
+    export_file = open_export(file_name)
+    if export_file is None:
+        # Basta saber si pasa del límite: contar solo hasta una fila más
+        limit = settings.EXPORT_ASYNC_ROWS + 1
+        rows = sum(
+            queryset[:limit].count() for queryset in export_querysets(export, QueryDict(query))
+        )
+        if rows > settings.EXPORT_ASYNC_ROWS:
+            # Solo un trabajo propio (los demás no los puede ver) y aún en
+            # marcha: uno terminado cuyo fichero se borró o caducó se repite
+            job = ExportJob.objects.filter(
+                kind=kind, query=query, data_version=version, created_by=request.user
+            ).exclude(status__in=[ExportJob.FAILED, ExportJob.DONE]).first()
+            if job is None:
+                job = ExportJob.objects.create(
+                    kind=kind,
+                    query=query,
+                    data_version=version,
+                    file_name=file_name,
+                    created_by=request.user,
+                )
+            messages.info(request, "La exportación es grande: se está generando en segundo plano.")
+            return redirect('export_job_detail', pk=job.pk)
+        _, export_file = write_export(kind, query, file_name, keep_open=True)
+
+    return export_response(export_file, export.filename, request.GET.get('compress') == 'gzip')
+
+# Exportar productos a CSV con los filtros de la lista (?compress=gzip para descargarlo comprimido)
+@login_required
+@read_from_replica
 def export_products(request):
-    # Aplicamos los mismos filtros que en la lista
-    product_filter = ProductFilter(request.GET, queryset=Product.objects.all())
-    queryset = product_filter.qs
-
-    def rows():
-        yield ['Nombre', 'SKU', 'Categoría', 'Proveedor', 'Stock', 'Precio']
-
-        for p in queryset.select_related('category', 'supplier'):
-            yield [
-                p.name,
-                p.sku,
-                p.category.name if p.category else '',
-                p.supplier.name if p.supplier else '',
-                p.stock,
-                p.price,
-            ]
-
-    response = StreamingHttpResponse(
-        (','.join(map(str, row)) + '\n' for row in rows()),
-        content_type="text/csv"
-    )
-    response['Content-Disposition'] = 'attachment; filename=productos.csv'
-    return response
+    return export_csv(request, ExportJob.PRODUCTS)
 
 # Exportar movimientos de stock a CSV
+@login_required
+@read_from_replica
 def export_movements(request):
-    movement_filter = StockMovementFilter(
-        request.GET,
-        queryset=StockMovement.objects.select_related(
-            'product', 'product__category', 'created_by'
-        )
-    )
-
-    queryset = movement_filter.qs.order_by('-created_at')
-
-    def rows():
-        yield [
-            'Fecha',
-            'Producto',
-            'Categoría',
-            'Tipo',
-            'Cantidad',
-            'Usuario'
-        ]
-
-        for m in queryset:
-            yield [
-                m.created_at.strftime('%Y-%m-%d %H:%M'),
-                m.product.name,
-                m.product.category.name if m.product.category else '',
-                'Entrada' if m.movement_type == m.ENTRY else 'Salida',
-                m.quantity,
-                m.created_by.username if m.created_by else '',
-            ]
-
-    response = StreamingHttpResponse(
-        (','.join(map(str, row)) + '\n' for row in rows()),
-        content_type='text/csv'
-    )
-    response['Content-Disposition'] = 'attachment; filename=movimientos_stock.csv'
-
-    return response
+    return export_csv(request, ExportJob.MOVEMENTS)
+
+
+def get_export_job(request, pk):
+    jobs = ExportJob.objects.all()
+    if not request.user.is_superuser:
+        jobs = jobs.filter(created_by=request.user)
+    return get_object_or_404(jobs, pk=pk)
+
+
+# Progreso de una exportación en segundo plano
+@login_required
+def export_job_detail(request, pk):
+    job = get_export_job(request, pk)
+    return render(request, 'exports/export_job.html', {'job': job})
+
+
+# Progreso de una exportación en JSON (para el sondeo desde la página)
+@login_required
+def export_job_status(request, pk):
+    job = get_export_job(request, pk)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finished': job.is_finished,
+        'rows': job.rows,
+        'message': job.message,
+        'download_url': reverse('export_job_download', args=[job.pk]) if job.status == ExportJob.DONE else '',
+    })
+
+
+# Descarga del fichero generado por una exportación en segundo plano
+@login_required
+def export_job_download(request, pk):
+    job = get_export_job(request, pk)
+    export_file = open_export(job.file_name) if job.status == ExportJob.DONE else None
+    if export_file is None:
+        raise Http404("La exportación no está disponible (puede haber caducado)")
+    return export_response(export_file, EXPORTS[job.kind].filename, request.GET.get('compress') == 'gzip')
 
 # Registro de usuario personalizado
 def register(request):
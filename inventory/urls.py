@@ -38,8 +38,15 @@ from core.views import (
     MovementCreateEntryView,
     MovementCreateExitView,
     import_products, 
+    import_job_detail,
+    import_job_status,
+    product_autocomplete,
     export_products,
     export_movements,
+    import_movements,
+    export_job_detail,
+    export_job_status,
+    export_job_download,
     register
 )
 
@@ -68,10 +75,18 @@ urlpatterns = [
     path('products/<int:pk>/entry/', MovementCreateEntryView.as_view(), name='movement_create_entry'),
     path('products/<int:pk>/exit/', MovementCreateExitView.as_view(), name='movement_create_exit'), 
     path('products/import/', import_products, name='product_import'),
+    path('products/import/<int:pk>/', import_job_detail, name='import_job_detail'),
+    path('products/import/<int:pk>/status/', import_job_status, name='import_job_status'),
     path('products/export/', export_products, name='product_export'),
+    path('products/autocomplete/', product_autocomplete, name='product_autocomplete'),
 
     path('movements/', MovementListView.as_view(), name='movement_list'),
     path('movements/export/', export_movements, name='movement_export'),
+    path('movements/import/', import_movements, name='movement_import'),
+
+    path('exports/<int:pk>/', export_job_detail, name='export_job_detail'),
+    path('exports/<int:pk>/status/', export_job_status, name='export_job_status'),
+    path('exports/<int:pk>/download/', export_job_download, name='export_job_download'),
 ]
 
 if settings.DEBUG: